@@ -2,32 +2,44 @@ from fish_bowl.process.utils import Animal
 
 
 class Fish(object):
+    """
+    Animals use __slots__ and keep only the attributes they need: no alive flag (dead animals leave the tank)
+    and no last_fed for fish (class attribute, always 0)
+    """
+    __slots__ = ('oid', 'sim_id', 'spawn_turn', 'breed_count', 'last_breed')
 
     start_oid = 1000
-
-    def __init__(self, sim_id, spawn_turn):
-        self.oid = Fish.start_oid
-        Fish.start_oid += 1
+    animal_type = Animal.Fish
+    alive = True
+    # Is not needed for fish - kept for persistence
+    last_fed = 0
+
+    def __init__(self, sim_id, spawn_turn, oid=None):
+        """
+        :param sim_id: simulation id
+        :param spawn_turn: turn the animal is born
+        :param oid: id given by the simulation IdAllocator, taken from the class counter if not set
+        """
+        if oid is None:
+            oid = type(self).start_oid
+            type(self).start_oid += 1
+        self.oid = oid
         self.sim_id = sim_id
         self.spawn_turn = spawn_turn
-        self.animal_type = Animal.Fish
         self.breed_count = 0
         self.last_breed = 0
-        self.alive = True
-        # Is not needed for fish - added for persistence
-        self.last_fed = 0
 
     def __repr__(self):
         return "{}".format(self.oid)
 
 
 class Shark(Fish):
+    __slots__ = ('last_fed',)
+
     start_oid = 2000
+    animal_type = Animal.Shark
 
-    def __init__(self, sim_id, spawn_turn):
-        super().__init__(sim_id, spawn_turn)
-        self.oid = Shark.start_oid
-        Shark.start_oid += 1
-        self.animal_type = Animal.Shark
+    def __init__(self, sim_id, spawn_turn, oid=None):
+        super().__init__(sim_id, spawn_turn, oid)
         # turn of last fed same as spawn at construction
         self.last_fed = spawn_turn
@@ -0,0 +1,562 @@
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from fish_bowl.data_struct.fish_tank import FishTank, PacmanFishTank, NO_OBJECT_OID
+from fish_bowl.process.topology import NonEmptyCoordinate, OPPOSITE_DIRECTION, neighbour_table
+from fish_bowl.process.utils import Animal, ImpossibleAction
+
+# value stored in the type array for a free cell
+EMPTY_CELL = 0
+# layers of the 16 bit neighbour masks: free neighbours in the low byte, neighbours holding a fish in the high byte
+FREE_LAYER = 1
+FISH_LAYER = 1 << 8
+
+_logger = logging.getLogger(__name__)
+
+
+def array_specs(grid_size: int, nb_grids: int = 1) -> Dict[str, Tuple[Tuple, np.dtype]]:
+    """
+    Shape and dtype of each array holding the state of an ArrayFishTank, by name
+    :param grid_size: size of the grid
+    :param nb_grids: number of grids stacked along x, see EnsembleFishTank
+    """
+    shape = (nb_grids * grid_size, grid_size)
+    return {'type': (shape, np.dtype(np.int8)),
+            'oid': (shape, np.dtype(np.int64)),
+            'spawn_turn': (shape, np.dtype(np.int32)),
+            'last_fed': (shape, np.dtype(np.int32)),
+            'last_breed': (shape, np.dtype(np.int32)),
+            'breed_count': (shape, np.dtype(np.int32)),
+            # one extra mask at the end absorbs the updates made through the -1 entries of the neighbour table
+            'neighbour_masks': ((nb_grids * grid_size ** 2 + 1,), np.dtype('<u2'))}
+
+
+class AnimalRecord(object):
+    """
+    Snapshot of an animal stored in an ArrayFishTank.
+    Changing its attributes does not change the tank, use the FishTank methods instead.
+    """
+    __slots__ = ('oid', 'sim_id', 'animal_type', 'spawn_turn', 'last_fed', 'last_breed', 'breed_count', 'alive')
+
+    def __init__(self, oid, sim_id, animal_type, spawn_turn, last_fed, last_breed, breed_count, alive=True):
+        self.oid = oid
+        self.sim_id = sim_id
+        self.animal_type = animal_type
+        self.spawn_turn = spawn_turn
+        self.last_fed = last_fed
+        self.last_breed = last_breed
+        self.breed_count = breed_count
+        self.alive = alive
+
+    def __repr__(self):
+        return "{}".format(self.oid)
+
+
+class ArrayFishTank(FishTank):
+    """
+    Fish tank holding the grid state in numpy arrays indexed by [x, y] instead of a dict of animal objects.
+    The type array doubles as the occupancy array, attributes are kept in parallel arrays.
+
+    Batch methods work on flat cell indices (x * grid_size + y) so engines can act on many animals at once, cells they
+    free or take are recorded as dirty like the single cell methods once track_dirty_cells is called.
+    The arrays can be given instead of allocated, e.g. views of shared memory, to attach a tank to an existing state.
+    """
+
+    def __init__(self, grid_size, synchronous=False, rng=None, arrays: Dict[str, np.ndarray] = None):
+        """
+        :param grid_size: size of the grid
+        :param synchronous: phases use the start of phase state for every animal
+        :param rng: random source with choice and shuffle such as the engine BatchedRandom, the random module if not set
+        :param arrays: arrays holding the state, by name as in array_specs, an empty tank is allocated if not set
+        """
+        if arrays is None:
+            arrays = {name: np.zeros(shape, dtype=dtype) for name, (shape, dtype) in array_specs(grid_size).items()}
+            arrays['neighbour_masks'][:-1] = neighbour_table(grid_size, self.topology).edge_masks
+        self._arrays = arrays
+        super().__init__(grid_size, synchronous, rng)
+        self._sim_id = None
+        self._type = arrays['type']
+        self._oid = arrays['oid']
+        self._spawn_turn = arrays['spawn_turn']
+        self._last_fed = arrays['last_fed']
+        self._last_breed = arrays['last_breed']
+        self._breed_count = arrays['breed_count']
+        # the type array is the species index, only the population counters are kept aside
+        self._population = {Animal.Fish: 0, Animal.Shark: 0}
+        self.recount_population()
+        # cells taken and breeds recorded during a synchronous phase
+        self._claimed = set()
+        self._pending_breeds = []
+        self._in_phase = False
+
+    def _init_neighbourhood(self):
+        self._neighbours = neighbour_table(self.grid_size, self.topology)
+        self._neighbour_masks = self._arrays['neighbour_masks']
+        # byte views used by the single cell methods
+        self._free_neighbours = self._neighbour_masks.view(np.uint8)[0::2]
+        self._fish_neighbours = self._neighbour_masks.view(np.uint8)[1::2]
+
+    def put_animal(self, coord, animal):
+        """
+        Place an animal into the fish tank grid, only its attributes are kept
+        :param coord: coordinate tuple
+        :param animal: Animal to put in such as Fish and Shark
+        """
+        self._sim_id = animal.sim_id
+        previous = self._type.item(coord)
+        if previous == EMPTY_CELL:
+            self._mark_occupied(coord)
+        else:
+            self._population[Animal(previous)] -= 1
+            if previous == Animal.Fish.value:
+                self._unmark_fish(coord)
+        if animal.animal_type == Animal.Fish:
+            self._mark_fish(coord)
+        self._population[animal.animal_type] += 1
+        self._type[coord] = animal.animal_type.value
+        self._oid[coord] = animal.oid
+        self._spawn_turn[coord] = animal.spawn_turn
+        self._last_fed[coord] = animal.last_fed
+        self._last_breed[coord] = animal.last_breed
+        self._breed_count[coord] = animal.breed_count
+
+    def move_animal(self, old_coord, animal, new_coord):
+        """
+        Move any animal
+        :param old_coord: Start coordinates
+        :param animal: Animal to move
+        :param new_coord: Target coordinates to move to
+        """
+        if self._type.item(old_coord) == EMPTY_CELL or self._oid.item(old_coord) != animal.oid:
+            raise Exception("move_animal() - Request animal oid ({}) is not "
+                            "the same oid as the current occupant ({})".format(animal.oid, self._oid[old_coord]))
+        self._mark_free(old_coord)
+        if self._type.item(new_coord) == EMPTY_CELL:
+            self._mark_occupied(new_coord)
+        if self._type.item(old_coord) == Animal.Fish.value:
+            self._unmark_fish(old_coord)
+            self._mark_fish(new_coord)
+        for attribute in (self._type, self._oid, self._spawn_turn, self._last_fed, self._last_breed,
+                          self._breed_count):
+            attribute[new_coord] = attribute[old_coord]
+        self._type[old_coord] = EMPTY_CELL
+
+    def _free_mask(self, x, y) -> int:
+        return self._free_neighbours.item(x * self.grid_size + y)
+
+    def _set_neighbour_bits(self, masks, coord):
+        x, y = coord
+        cell = x * self.grid_size + y
+        for offset, bit in self._neighbours.class_links[self._neighbours.edge_class(x, y)]:
+            masks[cell + offset] = masks.item(cell + offset) | bit
+
+    def _clear_neighbour_bits(self, masks, coord):
+        x, y = coord
+        cell = x * self.grid_size + y
+        for offset, bit in self._neighbours.class_links[self._neighbours.edge_class(x, y)]:
+            masks[cell + offset] = masks.item(cell + offset) & ~bit
+
+    def get_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Arrays holding the state of the tank, by name as in array_specs
+        """
+        return self._arrays
+
+    def recount_population(self):
+        """
+        Count the animals again from the type array, after other processes changed shared arrays
+        """
+        self._population[Animal.Fish] = int(np.count_nonzero(self._type == Animal.Fish.value))
+        self._population[Animal.Shark] = int(np.count_nonzero(self._type == Animal.Shark.value))
+
+    def get_grid(self) -> Dict:
+        """
+        Build a dict of coordinates to animal records, this is a copy of the tank state
+        """
+        return dict(self.get_animals())
+
+    def get_animals(self, animal_type: Animal = None) -> List[Tuple]:
+        """
+        Snapshot of the animals in the tank
+        :param animal_type: only return this type of animal if set
+        :return: List of coordinates and animal records
+        """
+        if animal_type is None:
+            xs, ys = np.nonzero(self._type)
+        else:
+            xs, ys = np.nonzero(self._type == animal_type.value)
+        # gather each attribute column in a single indexing operation
+        columns = [attribute[xs, ys].tolist() for attribute in (self._oid, self._type, self._spawn_turn,
+                                                                  self._last_fed, self._last_breed,
+                                                                  self._breed_count)]
+        animal_types = {a.value: a for a in Animal}
+        return [((x, y), AnimalRecord(oid, self._sim_id, animal_types[t], spawn_turn, last_fed, last_breed,
+                                      breed_count))
+                for x, y, oid, t, spawn_turn, last_fed, last_breed, breed_count
+                in zip(xs.tolist(), ys.tolist(), *columns)]
+
+    def _record(self, x, y) -> AnimalRecord:
+        return AnimalRecord(oid=self._oid.item(x, y), sim_id=self._sim_id,
+                            animal_type=Animal(self._type.item(x, y)),
+                            spawn_turn=self._spawn_turn.item(x, y), last_fed=self._last_fed.item(x, y),
+                            last_breed=self._last_breed.item(x, y), breed_count=self._breed_count.item(x, y))
+
+    def check_animal(self, coord):
+        """
+        Check if an animal exists in the coordinates
+        :param coord: Coordinates to check
+        :return: animal record if found
+        """
+        x, y = coord
+        if self._type.item(x, y) == EMPTY_CELL:
+            return None
+        return self._record(x, y)
+
+    def get_current_number_sharks(self) -> int:
+        """
+        Count the current number of sharks in the Fish Tank
+        """
+        return self._population[Animal.Shark]
+
+    def get_current_number_fishes(self) -> int:
+        """
+        Count the current number of fishes in the Fish Tank
+        """
+        return self._population[Animal.Fish]
+
+    def remove_starved_sharks(self, current_turn, shark_starving, oids=None) -> int:
+        """
+        Remove starved sharks
+        :param current_turn: The current simulation turn
+        :param shark_starving: number of turns before a shark can starve (simulation param)
+        :param oids: not used, every shark is checked in one vectorized pass
+        :return: number of starved (for stats)
+        """
+        _logger.debug("remove_starved_sharks() - sim turn {}".format(current_turn))
+        starved = (self._type == Animal.Shark.value) & ((current_turn - self._last_fed) > shark_starving)
+        self._type[starved] = EMPTY_CELL
+        starved_cells = np.flatnonzero(starved)
+        self._population[Animal.Shark] -= len(starved_cells)
+        self._update_neighbour_masks(starved_cells, set_layers=FREE_LAYER, clear_layers=0)
+        self._mark_dirty_cells(starved_cells)
+        return len(starved_cells)
+
+    def get_current_sharks(self) -> List:
+        """
+        Get current list of sharks with coords
+        :return: List of sharks and coordinates
+        """
+        return self.get_animals(Animal.Shark)
+
+    def get_current_fishes(self) -> List:
+        """
+        Get current list of fishes with coords
+        :return: List of fishes and coordinates
+        """
+        return self.get_animals(Animal.Fish)
+
+    def eat_fish(self, sim_turn, shark_coord, fish_coord):
+        """
+        A shark eats a fish given both coordinates
+        :param sim_turn: current simulation turn
+        :param shark_coord: shark coordinates
+        :param fish_coord: fish coordinates
+        """
+        fish_oid = self._oid[fish_coord]
+        for attribute in (self._type, self._oid, self._spawn_turn, self._last_breed, self._breed_count):
+            attribute[fish_coord] = attribute[shark_coord]
+        self._last_fed[fish_coord] = sim_turn
+        self._type[shark_coord] = EMPTY_CELL
+        self._mark_free(shark_coord)
+        self._unmark_fish(fish_coord)
+        self._population[Animal.Fish] -= 1
+        _logger.debug("eat_fish() - Shark {} has eaten fish {} at [{}]".format(self._oid[fish_coord], fish_oid,
+                                                                               fish_coord))
+
+    def record_breed(self, coord, sim_turn):
+        """
+        Update breeding attributes of the animal at coord
+        :param coord: coordinates of the breeding animal
+        :param sim_turn: current simulation turn
+        """
+        if self.synchronous and self._in_phase:
+            self._pending_breeds.append((coord, sim_turn))
+            return
+        self._breed_count[coord] += 1
+        self._last_breed[coord] = sim_turn
+
+    def begin_phase(self, sharks_first: bool = False, animals: List[Tuple] = None) -> Iterable[Tuple]:
+        """
+        Start a phase, the animal records returned are taken at the start of the phase. In sequential mode the arrays
+        are updated in place, in synchronous mode moves and spawns are applied at the end of the phase
+        :param sharks_first: return the sharks then the fishes instead of the animals in grid order
+        :param animals: coordinates and animal records to act on, the other animals are left as they are
+        :return: position, coordinates and animal record of each animal
+        """
+        self._pending_moves = []
+        self._claimed = set()
+        self._in_phase = True
+        if animals is not None:
+            if sharks_first:
+                animals = sorted(animals, key=lambda coord_animal: coord_animal[1].animal_type != Animal.Shark)
+        elif sharks_first:
+            animals = self.get_current_sharks() + self.get_current_fishes()
+        else:
+            animals = self.get_animals()
+        return ((position, coord, animal) for position, (coord, animal) in enumerate(animals))
+
+    def _claim_cell(self, coord) -> bool:
+        if self.synchronous:
+            if coord in self._claimed:
+                return False
+            self._claimed.add(coord)
+            return True
+        return self._type.item(coord) == EMPTY_CELL
+
+    def carry_animal(self, coord, animal, new_coord=None):
+        """
+        Move an animal during a phase
+        :param coord: coordinates of the animal at the start of the phase
+        :param animal: the animal record
+        :param new_coord: free cell to move to, the animal stays if not set or if the cell is already claimed
+        :return: coordinates of the animal after the move
+        """
+        if new_coord is None or not self._claim_cell(new_coord):
+            return coord
+        if self.synchronous:
+            self._pending_moves.append((coord, animal, new_coord))
+        else:
+            self.move_animal(coord, animal, new_coord)
+        return new_coord
+
+    def spawn_animal(self, coord, animal) -> bool:
+        """
+        Put a new animal during a phase
+        :param coord: cell free at the start of the phase
+        :param animal: the new animal
+        :return: False if the cell is already claimed
+        """
+        if not self._claim_cell(coord):
+            return False
+        if self.synchronous:
+            self._pending_moves.append((None, animal, coord))
+        else:
+            self.put_animal(coord, animal)
+        return True
+
+    def end_phase(self):
+        """
+        Apply the moves, the spawns then the breeds of a synchronous phase
+        """
+        self._in_phase = False
+        for old_coord, animal, new_coord in self._pending_moves:
+            if old_coord is not None:
+                self.move_animal(old_coord, animal, new_coord)
+        for old_coord, animal, new_coord in self._pending_moves:
+            if old_coord is None:
+                self.put_animal(new_coord, animal)
+        for coord, sim_turn in self._pending_breeds:
+            self.record_breed(coord, sim_turn)
+        self._pending_moves = []
+        self._pending_breeds = []
+        self._claimed = set()
+
+    def get_cells(self, animal_type: Animal = None, rows: Tuple[int, int] = None) -> np.ndarray:
+        """
+        Flat indices of the occupied cells
+        :param animal_type: only return cells holding this type of animal if set
+        :param rows: only return cells with x in [rows[0], rows[1]) if set
+        """
+        first, types = (0, self._type) if rows is None else (rows[0] * self.grid_size, self._type[rows[0]:rows[1]])
+        if animal_type is None:
+            return np.flatnonzero(types) + first
+        return np.flatnonzero(types == animal_type.value) + first
+
+    def get_cell_types(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Animal type values of the cells, EMPTY_CELL for free cells
+        """
+        return self._type.ravel()[cells]
+
+    def get_spawn_turns(self, cells: np.ndarray) -> np.ndarray:
+        return self._spawn_turn.ravel()[cells]
+
+    def get_last_fed(self, cells: np.ndarray) -> np.ndarray:
+        return self._last_fed.ravel()[cells]
+
+    def get_free_neighbours(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Free neighbour bit masks of the cells, bit d set when the neighbour in direction d is free
+        """
+        return self._free_neighbours[cells]
+
+    def get_fish_neighbours(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Fish neighbour bit masks of the cells, bit d set when the neighbour in direction d holds a fish
+        """
+        return self._fish_neighbours[cells]
+
+    def neighbour_cells(self, cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Neighbours of each cell, looked up in the neighbour table
+        :param cells: flat cell indices
+        :return: (len(cells), 8) arrays of neighbour flat indices and of validity (False beyond the grid edges),
+        column d holds the neighbour in direction d
+        """
+        neighbours = self.padded_neighbours[cells]
+        valid = neighbours >= 0
+        return np.where(valid, neighbours, 0), valid
+
+    def _check_free_cells(self, cells: np.ndarray):
+        """
+        Only a single animal is allowed per cell: target cells of a batch must be free and distinct
+        :param cells: flat cell indices
+        """
+        occupied = cells[self._type.ravel()[cells] != EMPTY_CELL]
+        if len(occupied) > 0:
+            raise NonEmptyCoordinate('Coordinates {} are occupied'.format(
+                [divmod(int(c), self.grid_size) for c in occupied[:10]]))
+        marks = np.zeros(self._type.size, dtype=bool)
+        marks[cells] = True
+        if np.count_nonzero(marks) != len(cells):
+            raise NonEmptyCoordinate('Several animals sent to the same coordinates')
+
+    def _update_neighbour_masks(self, cells: np.ndarray, set_layers, clear_layers):
+        """
+        Set and clear the bits of each cell in the neighbour masks of its neighbours.
+        Cells are distinct so their neighbours in a given direction are too, one direction is updated at a time.
+        :param cells: flat indices of the cells that changed
+        :param set_layers: FREE_LAYER and / or FISH_LAYER to set, for all the cells or one value per cell
+        :param clear_layers: FREE_LAYER and / or FISH_LAYER to clear, for all the cells or one value per cell
+        """
+        masks = self._neighbour_masks
+        set_layers = np.asarray(set_layers, dtype=np.uint16)
+        clear_layers = np.asarray(clear_layers, dtype=np.uint16)
+        neighbours = self._neighbours.padded[cells]
+        for direction in range(neighbours.shape[1]):
+            column = neighbours[:, direction]
+            shift = OPPOSITE_DIRECTION[direction]
+            masks[column] = (masks[column] & ~(clear_layers << shift)) | (set_layers << shift)
+
+    def _mark_dirty_cells(self, cells: np.ndarray):
+        """
+        Record the cells of a batch whose occupancy changed, if dirty cells are tracked
+        :param cells: flat cell indices
+        """
+        if self._dirty_cells is not None:
+            self._dirty_cells.update(divmod(cell, self.grid_size) for cell in cells.tolist())
+
+    def spawn_animals(self, cells: np.ndarray, animal_type: Animal, sim_id, sim_turn, oids: np.ndarray):
+        """
+        Place new animals of one type into free cells
+        :param cells: flat indices of free cells
+        :param animal_type: type of the new animals
+        :param sim_id: simulation id
+        :param sim_turn: spawn turn, sharks are considered fed at spawn
+        :param oids: oid of each new animal
+        """
+        self._check_free_cells(cells)
+        self._update_neighbour_masks(cells, set_layers=FISH_LAYER if animal_type == Animal.Fish else 0,
+                                     clear_layers=FREE_LAYER)
+        self._mark_dirty_cells(cells)
+        self._population[animal_type] += len(cells)
+        self._sim_id = sim_id
+        self._type.ravel()[cells] = animal_type.value
+        self._oid.ravel()[cells] = oids
+        self._spawn_turn.ravel()[cells] = sim_turn
+        self._last_fed.ravel()[cells] = sim_turn if animal_type == Animal.Shark else 0
+        self._last_breed.ravel()[cells] = 0
+        self._breed_count.ravel()[cells] = 0
+
+    def remove_animals(self, cells: np.ndarray):
+        """
+        Remove many animals at once
+        :param cells: flat indices of the animals to remove, distinct
+        """
+        types = self._type.ravel()[cells]
+        if np.any(types == EMPTY_CELL):
+            raise ImpossibleAction('remove_animals() - Cannot remove animals from free cells')
+        is_fish = types == Animal.Fish.value
+        self._type.ravel()[cells] = EMPTY_CELL
+        self._update_neighbour_masks(cells, set_layers=FREE_LAYER, clear_layers=np.where(is_fish, FISH_LAYER, 0))
+        self._mark_dirty_cells(cells)
+        self._population[Animal.Fish] -= int(np.count_nonzero(is_fish))
+        self._population[Animal.Shark] -= len(cells) - int(np.count_nonzero(is_fish))
+
+    def move_animals(self, old_cells: np.ndarray, new_cells: np.ndarray):
+        """
+        Move many animals at once, new cells must be free and distinct
+        :param old_cells: flat indices of the animals to move
+        :param new_cells: flat indices to move them to
+        """
+        if np.any(self._type.ravel()[old_cells] == EMPTY_CELL):
+            raise ImpossibleAction('move_animals() - Cannot move animals from free cells')
+        self._check_free_cells(new_cells)
+        is_fish = self._type.ravel()[old_cells] == Animal.Fish.value
+        for attribute in (self._type, self._oid, self._spawn_turn, self._last_fed, self._last_breed,
+                          self._breed_count):
+            flat = attribute.ravel()
+            flat[new_cells] = flat[old_cells]
+        self._type.ravel()[old_cells] = EMPTY_CELL
+        fish_layer = np.where(is_fish, FISH_LAYER, 0)
+        self._update_neighbour_masks(old_cells, set_layers=FREE_LAYER, clear_layers=fish_layer)
+        self._update_neighbour_masks(new_cells, set_layers=fish_layer, clear_layers=FREE_LAYER)
+        self._mark_dirty_cells(old_cells)
+        self._mark_dirty_cells(new_cells)
+
+    def eat_fishes(self, sim_turn, shark_cells: np.ndarray, fish_cells: np.ndarray):
+        """
+        Sharks eat the fish in fish_cells and move into them
+        :param sim_turn: current simulation turn
+        :param shark_cells: flat indices of the eating sharks
+        :param fish_cells: flat indices of the eaten fish, distinct
+        """
+        if np.any(self._type.ravel()[fish_cells] != Animal.Fish.value):
+            raise ImpossibleAction('eat_fishes() - Sharks can only eat fish')
+        if np.any(self._type.ravel()[shark_cells] != Animal.Shark.value):
+            raise ImpossibleAction('eat_fishes() - Only sharks can eat fish')
+        # the fish cells stay occupied, only the cells the sharks leave become free
+        for attribute in (self._type, self._oid, self._spawn_turn, self._last_breed, self._breed_count):
+            flat = attribute.ravel()
+            flat[fish_cells] = flat[shark_cells]
+        self._last_fed.ravel()[fish_cells] = sim_turn
+        self._type.ravel()[shark_cells] = EMPTY_CELL
+        self._update_neighbour_masks(shark_cells, set_layers=FREE_LAYER, clear_layers=0)
+        self._update_neighbour_masks(fish_cells, set_layers=0, clear_layers=FISH_LAYER)
+        self._mark_dirty_cells(shark_cells)
+        self._population[Animal.Fish] -= len(fish_cells)
+
+    def record_breeds(self, cells: np.ndarray, sim_turn):
+        """
+        Update breeding attributes of the animals in cells
+        """
+        self._breed_count.ravel()[cells] += 1
+        self._last_breed.ravel()[cells] = sim_turn
+
+    def create_pandas_dataframe(self) -> pd.DataFrame:
+        """
+        Generate a Pandas DataFrame representation
+        """
+        return pd.DataFrame(self._oid_strings())
+
+    def __repr__(self):
+        return "\r\n" + "".join(" ".join(row) + "\r\n" for row in self._oid_strings().T)
+
+    def _oid_strings(self) -> np.ndarray:
+        """
+        Array of oid strings indexed by [x, y], "0000" for free cells
+        """
+        oid_str = self._oid.astype(str)
+        oid_str[self._type == EMPTY_CELL] = NO_OBJECT_OID
+        return oid_str
+
+
+class PacmanArrayFishTank(ArrayFishTank, PacmanFishTank):
+    """
+    Array backed fish tank with a pacman style grid topology
+    """
+    def __init__(self, grid_size, synchronous=False, rng=None, arrays: Dict[str, np.ndarray] = None):
+        super().__init__(grid_size, synchronous, rng, arrays)
@@ -0,0 +1,120 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from fish_bowl.process.topology import SQUARE_NEIGH
+
+WORD_BITS = 64
+
+
+class BitBoard(object):
+    """
+    Square grid of bits packed in uint64 words: row x of the grid is words[x] and bit y of the row is bit y % 64
+    of its word y // 64. Bits of the last word beyond the grid are always zero.
+    Whole grid queries are shift / AND / OR operations, costing grid_size ** 2 / 64 word operations.
+    """
+
+    def __init__(self, grid_size: int, wrap: bool = False, words: np.ndarray = None):
+        """
+        :param grid_size: size of the grid
+        :param wrap: shifts wrap around the grid edges (pacman topology) instead of dropping the bits
+        :param words: (grid_size, nb_words) uint64 array to wrap, an empty board is created if not set
+        """
+        self.grid_size = grid_size
+        self.wrap = wrap
+        nb_words = -(-grid_size // WORD_BITS)
+        self.words = np.zeros((grid_size, nb_words), dtype='<u8') if words is None else words
+        # bits of each row word that belong to the grid
+        self._row_mask = np.full(nb_words, np.iinfo(np.uint64).max, dtype='<u8')
+        if grid_size % WORD_BITS:
+            self._row_mask[-1] = np.uint64((1 << (grid_size % WORD_BITS)) - 1)
+
+    def _new(self, words: np.ndarray) -> 'BitBoard':
+        return BitBoard(self.grid_size, self.wrap, words)
+
+    def set(self, x: int, y: int):
+        idx = (x, y >> 6)
+        self.words[idx] = self.words.item(idx) | 1 << (y & 63)
+
+    def clear(self, x: int, y: int):
+        idx = (x, y >> 6)
+        self.words[idx] = self.words.item(idx) & ~(1 << (y & 63))
+
+    def test(self, x: int, y: int) -> bool:
+        return (self.words.item(x, y >> 6) >> (y & 63)) & 1 == 1
+
+    def __and__(self, other: 'BitBoard') -> 'BitBoard':
+        return self._new(self.words & other.words)
+
+    def __or__(self, other: 'BitBoard') -> 'BitBoard':
+        return self._new(self.words | other.words)
+
+    def __invert__(self) -> 'BitBoard':
+        return self._new(~self.words & self._row_mask)
+
+    def count(self) -> int:
+        return int(np.unpackbits(self.words.view(np.uint8)).sum())
+
+    def coords(self) -> List[Tuple[int, int]]:
+        """
+        Coordinates of the set bits, by x then y
+        """
+        bits = np.unpackbits(self.words.view(np.uint8), axis=1, bitorder='little')[:, :self.grid_size]
+        xs, ys = np.nonzero(bits)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def _shift_rows(self, words: np.ndarray, dy: int) -> np.ndarray:
+        """
+        Bit y of each row of the result is bit y + dy of the row, dy in (-1, 0, 1)
+        """
+        if dy == 0:
+            return words
+        last_word, last_bit = divmod(self.grid_size - 1, WORD_BITS)
+        if dy == 1:
+            shifted = words >> np.uint64(1)
+            # carry the first bit of the next word
+            shifted[:, :-1] |= words[:, 1:] << np.uint64(WORD_BITS - 1)
+            if self.wrap:
+                shifted[:, last_word] |= (words[:, 0] & np.uint64(1)) << np.uint64(last_bit)
+        else:
+            shifted = words << np.uint64(1)
+            # carry the last bit of the previous word
+            shifted[:, 1:] |= words[:, :-1] >> np.uint64(WORD_BITS - 1)
+            if self.wrap:
+                shifted[:, 0] |= (words[:, last_word] >> np.uint64(last_bit)) & np.uint64(1)
+            shifted &= self._row_mask
+        return shifted
+
+    def _shift_columns(self, words: np.ndarray, dx: int) -> np.ndarray:
+        """
+        Row x of the result is row x + dx, dx in (-1, 0, 1)
+        """
+        if dx == 0:
+            return words
+        if self.wrap:
+            return np.roll(words, -dx, axis=0)
+        shifted = np.zeros_like(words)
+        if dx == 1:
+            shifted[:-1] = words[1:]
+        else:
+            shifted[1:] = words[:-1]
+        return shifted
+
+    def shift(self, dx: int, dy: int) -> 'BitBoard':
+        """
+        Board whose bit (x, y) is the bit (x + dx, y + dy) of this board, i.e. set when the neighbour of (x, y) in
+        direction (dx, dy) is set. Bits beyond the edges are dropped, or wrapped around for a pacman topology
+        :param dx: -1, 0 or 1
+        :param dy: -1, 0 or 1
+        """
+        return self._new(self._shift_columns(self._shift_rows(self.words, dy), dx))
+
+    def any_neighbour(self) -> 'BitBoard':
+        """
+        Board of the cells having at least one set neighbour
+        """
+        rows = {dy: self._shift_rows(self.words, dy) for dy in (-1, 0, 1)}
+        result = np.zeros_like(self.words)
+        for dx, dy in SQUARE_NEIGH.values():
+            result |= self._shift_columns(rows[dy], dx)
+        return self._new(result)
@@ -0,0 +1,164 @@
+import logging
+from typing import Iterable, List, Tuple
+
+from fish_bowl.data_struct.bitboard import BitBoard
+from fish_bowl.data_struct.fish_tank import FishTank, PacmanFishTank
+from fish_bowl.process.topology import PACMAN_TOPOLOGY, SQUARE_TOPOLOGY, neighbour_table
+
+_logger = logging.getLogger(__name__)
+
+
+class BitboardFishTank(FishTank):
+    """
+    Fish tank keeping occupancy and fish positions in bitboards next to the dict of animals, instead of per cell
+    neighbour masks. The grid costs 2 bits per cell on top of the animals, which suits very large sparse grids,
+    and whole grid neighbourhood queries are shift / AND / OR operations over the boards.
+    Neighbours are listed in SQUARE_NEIGH order so random draws match the ones of FishTank.
+
+    A synchronous phase takes the board of the cells without free neighbour at its start, which holds for the whole
+    phase since cells only change at its end: boxed in animals are then found with one bit test instead of looking at
+    their neighbours.
+    """
+
+    def _init_neighbourhood(self):
+        # only the edge classes of the table are used, its per cell arrays are never built
+        self._neighbours = neighbour_table(self.grid_size, self.topology)
+        wrap = self.topology == PACMAN_TOPOLOGY
+        self._occupied_board = BitBoard(self.grid_size, wrap)
+        self._fish_board = BitBoard(self.grid_size, wrap)
+        # cells without free neighbour of the running synchronous phase
+        self._boxed_in_board = None
+
+    def _mark_free(self, coord):
+        self._occupied_board.clear(*coord)
+        if self._dirty_cells is not None:
+            self._dirty_cells.add(coord)
+
+    def _mark_occupied(self, coord):
+        self._occupied_board.set(*coord)
+        if self._dirty_cells is not None:
+            self._dirty_cells.add(coord)
+
+    def _mark_fish(self, coord):
+        self._fish_board.set(*coord)
+
+    def _unmark_fish(self, coord):
+        self._fish_board.clear(*coord)
+
+    def _neighbour_coords(self, coord) -> List[Tuple[int, int]]:
+        """
+        Neighbours of a coordinate in SQUARE_NEIGH order
+        """
+        return self._neighbours.neighbour_coords(*coord)
+
+    def find_fish_to_eat(self, coord) -> Tuple:
+        """
+        Given a shark coordinate, return the first available fish and it's coordinate to eat
+        :param coord: coordinates to start from
+        :return: Tuple of coordinate and fish
+        """
+        for new_coord in self._neighbour_coords(coord):
+            if self._fish_board.test(*new_coord):
+                _logger.debug("find_fish_to_eat() - Found fish at : [{}]".format(new_coord))
+                return new_coord, self._grid[new_coord]
+
+    def find_available_nearby_space(self, start_coordinate, shuffle: bool = True) -> List[Tuple]:
+        """
+        for a given coordinate, return all available neighbours
+        :param start_coordinate: starting coordinate tuple
+        :param shuffle: boolean to shuffle the return coordinates
+        :return: List of free neighboring coordinates
+        """
+        occupied = self._occupied_board
+        available_neighbors = [c for c in self._neighbour_coords(start_coordinate) if not occupied.test(*c)]
+        if shuffle:
+            self.rng.shuffle(available_neighbors)
+        return available_neighbors
+
+    def has_available_nearby_space(self, coord) -> bool:
+        """
+        Check if a coordinate has at least one free neighbour
+        :param coord: coordinate tuple
+        """
+        if self._boxed_in_board is not None:
+            return not self._boxed_in_board.test(*coord)
+        occupied = self._occupied_board
+        for new_coord in self._neighbour_coords(coord):
+            if not occupied.test(*new_coord):
+                return True
+        return False
+
+    def pick_available_nearby_space(self, coord, draw: float = None):
+        """
+        Pick a random free neighbour
+        :param coord: coordinate tuple
+        :param draw: uniform float in [0, 1) choosing the neighbour, taken from rng if not set
+        :return: coordinates of the free neighbour or None if there is no free neighbour
+        """
+        if not self.has_available_nearby_space(coord):
+            return None
+        available_neighbors = self.find_available_nearby_space(coord, shuffle=False)
+        if draw is None:
+            draw = self.rng.random()
+        return available_neighbors[int(draw * len(available_neighbors))]
+
+    def _free_mask(self, x, y) -> int:
+        occupied = self._occupied_board
+        mask = 0
+        for d, offset in enumerate(self._neighbours.class_offsets[self._neighbours.edge_class(x, y)]):
+            if offset is not None and not occupied.test(x + offset[0], y + offset[1]):
+                mask |= 1 << d
+        return mask
+
+    def _window_is_open(self, x, y, table) -> bool:
+        """
+        Check the reach window around (x, y) is free, reading one word per row when its columns are in one word
+        :param table: ReachTable of the speed
+        """
+        speed = table.speed
+        size = self.grid_size
+        if self.topology == SQUARE_TOPOLOGY and not speed <= x < size - speed:
+            return False
+        low, high = y - speed, y + speed
+        if low < 0 or high >= size or low >> 6 != high >> 6:
+            return super()._window_is_open(x, y, table)
+        words = self._occupied_board.words
+        word, shift, width = low >> 6, low & 63, (1 << (2 * speed + 1)) - 1
+        for dx in range(-speed, speed + 1):
+            row = words.item((x + dx) % size, word) >> shift & width
+            # only the animal itself, in the middle of its row
+            if row and (dx or row != 1 << speed):
+                return False
+        return True
+
+    def get_shark_board(self) -> BitBoard:
+        return self._occupied_board & ~self._fish_board
+
+    def get_hunting_sharks(self) -> BitBoard:
+        """
+        Board of the sharks having at least one adjacent fish
+        """
+        return self.get_shark_board() & self._fish_board.any_neighbour()
+
+    def get_boxed_in(self) -> BitBoard:
+        """
+        Board of the animals without any free neighbour
+        """
+        return self._occupied_board & ~(~self._occupied_board).any_neighbour()
+
+    def begin_phase(self, sharks_first: bool = False, animals: List[Tuple] = None) -> Iterable[Tuple]:
+        if self.synchronous:
+            self._boxed_in_board = ~(~self._occupied_board).any_neighbour()
+        return super().begin_phase(sharks_first, animals)
+
+    def end_phase(self):
+        self._boxed_in_board = None
+        super().end_phase()
+
+
+class PacmanBitboardFishTank(BitboardFishTank, PacmanFishTank):
+    """
+    Bitboard fish tank with a pacman style grid topology, board shifts become rotations
+    """
+    def __init__(self, grid_size, synchronous=False, rng=None):
+        super().__init__(grid_size, synchronous, rng)
@@ -0,0 +1,81 @@
+import logging
+
+import numpy as np
+
+from fish_bowl.data_struct.array_fish_tank import ArrayFishTank, array_specs
+from fish_bowl.data_struct.fish_tank import PacmanFishTank
+from fish_bowl.process.topology import StackedNeighbourTable
+from fish_bowl.process.utils import Animal
+
+_logger = logging.getLogger(__name__)
+
+
+class EnsembleFishTank(ArrayFishTank):
+    """
+    Array fish tank holding the grids of several independent simulations of the same size, stacked along x:
+    member k owns the rows [k * grid_size, (k + 1) * grid_size), so cell (x, y) of member k has the flat index
+    k * grid_size ** 2 + x * grid_size + y. Neighbourhoods never cross members.
+    Members can be deactivated, get_cells then leaves their cells out so batch operations do not touch them.
+    Only the batch methods are supported, single cell methods expect a grid_size x grid_size grid.
+    """
+
+    def __init__(self, grid_size, nb_members: int, rng=None):
+        """
+        :param grid_size: size of the grid of each member
+        :param nb_members: number of members
+        :param rng: random source with choice and shuffle such as the engine BatchedRandom, the random module if not set
+        """
+        self.nb_members = nb_members
+        arrays = {name: np.zeros(shape, dtype=dtype)
+                  for name, (shape, dtype) in array_specs(grid_size, nb_members).items()}
+        super().__init__(grid_size, rng=rng, arrays=arrays)
+        self._neighbour_masks[:-1] = self._neighbours.edge_masks
+        self._active = np.ones(nb_members, dtype=bool)
+
+    def _init_neighbourhood(self):
+        super()._init_neighbourhood()
+        self._neighbours = StackedNeighbourTable(self._neighbours, self.nb_members)
+
+    @property
+    def member_cells(self) -> int:
+        """
+        Number of cells of each member
+        """
+        return self.grid_size ** 2
+
+    def get_members(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Member owning each cell
+        """
+        return cells // self.member_cells
+
+    def set_active(self, active: np.ndarray):
+        """
+        :param active: boolean flag of each member, inactive members are left out of get_cells
+        """
+        self._active[...] = active
+
+    def get_cells(self, animal_type: Animal = None, rows=None) -> np.ndarray:
+        """
+        Flat indices of the occupied cells of the active members
+        :param animal_type: only return cells holding this type of animal if set
+        :param rows: only return cells with x in [rows[0], rows[1]) if set, in stacked rows
+        """
+        cells = super().get_cells(animal_type, rows)
+        if self._active.all():
+            return cells
+        return cells[self._active[self.get_members(cells)]]
+
+    def count_by_member(self, animal_type: Animal) -> np.ndarray:
+        """
+        Number of animals of a type in each member, active or not
+        """
+        return np.count_nonzero(self._type.reshape(self.nb_members, -1) == animal_type.value, axis=1)
+
+
+class PacmanEnsembleFishTank(EnsembleFishTank, PacmanFishTank):
+    """
+    Ensemble fish tank with a pacman style grid topology for every member
+    """
+    def __init__(self, grid_size, nb_members: int, rng=None):
+        super().__init__(grid_size, nb_members, rng)
@@ -1,9 +1,10 @@
 import logging
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Set, Tuple
 import random
 import pandas as pd
 
-from fish_bowl.process.topology import SQUARE_NEIGH, TopologyError
+from fish_bowl.process.topology import TopologyError, SQUARE_TOPOLOGY, PACMAN_TOPOLOGY, MASK_DIRECTIONS, \
+    neighbour_table, reach_table
 from fish_bowl.process.utils import Animal
 
 NO_OBJECT_OID = "0000"
@@ -14,13 +15,60 @@ _logger = logging.getLogger(__name__)
 class FishTank(object):
     """
     Fish tank will hold the state of the grid and provide helper methods
+
+    Phases acting on the animals (begin_phase / carry_animal / spawn_animal / end_phase) update the grid in place.
+    Random draws of a phase are indexed by the position of the animals in it.
+    In synchronous mode the neighbourhood masks are only updated at the end of a phase: every animal decides from the
+    start of phase state and the first animal taking a free cell gets it.
+
+    Once track_dirty_cells is called, cells whose occupancy changes are recorded so that engines can re-check only the
+    animals around them (take_dirty_region).
     """
+    topology = SQUARE_TOPOLOGY
 
-    def __init__(self, grid_size):
+    def __init__(self, grid_size, synchronous=False, rng=None):
+        """
+        :param grid_size: size of the grid
+        :param synchronous: phases use the start of phase state for every animal
+        :param rng: random source with choice and shuffle such as the engine BatchedRandom, the random module if not set
+        """
         self.grid_size = grid_size
+        self.synchronous = synchronous
+        self.rng = random if rng is None else rng
+        self._init_neighbourhood()
         self._grid = {}
+        # per species indexes of the grid, kept in sync on every change
         self._shark_dict = {}
         self._fish_dict = {}
+        # coordinates of each shark by oid, to find the sharks due to starve without scanning
+        self._shark_coords = {}
+        # moves and spawns waiting for the end of a synchronous phase to update the masks
+        self._pending_moves = []
+        # cells whose occupancy changed, None when not tracked
+        self._dirty_cells = None
+        # scratch buffers of pick_reachable_space: per window cell stamp of the last search reaching it, and the
+        # window cells reached
+        self._reach_stamps = []
+        self._reach_stamp = 0
+        self._reached = []
+
+    def _init_neighbourhood(self):
+        """
+        Build the structures answering neighbourhood queries
+        """
+        # neighbours of each cell are looked up in a precomputed table
+        self._neighbours = neighbour_table(self.grid_size, self.topology)
+        # free neighbours of each cell as a bit mask, bit d set when the neighbour in direction d is free
+        self._free_neighbours = self._neighbours.edge_masks.tolist()
+        # same for neighbours holding a fish, so feeding sharks do not scan their neighbours
+        self._fish_neighbours = [0] * self.grid_size ** 2
+
+    @property
+    def padded_neighbours(self):
+        """
+        (grid_size ** 2, 8) array of the neighbour flat index of each cell in each direction, -1 beyond the grid edges
+        """
+        return self._neighbours.padded
 
     def put_animal(self, coord, animal):
         """
@@ -29,6 +77,12 @@ class FishTank(object):
         :param animal: Animal to put in such as Fish and Shark
         """
         # _logger.debug("put_animal() - animal ({}) at [{}]".format(animal.oid, coord))
+        previous = self._grid.get(coord)
+        if previous is None:
+            self._mark_occupied(coord)
+        else:
+            self._remove_from_index(coord, previous)
+        self._add_to_index(coord, animal)
         self._grid[coord] = animal
 
     def move_animal(self, old_coord, animal, new_coord):
@@ -42,11 +96,86 @@ class FishTank(object):
         if move_animal.oid != animal.oid:
             raise Exception("move_animal() - Request animal oid ({}) is not "
                             "the same oid as the current occupant ({})".format(animal.oid, move_animal.oid))
+        self._mark_free(old_coord)
+        self._remove_from_index(old_coord, move_animal)
+        previous = self._grid.get(new_coord)
+        if previous is None:
+            self._mark_occupied(new_coord)
+        else:
+            self._remove_from_index(new_coord, previous)
+        self._add_to_index(new_coord, move_animal)
         self._grid[new_coord] = move_animal
 
+    def _add_to_index(self, coord, animal):
+        """
+        Add an animal to its species index, fish are also flagged in the masks of their neighbours
+        """
+        if animal.animal_type == Animal.Fish:
+            self._fish_dict[coord] = animal
+            self._mark_fish(coord)
+        elif animal.animal_type == Animal.Shark:
+            self._shark_dict[coord] = animal
+            self._shark_coords[animal.oid] = coord
+
+    def _remove_from_index(self, coord, animal):
+        """
+        Remove an animal from its species index
+        """
+        if animal.animal_type == Animal.Fish:
+            del self._fish_dict[coord]
+            self._unmark_fish(coord)
+        elif animal.animal_type == Animal.Shark:
+            del self._shark_dict[coord]
+            del self._shark_coords[animal.oid]
+
+    def _mark_free(self, coord):
+        self._set_neighbour_bits(self._free_neighbours, coord)
+        if self._dirty_cells is not None:
+            self._dirty_cells.add(coord)
+
+    def _mark_occupied(self, coord):
+        self._clear_neighbour_bits(self._free_neighbours, coord)
+        if self._dirty_cells is not None:
+            self._dirty_cells.add(coord)
+
+    def _mark_fish(self, coord):
+        self._set_neighbour_bits(self._fish_neighbours, coord)
+
+    def _unmark_fish(self, coord):
+        self._clear_neighbour_bits(self._fish_neighbours, coord)
+
+    def _set_neighbour_bits(self, masks, coord):
+        """
+        Set the bit of coord in the neighbour masks of its neighbours
+        :param masks: neighbour masks of every cell
+        :param coord: coordinate tuple
+        """
+        x, y = coord
+        cell = x * self.grid_size + y
+        for offset, bit in self._neighbours.class_links[self._neighbours.edge_class(x, y)]:
+            masks[cell + offset] |= bit
+
+    def _clear_neighbour_bits(self, masks, coord):
+        """
+        Clear the bit of coord in the neighbour masks of its neighbours
+        :param masks: neighbour masks of every cell
+        :param coord: coordinate tuple
+        """
+        x, y = coord
+        cell = x * self.grid_size + y
+        for offset, bit in self._neighbours.class_links[self._neighbours.edge_class(x, y)]:
+            masks[cell + offset] &= ~bit
+
     def get_grid(self):
         return self._grid
 
+    def get_animals(self) -> List[Tuple]:
+        """
+        Snapshot of every animal in the tank, safe to iterate while the tank is modified
+        :return: List of coordinates and animals
+        """
+        return list(self._grid.items())
+
     def check_animal(self, coord):
         """
         Check if an animal exists in the coordinates
@@ -63,29 +192,40 @@ class FishTank(object):
         """
         Count the current number of sharks in the Fish Tank
         """
-        number_sharks = 0
-        for coord, animal in self._grid.items():
-            if animal.animal_type == Animal.Shark:
-                number_sharks += 1
-        return number_sharks
+        return len(self._shark_dict)
+
+    def get_current_number_fishes(self) -> int:
+        """
+        Count the current number of fishes in the Fish Tank
+        """
+        return len(self._fish_dict)
 
-    def remove_starved_sharks(self, current_turn, shark_starving) -> int:
+    def remove_starved_sharks(self, current_turn, shark_starving, oids: Iterable[int] = None) -> int:
         """
         Remove starved sharks
         :param current_turn: The current simulation turn
         :param shark_starving: number of turns before a shark can starve (simulation param)
+        :param oids: oids of the sharks that may starve this turn, every shark is checked if not set.
+                     Oids of sharks no longer in the tank are ignored, an oid can be given more than once
         :return: number of starved (for stats)
         """
         _logger.debug("remove_starved_sharks() - sim turn {}".format(current_turn))
+        if oids is None:
+            oids = [animal.oid for animal in self._shark_dict.values()]
         number_starved_sharks = 0
-        for coord, animal in self._grid.copy().items():
-            if animal.animal_type == Animal.Shark:
-                turns_not_fed = current_turn - animal.last_fed
-                if turns_not_fed > shark_starving:
-                    animal.alive = False
-                    number_starved_sharks += 1
-                    _logger.debug("remove_starved_sharks() - Removing shark ({}) at [{}]".format(animal.oid, coord))
-                    self._grid.pop(coord, None)
+        for oid in oids:
+            coord = self._shark_coords.get(oid)
+            if coord is None:
+                continue
+            animal = self._shark_dict[coord]
+            turns_not_fed = current_turn - animal.last_fed
+            if turns_not_fed > shark_starving:
+                number_starved_sharks += 1
+                _logger.debug("remove_starved_sharks() - Removing shark ({}) at [{}]".format(animal.oid, coord))
+                self._grid.pop(coord, None)
+                del self._shark_dict[coord]
+                del self._shark_coords[animal.oid]
+                self._mark_free(coord)
         return number_starved_sharks
 
     def get_current_sharks(self) -> List:
@@ -93,12 +233,14 @@ class FishTank(object):
         Get current list of sharks with coords
         :return: List of sharks and coordinates
         """
-        # tuple of coord and animal
-        current_sharks = []
-        for coord, animal in self._grid.items():
-            if animal.animal_type == Animal.Shark:
-                current_sharks.append((coord, animal))
-        return current_sharks
+        return list(self._shark_dict.items())
+
+    def get_current_fishes(self) -> List:
+        """
+        Get current list of fishes with coords
+        :return: List of fishes and coordinates
+        """
+        return list(self._fish_dict.items())
 
     def find_fish_to_eat(self, coord) -> Tuple:
         """
@@ -106,18 +248,13 @@ class FishTank(object):
         :param coord: coordinates to start from
         :return: Tuple of coordinate and fish
         """
-        startx, starty = coord
-        for k, (x, y) in SQUARE_NEIGH.items():
-            new_coord = self._generate_find_coordinate(startx, starty, x, y)
-            if self.is_valid_grid_coord(coordinates=new_coord, raise_err=False):
-                # normally this should be trace
-                _logger.debug("find_fish_to_eat() - Looking for fish at : [{}]".format(new_coord))
-                animal = self.check_animal(new_coord)
-                if animal is None:
-                    continue
-                if animal.animal_type == Animal.Fish:
-                    _logger.debug("find_fish_to_eat() - Found fish at : [{}]".format(new_coord))
-                    return new_coord, animal
+        x, y = coord
+        directions = MASK_DIRECTIONS[self._fish_neighbours[x * self.grid_size + y]]
+        if directions:
+            dx, dy = self._neighbours.class_offsets[self._neighbours.edge_class(x, y)][directions[0]]
+            fish_coord = (x + dx, y + dy)
+            _logger.debug("find_fish_to_eat() - Found fish at : [{}]".format(fish_coord))
+            return fish_coord, self.check_animal(fish_coord)
 
     def eat_fish(self, sim_turn, shark_coord, fish_coord):
         """
@@ -128,21 +265,130 @@ class FishTank(object):
         """
         shark_eater = self._grid[shark_coord]
         fish_eaten = self._grid.pop(fish_coord)
-        fish_eaten.alive = False
+        self._remove_from_index(fish_coord, fish_eaten)
 
         self.move_animal(shark_coord, shark_eater, fish_coord)
         shark_eater.last_fed = sim_turn
         _logger.debug("eat_fish() - Shark {} has eaten fish {} at [{}]".format(shark_eater.oid, fish_eaten.oid,
                                                                                fish_coord))
 
-    def _generate_find_coordinate(self, startx, starty, x, y) -> Tuple:
+    def record_breed(self, coord, sim_turn):
+        """
+        Update breeding attributes of the animal at coord
+        :param coord: coordinates of the breeding animal
+        :param sim_turn: current simulation turn
+        """
+        animal = self._grid[coord]
+        animal.breed_count += 1
+        animal.last_breed = sim_turn
+
+    def begin_phase(self, sharks_first: bool = False, animals: List[Tuple] = None) -> Iterable[Tuple]:
+        """
+        Start a phase acting on the animals, moves and spawns go through carry_animal and spawn_animal until end_phase.
+        Animals are updated in place, a synchronous phase only updates the masks at its end.
+        Each animal comes with its position in the phase, tanks may leave out animals that cannot act while the
+        others keep their position
+        :param sharks_first: return the sharks then the fishes instead of the animals in grid order
+        :param animals: coordinates and animals to act on, every animal if not set
+        :return: position, coordinates and animal at the start of the phase
+        """
+        self._pending_moves = []
+        if animals is None:
+            # only the occupied cells are copied: a cell is left by its animal when it acts and cells free at the
+            # start are not listed, so each listed cell still holds its animal when its turn comes
+            coords = list(self._shark_dict) + list(self._fish_dict) if sharks_first else list(self._grid)
+            grid = self._grid
+            return ((position, coord, grid[coord]) for position, coord in enumerate(coords))
+        if sharks_first:
+            animals = sorted(animals, key=lambda coord_animal: coord_animal[1].animal_type != Animal.Shark)
+        return ((position, coord, animal) for position, (coord, animal) in enumerate(animals))
+
+    def _mark_arrival(self, old_coord, new_coord, is_fish):
+        if old_coord is not None:
+            self._mark_free(old_coord)
+            if is_fish:
+                self._unmark_fish(old_coord)
+        self._mark_occupied(new_coord)
+        if is_fish:
+            self._mark_fish(new_coord)
+
+    def carry_animal(self, coord, animal, new_coord=None):
         """
-        Generates next coordinate to look for cell evaluation
-        created to allow different grid topologies
+        Move an animal during a phase
+        :param coord: coordinates of the animal at the start of the phase
+        :param animal: the animal
+        :param new_coord: free cell to move to, the animal stays if not set or if the cell is already taken
+        :return: coordinates of the animal after the move
         """
-        new_coord = (startx + x, starty + y)
+        if new_coord is None or new_coord in self._grid:
+            return coord
+        is_fish = animal.animal_type is Animal.Fish
+        species = self._fish_dict if is_fish else self._shark_dict
+        del self._grid[coord]
+        del species[coord]
+        self._grid[new_coord] = animal
+        species[new_coord] = animal
+        if not is_fish:
+            self._shark_coords[animal.oid] = new_coord
+        if self.synchronous:
+            self._pending_moves.append((coord, new_coord, is_fish))
+        else:
+            self._mark_arrival(coord, new_coord, is_fish)
         return new_coord
 
+    def spawn_animal(self, coord, animal) -> bool:
+        """
+        Put a new animal during a phase
+        :param coord: cell free at the start of the phase
+        :param animal: the new animal
+        :return: False if the cell is already taken
+        """
+        if coord in self._grid:
+            return False
+        is_fish = animal.animal_type is Animal.Fish
+        self._grid[coord] = animal
+        if is_fish:
+            self._fish_dict[coord] = animal
+        else:
+            self._shark_dict[coord] = animal
+            self._shark_coords[animal.oid] = coord
+        if self.synchronous:
+            self._pending_moves.append((None, coord, is_fish))
+        else:
+            self._mark_arrival(None, coord, is_fish)
+        return True
+
+    def end_phase(self):
+        """
+        End a phase, the masks of a synchronous phase are updated
+        """
+        # cells are left before they are entered, a cell left during the phase can be spawned into
+        for old_coord, new_coord, is_fish in self._pending_moves:
+            if old_coord is not None:
+                self._mark_free(old_coord)
+                if is_fish:
+                    self._unmark_fish(old_coord)
+        for old_coord, new_coord, is_fish in self._pending_moves:
+            self._mark_arrival(None, new_coord, is_fish)
+        self._pending_moves = []
+
+    def track_dirty_cells(self):
+        """
+        Start recording the cells whose occupancy changes
+        """
+        self._dirty_cells = set()
+
+    def take_dirty_region(self) -> Set[Tuple]:
+        """
+        Cells within one step of a cell whose occupancy changed since the last call, the record is then cleared.
+        Animals outside of this region kept the same free neighbours
+        """
+        dirty, self._dirty_cells = self._dirty_cells, set()
+        region = set(dirty)
+        for x, y in dirty:
+            region.update(self._neighbours.neighbour_coords(x, y))
+        return region
+
     def find_available_nearby_space(self, start_coordinate, shuffle: bool = True) -> List[Tuple]:
         """
         for a given coordinate, return all available neighbours
@@ -150,20 +396,129 @@ class FishTank(object):
         :param shuffle: boolean to shuffle the return coordinates
         :return: List of free neighboring coordinates
         """
-        available_neighbors = []
-        startx, starty = start_coordinate
-        for k, (x, y) in SQUARE_NEIGH.items():
-            new_coord = self._generate_find_coordinate(startx, starty, x, y)
-            if self.is_valid_grid_coord(coordinates=new_coord, raise_err=False):
-                animal = self.check_animal(new_coord)
-                if animal is None:
-                    available_neighbors.append(new_coord)
-
+        x, y = start_coordinate
+        offsets = self._neighbours.class_offsets[self._neighbours.edge_class(x, y)]
+        available_neighbors = [(x + offsets[d][0], y + offsets[d][1])
+                               for d in MASK_DIRECTIONS[self._free_neighbours[x * self.grid_size + y]]]
         if shuffle:
-            random.shuffle(available_neighbors)
+            self.rng.shuffle(available_neighbors)
         # _logger.debug("find_available_nearby_space() - {}".format(available_neighbors))
         return available_neighbors
 
+    def has_available_nearby_space(self, coord) -> bool:
+        """
+        Check if a coordinate has at least one free neighbour
+        :param coord: coordinate tuple
+        """
+        x, y = coord
+        return self._free_neighbours[x * self.grid_size + y] != 0
+
+    def pick_available_nearby_space(self, coord, draw: float = None):
+        """
+        Pick a random free neighbour
+        :param coord: coordinate tuple
+        :param draw: uniform float in [0, 1) choosing the neighbour, taken from rng if not set
+        :return: coordinates of the free neighbour or None if there is no free neighbour
+        """
+        x, y = coord
+        directions = MASK_DIRECTIONS[self._free_neighbours[x * self.grid_size + y]]
+        if not directions:
+            return None
+        if draw is None:
+            draw = self.rng.random()
+        dx, dy = self._neighbours.class_offsets[self._neighbours.edge_class(x, y)][
+            directions[int(draw * len(directions))]]
+        return x + dx, y + dy
+
+    def _free_mask(self, x, y) -> int:
+        """
+        Free neighbours of a cell as a bit mask, bit d set when the neighbour in direction d is free
+        """
+        return self._free_neighbours[x * self.grid_size + y]
+
+    def _window_is_open(self, x, y, table) -> bool:
+        """
+        Check every cell of the reach window around (x, y) is free, apart from (x, y) itself
+        :param table: ReachTable of the speed
+        """
+        size = self.grid_size
+        for dx, dy, mask in table.inner:
+            if self._free_mask((x + dx) % size, (y + dy) % size) != mask:
+                return False
+        return True
+
+    def pick_reachable_space(self, coord, speed: int, draw: float = None):
+        """
+        Pick a random free cell reachable in at most speed steps through free cells. The cells in reach come from the
+        cached reach table of the speed: all of its window when the animal has free cells all around, otherwise the
+        ones a breadth first search bounded to speed levels reaches by following the free neighbour masks.
+        Visited window cells are stamped in a buffer kept between searches so nothing is cleared or allocated per
+        search. A speed of 1 is the same as pick_available_nearby_space.
+        :param coord: coordinate tuple
+        :param speed: maximum number of steps
+        :param draw: uniform float in [0, 1) choosing the cell, taken from rng if not set
+        :return: coordinates of the free cell or None if there is no free neighbour
+        """
+        if speed <= 1:
+            return self.pick_available_nearby_space(coord, draw)
+        if not self.has_available_nearby_space(coord):
+            return None
+        if draw is None:
+            draw = self.rng.random()
+        table = reach_table(self.grid_size, self.topology, speed)
+        if not table.fits:
+            return self._search_reachable(coord, speed, draw)
+        x, y = coord
+        size = self.grid_size
+        offsets = table.offsets
+        if self._window_is_open(x, y, table):
+            dx, dy = offsets[1 + int(draw * (len(offsets) - 1))]
+            return (x + dx) % size, (y + dy) % size
+        stamps = self._reach_stamps
+        if len(stamps) < len(offsets):
+            stamps.extend([0] * (len(offsets) - len(stamps)))
+        self._reach_stamp += 1
+        stamp = self._reach_stamp
+        steps = table.steps
+        reached = self._reached
+        del reached[:]
+        reached.append(0)
+        stamps[0] = stamp
+        level_start = 0
+        for _ in range(speed):
+            level_end = len(reached)
+            if level_start == level_end:
+                break
+            for i in range(level_start, level_end):
+                window = reached[i]
+                dx, dy = offsets[window]
+                for d in MASK_DIRECTIONS[self._free_mask((x + dx) % size, (y + dy) % size)]:
+                    step = steps[window][d]
+                    if stamps[step] != stamp:
+                        stamps[step] = stamp
+                        reached.append(step)
+            level_start = level_end
+        # the start cell is not a destination
+        dx, dy = offsets[reached[1 + int(draw * (len(reached) - 1))]]
+        return (x + dx) % size, (y + dy) % size
+
+    def _search_reachable(self, coord, speed: int, draw: float):
+        """
+        pick_reachable_space on a pacman grid too small for the reach window, searching coordinates
+        """
+        reached = [coord]
+        seen = {coord}
+        level_start = 0
+        for _ in range(speed):
+            level_end = len(reached)
+            for i in range(level_start, level_end):
+                for new_coord in self.find_available_nearby_space(reached[i], shuffle=False):
+                    if new_coord not in seen:
+                        seen.add(new_coord)
+                        reached.append(new_coord)
+            level_start = level_end
+        return reached[1 + int(draw * (len(reached) - 1))]
+
     # is_valid_grid_coord (different shapes and/or pacman style)
     def is_valid_grid_coord(self, coordinates, raise_err: bool = True) -> bool:
         """
@@ -196,9 +551,8 @@ class FishTank(object):
         print("")
         for y in range(0, self.grid_size):
             for x in range(0, self.grid_size):
-                coord = (x, y)
-                if coord in self._grid:
-                    animal = self._grid[(x, y)]
+                animal = self.check_animal((x, y))
+                if animal is not None:
                     print("{} ".format(animal), end='')
                 else:
                     print("{} ".format(NO_OBJECT_OID), end='')
@@ -230,9 +584,8 @@ class FishTank(object):
         """
         row_string_list = []
         for x in range(0, self.grid_size):
-            coord = (x, y)
-            if coord in self._grid:
-                animal = self._grid[(x, y)]
+            animal = self.check_animal((x, y))
+            if animal is not None:
                 row_string_list.append("{}".format(animal))
             else:
                 row_string_list.append(NO_OBJECT_OID)
@@ -243,24 +596,9 @@ class FishTank(object):
 class PacmanFishTank(FishTank):
     """
     Demonstrate how to allow pacman style grid topology
+    Movement beyond an edge wraps around to the opposite edge for both x and y, the neighbour table takes care of it
     """
-    def __init__(self, grid_size):
-        super().__init__(grid_size)
-
-    def _generate_find_coordinate(self, startx, starty, x, y):
-        """
-        Pacman specific coordinate generator
-        Allows movement beyond an edge to wrap around to the opposite edge for both x and y
-        """
-        newx = startx + x
-        if newx < 0:
-            newx = self.grid_size - 1
-        elif newx > self.grid_size - 1:
-            newx = newx - self.grid_size
-        newy = starty + y
-        if newy < 0:
-            newy = self.grid_size - 1
-        elif newy > self.grid_size - 1:
-            newy = newy - self.grid_size
-        new_coord = (newx, newy)
-        return new_coord
+    topology = PACMAN_TOPOLOGY
+
+    def __init__(self, grid_size, synchronous=False, rng=None):
+        super().__init__(grid_size, synchronous, rng)
@@ -0,0 +1,216 @@
+import logging
+from typing import Iterable, List, Tuple
+
+from fish_bowl.data_struct.fish_tank import FishTank, PacmanFishTank
+from fish_bowl.process.topology import SQUARE_TOPOLOGY, neighbour_table
+
+_logger = logging.getLogger(__name__)
+
+# cell flags of a tile
+OCCUPIED = 1
+FISH = 2
+
+
+class Tile(object):
+    """
+    Square block of cells of a tiled grid: one flag byte per cell and the number of occupied cells
+    """
+    __slots__ = ('cells', 'population')
+
+    def __init__(self, tile_size: int):
+        self.cells = bytearray(tile_size * tile_size)
+        self.population = 0
+
+
+class TiledFishTank(FishTank):
+    """
+    Fish tank for very large sparse grids: occupancy and fish positions are kept in fixed size square tiles,
+    allocated when an animal enters them and dropped when the last one leaves, so empty regions cost nothing instead
+    of the per cell neighbour masks of FishTank. Each tile counts its animals, the cells inside a fully packed tile
+    are known to be boxed in without looking at their neighbours and phases skip them.
+    Neighbours are listed in SQUARE_NEIGH order so random draws match the ones of FishTank.
+    """
+
+    def __init__(self, grid_size, synchronous=False, rng=None, tile_size=16):
+        """
+        :param grid_size: size of the grid
+        :param synchronous: phases use the start of phase state for every animal
+        :param rng: random source with choice and shuffle such as the engine BatchedRandom, the random module if not set
+        :param tile_size: side of the tiles in cells
+        """
+        self.tile_size = tile_size
+        super().__init__(grid_size, synchronous, rng)
+
+    def _init_neighbourhood(self):
+        # only the edge classes of the table are used, its per cell arrays are never built
+        self._neighbours = neighbour_table(self.grid_size, self.topology)
+        self._tiles = {}
+
+    def _locate(self, coord) -> Tuple[Tuple[int, int], int]:
+        """
+        :return: key of the tile holding coord and index of the cell in the tile
+        """
+        tx, ix = divmod(coord[0], self.tile_size)
+        ty, iy = divmod(coord[1], self.tile_size)
+        return (tx, ty), ix * self.tile_size + iy
+
+    def _flags(self, coord) -> int:
+        key, index = self._locate(coord)
+        tile = self._tiles.get(key)
+        return 0 if tile is None else tile.cells[index]
+
+    def _mark_free(self, coord):
+        key, index = self._locate(coord)
+        tile = self._tiles.get(key)
+        if tile is not None and tile.cells[index] & OCCUPIED:
+            tile.cells[index] = 0
+            tile.population -= 1
+            if tile.population == 0:
+                del self._tiles[key]
+        if self._dirty_cells is not None:
+            self._dirty_cells.add(coord)
+
+    def _mark_occupied(self, coord):
+        key, index = self._locate(coord)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = self._tiles[key] = Tile(self.tile_size)
+        if not tile.cells[index] & OCCUPIED:
+            tile.cells[index] |= OCCUPIED
+            tile.population += 1
+        if self._dirty_cells is not None:
+            self._dirty_cells.add(coord)
+
+    def _mark_fish(self, coord):
+        key, index = self._locate(coord)
+        self._tiles[key].cells[index] |= FISH
+
+    def _unmark_fish(self, coord):
+        # the tile is gone if the cell was freed first
+        key, index = self._locate(coord)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            tile.cells[index] &= ~FISH
+
+    def get_tile_populations(self) -> dict:
+        """
+        Number of animals of each allocated tile, by tile key (x // tile_size, y // tile_size)
+        """
+        return {key: tile.population for key, tile in self._tiles.items()}
+
+    def _is_packed(self, coord) -> bool:
+        """
+        Check if a cell is inside a fully packed tile, away from its border, so all its neighbours are occupied
+        """
+        key, index = self._locate(coord)
+        tile = self._tiles.get(key)
+        if tile is None or tile.population < self.tile_size * self.tile_size:
+            return False
+        ix, iy = divmod(index, self.tile_size)
+        return 0 < ix < self.tile_size - 1 and 0 < iy < self.tile_size - 1
+
+    def find_fish_to_eat(self, coord) -> Tuple:
+        """
+        Given a shark coordinate, return the first available fish and it's coordinate to eat
+        :param coord: coordinates to start from
+        :return: Tuple of coordinate and fish
+        """
+        for new_coord in self._neighbours.neighbour_coords(*coord):
+            if self._flags(new_coord) & FISH:
+                _logger.debug("find_fish_to_eat() - Found fish at : [{}]".format(new_coord))
+                return new_coord, self._grid[new_coord]
+
+    def find_available_nearby_space(self, start_coordinate, shuffle: bool = True) -> List[Tuple]:
+        """
+        for a given coordinate, return all available neighbours
+        :param start_coordinate: starting coordinate tuple
+        :param shuffle: boolean to shuffle the return coordinates
+        :return: List of free neighboring coordinates
+        """
+        if self._is_packed(start_coordinate):
+            return []
+        available_neighbors = [c for c in self._neighbours.neighbour_coords(*start_coordinate)
+                               if not self._flags(c) & OCCUPIED]
+        if shuffle:
+            self.rng.shuffle(available_neighbors)
+        return available_neighbors
+
+    def has_available_nearby_space(self, coord) -> bool:
+        """
+        Check if a coordinate has at least one free neighbour
+        :param coord: coordinate tuple
+        """
+        if self._is_packed(coord):
+            return False
+        x, y = coord
+        for offset in self._neighbours.class_offsets[self._neighbours.edge_class(x, y)]:
+            if offset is not None and not self._flags((x + offset[0], y + offset[1])) & OCCUPIED:
+                return True
+        return False
+
+    def begin_phase(self, sharks_first: bool = False, animals: List[Tuple] = None) -> Iterable[Tuple]:
+        """
+        Start a phase, leaving out the animals inside fully packed tiles: they cannot move or breed into a free cell.
+        Tiles are checked when the animal comes, an animal of the phase may have left the tile since its start
+        """
+        phase = super().begin_phase(sharks_first, animals)
+        return (item for item in phase if not self._is_packed(item[1]))
+
+    def pick_available_nearby_space(self, coord, draw: float = None):
+        """
+        Pick a random free neighbour
+        :param coord: coordinate tuple
+        :param draw: uniform float in [0, 1) choosing the neighbour, taken from rng if not set
+        :return: coordinates of the free neighbour or None if there is no free neighbour
+        """
+        available_neighbors = self.find_available_nearby_space(coord, shuffle=False)
+        if not available_neighbors:
+            return None
+        if draw is None:
+            draw = self.rng.random()
+        return available_neighbors[int(draw * len(available_neighbors))]
+
+    def _free_mask(self, x, y) -> int:
+        if self._is_packed((x, y)):
+            return 0
+        mask = 0
+        for d, offset in enumerate(self._neighbours.class_offsets[self._neighbours.edge_class(x, y)]):
+            if offset is not None and not self._flags((x + offset[0], y + offset[1])) & OCCUPIED:
+                mask |= 1 << d
+        return mask
+
+    def _window_is_open(self, x, y, table) -> bool:
+        """
+        Check the reach window around (x, y) is free from the populations of the tiles it overlaps: the animal at
+        (x, y) is then alone in them
+        :param table: ReachTable of the speed
+        """
+        speed = table.speed
+        size = self.grid_size
+        if self.topology == SQUARE_TOPOLOGY and not (speed <= x < size - speed and speed <= y < size - speed):
+            return False
+        tile_xs = {((x + d) % size) // self.tile_size for d in range(-speed, speed + 1)}
+        tile_ys = {((y + d) % size) // self.tile_size for d in range(-speed, speed + 1)}
+        population = 0
+        for tx in tile_xs:
+            for ty in tile_ys:
+                tile = self._tiles.get((tx, ty))
+                if tile is not None:
+                    population += tile.population
+                    if population > 1:
+                        return False
+        return True
+
+    def __repr__(self):
+        """
+        Animals by coordinates, without the empty cells
+        """
+        return "\r\n" + "\r\n".join("{}: {}".format(coord, animal) for coord, animal in sorted(self._grid.items()))
+
+
+class PacmanTiledFishTank(TiledFishTank, PacmanFishTank):
+    """
+    Tiled fish tank with a pacman style grid topology
+    """
+    def __init__(self, grid_size, synchronous=False, rng=None, tile_size=16):
+        super().__init__(grid_size, synchronous, rng, tile_size)
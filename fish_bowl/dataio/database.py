@@ -4,7 +4,7 @@ from contextlib import contextmanager
 import re
 import os
 
-from sqlalchemy import event, exc
+from sqlalchemy import event, exc, inspect, text
 from sqlalchemy.engine import Engine, create_engine
 from sqlite3 import Connection as SQLite3Connection
 from sqlalchemy.orm import sessionmaker
@@ -54,6 +54,22 @@ def blank_password(database_url):
     return re.sub(':[^@:]*@', ':xxx@', database_url)
 
 
+def create_missing_indexes(declarative_base, engine):
+    """
+    Create the indexes declared on the tables of declarative_base that the database does not have yet. create_all only
+    creates the indexes of the tables it creates, this adds the indexes declared since to an existing database file
+    :param declarative_base:
+    :param engine:
+    :return:
+    """
+    inspector = inspect(engine)
+    for table in declarative_base.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+
+
 @contextmanager
 def session_scope(session_builder):
     """
@@ -83,8 +99,46 @@ class SQLAlchemyQueries:
             kwargs = {'pool_recycle': POOL_RECYCLE, 'pool_size': POOL_SIZE, 'poolclass': 'StaticPool'}
             self.engine = create_engine(database_url, **kwargs)
         self._session_maker = sessionmaker(bind=self._engine, expire_on_commit=expire_on_commit)
+        # session of the open unit of work, None outside of it
+        self._unit_session = None
         if declarative_base:
             declarative_base.metadata.create_all(bind=self._engine, checkfirst=True)
+            create_missing_indexes(declarative_base, self._engine)
 
     def session_scope(self):
-        return session_scope(self._session_maker)
\ No newline at end of file
+        if self._unit_session is not None:
+            return self._savepoint_scope()
+        return session_scope(self._session_maker)
+
+    @contextmanager
+    def _savepoint_scope(self):
+        """
+        Scope of a call inside a unit of work: a savepoint of the unit session, rolled back alone on errors
+        """
+        with self._unit_session.begin_nested():
+            yield self._unit_session
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Run all the queries of the block in one session and one transaction, committed once at the end of the block or
+        rolled back if the block raises. session_scope calls inside the block get a savepoint of that session.
+        Nested blocks join the unit of work already open.
+        """
+        if self._unit_session is not None:
+            yield self._unit_session
+            return
+        session = self._session_maker()
+        if session.bind.dialect.name == 'sqlite':
+            # pysqlite only opens a transaction before writes, the first savepoint would open and release commit it
+            session.connection().execute(text('BEGIN'))
+        self._unit_session = session
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self._unit_session = None
+            session.close()
\ No newline at end of file
@@ -1,19 +1,21 @@
 import datetime as dt
 import logging
 import os
-from typing import List, Dict
+from typing import Dict, Iterable, List, Tuple
 
 import pandas as pd
 
 from fish_bowl.dataio.database import SQLAlchemyQueries
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Enum, Boolean, Integer
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Enum, Boolean, Index, Integer, and_, bindparam, update
 from sqlalchemy.orm import validates
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm.exc import NoResultFound
 
 from fish_bowl.process.utils import ImpossibleAction, Animal
-from fish_bowl.process.topology import SquareGridCoordinate, square_grid_valid, NonEmptyCoordinate
+from fish_bowl.process.topology import SquareGridCoordinate, square_grid_valid, NonEmptyCoordinate, neighbour_table
 
 _logger = logging.getLogger(__name__)
 
@@ -22,6 +24,11 @@ DB_LOC = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', 'simul
 Base = declarative_base()
 schema = 'main'  # in sqlite, schema is always main, in other db, look for the owner schema name
 
+# animal attributes update_animals can change
+UPDATABLE_ATTRIBUTES = ('breed_count', 'last_breed', 'last_fed')
+# oids bound in a single IN clause, sqlite limits the number of bound parameters of a statement
+MAX_IN_OIDS = 500
+
 
 def get_database_string():
     return r'sqlite:///{}'.format(DB_LOC)
@@ -65,7 +72,13 @@ class Animals(Base):
     coord_x = Column(Integer)
     coord_y = Column(Integer)
 
-    __table_args__ = ({'schema': schema})
+    # partial indexes over the live animals, where the backend has them: dead animals are never looked up by position
+    # or type. Both models of the ANIMALS table declare them under the same names
+    __table_args__ = (Index('ix_animals_live_position', sim_id, coord_x, coord_y, sqlite_where=alive == True,
+                            postgresql_where=alive == True),
+                      Index('ix_animals_live_type', sim_id, animal_type, last_fed, sqlite_where=alive == True,
+                            postgresql_where=alive == True),
+                      {'schema': schema})
 
     def __repr__(self):
         if self.alive:
@@ -135,7 +148,7 @@ class SimulationClient(SQLAlchemyQueries):
         _logger.debug("get_animal_in_position()")
         with self.session_scope() as s:
             query = s.query(Simulation)
-            return pd.read_sql(query.statement, query.session.bind)
+            return pd.read_sql(query.statement, s.connection())
 
     def init_animal(self, sim_id: int, current_turn: int, animal_type: Animal, coordinate: SquareGridCoordinate):
         """
@@ -211,8 +224,10 @@ class SimulationClient(SQLAlchemyQueries):
         """
         _logger.debug("get_animals_by_type()")
         with self.session_scope() as s:
-            q = s.query(Animals).filter(Animals.sim_id == sim_id, Animals.alive, Animals.animal_type == animal_type)
-            return pd.read_sql(q.statement, q.session.bind)
+            # in oid order, whatever index the query goes through
+            q = s.query(Animals).filter(Animals.sim_id == sim_id, Animals.alive, Animals.animal_type == animal_type).\
+                order_by(Animals.oid)
+            return pd.read_sql(q.statement, s.connection())
 
     def get_animals_df(self, sim_id: int):
         """
@@ -222,8 +237,37 @@ class SimulationClient(SQLAlchemyQueries):
         """
         _logger.debug("get_animals_df()")
         with self.session_scope() as s:
-            q = s.query(Animals).filter(Animals.sim_id == sim_id, Animals.alive)
-            return pd.read_sql(q.statement, q.session.bind)
+            q = s.query(Animals).filter(Animals.sim_id == sim_id, Animals.alive).order_by(Animals.oid)
+            return pd.read_sql(q.statement, s.connection())
+
+    def get_occupants(self, sim_id: int, coordinates: Iterable[SquareGridCoordinate]) -> Dict[Tuple[int, int], Animal]:
+        """
+        Type of the live animal on each occupied coordinate, in one query over the rows the coordinates span
+        :param sim_id:
+        :param coordinates:
+        :return: animal type by (x, y), free coordinates are left out
+        """
+        _logger.debug("get_occupants()")
+        cells = {(int(coord.x), int(coord.y)) for coord in coordinates}
+        if not cells:
+            return {}
+        rows = [x for x, y in cells]
+        with self.session_scope() as s:
+            q = s.query(Animals.coord_x, Animals.coord_y, Animals.animal_type).\
+                filter(Animals.sim_id == sim_id, Animals.alive, Animals.coord_x.between(min(rows), max(rows)))
+            return {(x, y): animal_type for x, y, animal_type in q if (x, y) in cells}
+
+    def get_neighbourhood(self, sim_id: int, centres: Iterable[SquareGridCoordinate]) -> Dict[Tuple[int, int], Animal]:
+        """
+        Occupants of the neighbours of a list of cells, e.g. of every animal acting in a phase, fetched at once
+        :param sim_id:
+        :param centres:
+        :return: animal type by (x, y) of the occupied neighbours, the other neighbours are free
+        """
+        table = neighbour_table(self.get_simulation(sim_id=sim_id).grid_size)
+        return self.get_occupants(sim_id=sim_id, coordinates=[SquareGridCoordinate(x, y) for centre in centres
+                                                              for x, y in table.neighbour_coords(int(centre.x),
+                                                                                                 int(centre.y))])
 
     def has_fish_in_square(self, sim_id: int, coordinates: List[SquareGridCoordinate]) -> List[SquareGridCoordinate]:
         """
@@ -233,53 +277,102 @@ class SimulationClient(SQLAlchemyQueries):
         :return:
         """
         _logger.debug("has_fish_in_square()")
-        fish_df = self.get_animals_by_type(sim_id=sim_id, animal_type=Animal.Fish)
-        has_fish = []
-        for coord in coordinates:
-            fta = fish_df[(fish_df.coord_x == coord.x) & (fish_df.coord_y == coord.y)]
-            if len(fta) > 0:
-                has_fish.append(SquareGridCoordinate(int(fta.iloc[0].coord_x), int(fta.iloc[0].coord_y)))
-        return has_fish
+        occupants = self.get_occupants(sim_id=sim_id, coordinates=coordinates)
+        return [SquareGridCoordinate(int(coord.x), int(coord.y)) for coord in coordinates
+                if occupants.get((int(coord.x), int(coord.y))) == Animal.Fish]
 
-    def update_animals(self, sim_id: int, update_dict: Dict):
+    def _live_oids(self, session, sim_id: int, oids) -> List[int]:
+        """
+        Oids of the live animals of a simulation among oids
+        """
+        oids = [int(oid) for oid in oids]
+        live = []
+        for start in range(0, len(oids), MAX_IN_OIDS):
+            query = session.query(Animals.oid).filter(Animals.sim_id == sim_id, Animals.alive,
+                                                      Animals.oid.in_(oids[start:start + MAX_IN_OIDS]))
+            live.extend(oid for oid, in query)
+        return live
+
+    @staticmethod
+    def _synchronize(session, oids: List[int], values: Dict):
+        """
+        Set the values written by an UPDATE statement on the animals the session already holds
+        """
+        for oid in oids:
+            animal = session.identity_map.get(identity_key(Animals, oid))
+            if animal is not None:
+                for k, v in values.items():
+                    set_committed_value(animal, k, v)
+
+    def update_animals(self, sim_id: int, update_dict: Dict) -> List[int]:
         """
         Update some animal attribute Only for
         - breed_count
         - last_breed
         - last_fed
+        Animals updating the same attributes are updated by one executemany UPDATE
         :param sim_id:
-        :param update_dict:
-        :return:
+        :param update_dict: attributes to update by oid
+        :return: oids of the live animals updated
         """
         _logger.debug("update_animals()")
-        scope = list(update_dict.keys())
+        updated = []
+        # rows of the executemany of each set of updated attributes
+        batches = {}
         with self.session_scope() as s:
-            animal_list = s.query(Animals).filter(Animals.sim_id == sim_id, Animals.alive).all()
-            for animal in animal_list:
-                if animal.oid in scope:
-                    for k, v in update_dict[animal.oid].items():
-                        if k in ['breed_count', 'last_breed', 'last_fed']:
-                            setattr(animal, k, v)
-                        else:
-                            _logger.error('Cannot update {} property with this method'.format(k))
-            s.flush()
-        return
-
-    def kill_animal(self, sim_id: int, animal_ids: List[int]):
+            live = set(self._live_oids(s, sim_id, update_dict.keys()))
+            for oid, updates in update_dict.items():
+                for k in updates:
+                    if k not in UPDATABLE_ATTRIBUTES:
+                        _logger.error('Cannot update {} property with this method'.format(k))
+                values = {k: int(v) for k, v in updates.items() if k in UPDATABLE_ATTRIBUTES}
+                if int(oid) not in live or not values:
+                    continue
+                updated.append(int(oid))
+                self._synchronize(s, [int(oid)], values)
+                batches.setdefault(tuple(sorted(values)), []).append(
+                    dict({'b_' + k: v for k, v in values.items()}, b_oid=int(oid)))
+            for attributes, rows in batches.items():
+                statement = update(Animals).where(Animals.oid == bindparam('b_oid')).\
+                    values({k: bindparam('b_' + k) for k in attributes}).\
+                    execution_options(synchronize_session=False)
+                s.execute(statement, rows)
+        return updated
+
+    def kill_animal(self, sim_id: int, animal_ids: List[int]) -> List[int]:
         """
         Set alive property to False
         :param sim_id:
         :param animal_ids:
-        :return:
+        :return: oids of the animals killed, the ones alive before the call
         """
         _logger.debug("kill_animal()")
         with self.session_scope() as s:
-            animal_list = s.query(Animals).filter(Animals.sim_id == sim_id, Animals.alive).all()
-            for animal in animal_list:
-                if animal.oid in animal_ids:
-                    animal.alive = False
-            s.flush()
-        return
+            killed = self._live_oids(s, sim_id, animal_ids)
+            for start in range(0, len(killed), MAX_IN_OIDS):
+                s.execute(update(Animals).where(Animals.oid.in_(killed[start:start + MAX_IN_OIDS])).
+                          values(alive=False).execution_options(synchronize_session=False))
+            self._synchronize(s, killed, {'alive': False})
+        return killed
+
+    def kill_starving_sharks(self, sim_id: int, current_turn: int, shark_starving: int) -> List[int]:
+        """
+        Kill the sharks that have not eaten for more than shark_starving turns, with one UPDATE
+        :param sim_id:
+        :param current_turn:
+        :param shark_starving: number of turns a shark survives without eating (simulation param)
+        :return: oids of the sharks killed
+        """
+        _logger.debug("kill_starving_sharks()")
+        starving = (Animals.sim_id == sim_id, Animals.alive, Animals.animal_type == Animal.Shark,
+                    int(current_turn) - Animals.last_fed > int(shark_starving))
+        with self.session_scope() as s:
+            starved = [oid for oid, in s.query(Animals.oid).filter(*starving)]
+            if starved:
+                s.execute(update(Animals).where(and_(*starving)).values(alive=False).
+                          execution_options(synchronize_session=False))
+                self._synchronize(s, starved, {'alive': False})
+        return starved
 
     def eat_animal_in_square(self, sim_id: int, coordinate: SquareGridCoordinate):
         """
@@ -323,3 +416,225 @@ class SimulationClient(SQLAlchemyQueries):
                 a_.coord_y = new_position.y
             else:
                 raise ImpossibleAction('Attempting to move a dead animal: {}'.format(a_))
+
+    def turn(self, sim_id: int):
+        """
+        Unit of work of a simulation turn: use as `with client.turn(sim_id):` around the calls of a turn so they share
+        one session and are committed once. A call failing in it, e.g. move_animal on an occupied coordinate, only rolls
+        its own changes back.
+        :param sim_id:
+        :return:
+        """
+        _logger.debug("turn({})".format(sim_id))
+        return self.unit_of_work()
+
+    def flush(self):
+        """
+        Write buffered changes to the database, nothing is buffered by this client
+        """
+        return
+
+
+# columns of the ANIMALS table, in table order
+ANIMAL_COLUMNS = [column.name for column in Animals.__table__.columns]
+
+
+class WriteBehindSimulationClient(SimulationClient):
+    """
+    SimulationClient keeping the live animals of its simulations in memory: reads are served from an in-memory index
+    by oid and by position, changes are buffered and written to the ANIMALS table in one transaction by flush.
+    The database stays the system of record between flushes, the client must be the only writer of the simulations it
+    works on. Animal oids are allocated by the client, after the highest oid in the table when it first needs one.
+    """
+
+    def __init__(self, database_url):
+        super().__init__(database_url)
+        self._simulations = {}
+        # live animals of each loaded simulation: row dicts by oid and oids by (x, y)
+        self._animals = {}
+        self._positions = {}
+        # rows to write at the next flush, by oid, and oids of the rows to insert
+        self._pending = {}
+        self._new_oids = set()
+        self._next_oid = None
+
+    def _load(self, sim_id: int):
+        """
+        Index the live animals of a simulation, loading them from the database on first use
+        """
+        if sim_id not in self._animals:
+            animals = super().get_animals_df(sim_id=sim_id)
+            self._animals[sim_id] = {row['oid']: row for row in animals.to_dict('records')}
+            self._positions[sim_id] = {(row['coord_x'], row['coord_y']): oid
+                                       for oid, row in self._animals[sim_id].items()}
+        return self._animals[sim_id], self._positions[sim_id]
+
+    def _changed(self, row: Dict):
+        self._pending[row['oid']] = row
+
+    def _allocate_oid(self) -> int:
+        if self._next_oid is None:
+            with self.session_scope() as s:
+                self._next_oid = (s.query(func.max(Animals.oid)).scalar() or 0) + 1
+        oid = self._next_oid
+        self._next_oid += 1
+        return oid
+
+    def _to_frame(self, rows) -> pd.DataFrame:
+        return pd.DataFrame(list(rows), columns=ANIMAL_COLUMNS)
+
+    def init_simulation(self, *args, **kwargs):
+        sid = super().init_simulation(*args, **kwargs)
+        self._animals[sid] = {}
+        self._positions[sid] = {}
+        return sid
+
+    def get_simulation(self, sim_id: int) -> Simulation:
+        """
+        Fetch a simulation by id, once per simulation
+        """
+        if sim_id not in self._simulations:
+            self._simulations[sim_id] = super().get_simulation(sim_id=sim_id)
+        return self._simulations[sim_id]
+
+    def init_animal(self, sim_id: int, current_turn: int, animal_type: Animal, coordinate: SquareGridCoordinate):
+        """
+        use for single animal init
+        :return: oid of the new animal
+        """
+        try:
+            simulation = self.get_simulation(sim_id=sim_id)
+        except NoResultFound:
+            raise ValueError("Simulation {} doesn't exist!".format(sim_id))
+        square_grid_valid(grid_size=simulation.grid_size, coordinates=coordinate)
+        animals, positions = self._load(sim_id)
+        if (coordinate.x, coordinate.y) in positions:
+            raise NonEmptyCoordinate('Coordinate {} is occupied'.format(coordinate))
+        row = dict(oid=self._allocate_oid(), sim_id=sim_id, animal_type=animal_type, spawn_turn=current_turn,
+                   breed_count=0, last_breed=0, last_fed=current_turn, alive=True, coord_x=coordinate.x,
+                   coord_y=coordinate.y)
+        animals[row['oid']] = row
+        positions[(coordinate.x, coordinate.y)] = row['oid']
+        self._changed(row)
+        self._new_oids.add(row['oid'])
+        return row['oid']
+
+    def coordinate_is_occupied(self, sim_id: int, coordinate: SquareGridCoordinate) -> bool:
+        return (coordinate.x, coordinate.y) in self._load(sim_id)[1]
+
+    def get_animal(self, sim_id: int, animal_id: int) -> Animal:
+        """
+        Retrieve a single animal, dead animals are read from the database
+        """
+        row = self._load(sim_id)[0].get(animal_id)
+        if row is None:
+            self.flush()
+            return super().get_animal(sim_id=sim_id, animal_id=animal_id)
+        return Animals(**row)
+
+    def get_animal_in_position(self, sim_id, coordinate: SquareGridCoordinate, live_only: bool = True):
+        if not live_only:
+            self.flush()
+            return super().get_animal_in_position(sim_id=sim_id, coordinate=coordinate, live_only=False)
+        animals, positions = self._load(sim_id)
+        oid = positions.get((coordinate.x, coordinate.y))
+        return [] if oid is None else [Animals(**animals[oid])]
+
+    def get_animals_by_type(self, sim_id: int, animal_type: Animal) -> pd.DataFrame:
+        return self._to_frame(row for row in self._load(sim_id)[0].values() if row['animal_type'] == animal_type)
+
+    def get_animals_df(self, sim_id: int):
+        return self._to_frame(self._load(sim_id)[0].values())
+
+    def get_occupants(self, sim_id: int, coordinates: Iterable[SquareGridCoordinate]) -> Dict[Tuple[int, int], Animal]:
+        animals, positions = self._load(sim_id)
+        occupants = {}
+        for coord in coordinates:
+            oid = positions.get((coord.x, coord.y))
+            if oid is not None:
+                occupants[(int(coord.x), int(coord.y))] = animals[oid]['animal_type']
+        return occupants
+
+    def update_animals(self, sim_id: int, update_dict: Dict) -> List[int]:
+        """
+        Update some animal attribute Only for
+        - breed_count
+        - last_breed
+        - last_fed
+        :return: oids of the live animals updated, like SimulationClient
+        """
+        animals = self._load(sim_id)[0]
+        updated = []
+        for oid, updates in update_dict.items():
+            for k in updates:
+                if k not in UPDATABLE_ATTRIBUTES:
+                    _logger.error('Cannot update {} property with this method'.format(k))
+            values = {k: int(v) for k, v in updates.items() if k in UPDATABLE_ATTRIBUTES}
+            row = animals.get(int(oid))
+            if row is None or not values:
+                continue
+            row.update(values)
+            self._changed(row)
+            updated.append(int(oid))
+        return updated
+
+    def _kill(self, sim_id: int, oid: int):
+        animals, positions = self._load(sim_id)
+        row = animals.pop(oid)
+        del positions[(row['coord_x'], row['coord_y'])]
+        row['alive'] = False
+        self._changed(row)
+
+    def kill_animal(self, sim_id: int, animal_ids: List[int]) -> List[int]:
+        animals = self._load(sim_id)[0]
+        # an oid listed twice is killed once
+        killed = [oid for oid in dict.fromkeys(int(oid) for oid in animal_ids) if oid in animals]
+        for oid in killed:
+            self._kill(sim_id, oid)
+        return killed
+
+    def kill_starving_sharks(self, sim_id: int, current_turn: int, shark_starving: int) -> List[int]:
+        starved = [oid for oid, row in self._load(sim_id)[0].items()
+                   if row['animal_type'] == Animal.Shark and current_turn - row['last_fed'] > shark_starving]
+        for oid in starved:
+            self._kill(sim_id, oid)
+        return starved
+
+    def eat_animal_in_square(self, sim_id: int, coordinate: SquareGridCoordinate):
+        animals, positions = self._load(sim_id)
+        oid = positions.get((coordinate.x, coordinate.y))
+        if oid is None or animals[oid]['animal_type'] != Animal.Fish:
+            _logger.warning('No Fish to eat in {}'.format(coordinate))
+            return False
+        self._kill(sim_id, oid)
+        return True
+
+    def move_animal(self, sim_id: int, animal_id: int, new_position: SquareGridCoordinate):
+        animals, positions = self._load(sim_id)
+        if (new_position.x, new_position.y) in positions:
+            raise NonEmptyCoordinate('Cannot move, coordinate {} is occupied'.format(new_position))
+        square_grid_valid(grid_size=self.get_simulation(sim_id).grid_size, coordinates=new_position)
+        row = animals.get(animal_id)
+        if row is None:
+            raise ImpossibleAction('Attempting to move a dead animal: {}'.format(animal_id))
+        del positions[(row['coord_x'], row['coord_y'])]
+        row['coord_x'] = new_position.x
+        row['coord_y'] = new_position.y
+        positions[(new_position.x, new_position.y)] = animal_id
+        self._changed(row)
+
+    def flush(self):
+        """
+        Write the buffered changes to the ANIMALS table in one transaction: a batched insert of the new animals and a
+        batched update of the changed ones
+        """
+        if not self._pending:
+            return
+        inserts = [row for oid, row in self._pending.items() if oid in self._new_oids]
+        updates = [row for oid, row in self._pending.items() if oid not in self._new_oids]
+        _logger.debug("flush() - {} new animals, {} updated".format(len(inserts), len(updates)))
+        with self.session_scope() as s:
+            s.bulk_insert_mappings(Animals, inserts)
+            s.bulk_update_mappings(Animals, updates)
+        self._pending = {}
+        self._new_oids = set()
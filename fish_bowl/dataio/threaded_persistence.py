@@ -5,7 +5,7 @@ import datetime as dt
 from fish_bowl.dataio.database import SQLAlchemyQueries
 from fish_bowl.process.utils import ImpossibleAction, Animal
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Enum, Boolean, Integer, String
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Enum, Boolean, Index, Integer, String
 from sqlalchemy.orm import validates
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -84,7 +84,13 @@ class Animals(Base):
     coord_x = Column(Integer)
     coord_y = Column(Integer)
 
-    __table_args__ = ({'schema': schema})
+    # partial indexes over the live animals, where the backend has them: dead animals are never looked up by position
+    # or type. Both models of the ANIMALS table declare them under the same names
+    __table_args__ = (Index('ix_animals_live_position', sim_id, coord_x, coord_y, sqlite_where=alive == True,
+                            postgresql_where=alive == True),
+                      Index('ix_animals_live_type', sim_id, animal_type, last_fed, sqlite_where=alive == True,
+                            postgresql_where=alive == True),
+                      {'schema': schema})
 
     def __repr__(self):
         if self.alive:
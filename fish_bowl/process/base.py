@@ -1,32 +1,45 @@
 from collections import namedtuple
-import random
 import logging
 from typing import Dict, List, Tuple
 
 import pandas as pd
 
 from fish_bowl.dataio.persistence import SimulationClient
+from fish_bowl.process.batched_random import BatchedRandom
 from fish_bowl.process.utils import Animal, ImpossibleAction, EndOfSimulatioError
 from fish_bowl.process.topology import SquareGridCoordinate, square_grid_neighbours
 
 _logger = logging.getLogger(__name__)
 
 
+def _cell(coordinate: SquareGridCoordinate) -> Tuple[int, int]:
+    """
+    Key of a coordinate in the occupants of a neighbourhood
+    """
+    return int(coordinate.x), int(coordinate.y)
+
+
 class SimulationGrid:
 
-    def __init__(self, persistence: SimulationClient, simulation_parameters: Dict):
+    def __init__(self, persistence: SimulationClient, simulation_parameters: Dict, seed=None):
         """
         Create a simulation and link to its persistence
         :param persistence:
-        :param simulation_parameters:
+        :param simulation_parameters: may hold a 'seed', it is not persisted
+        :param seed: seed of the simulation random generator, the 'seed' simulation parameter if not set
         """
         # TODO: create a new simulation from existing parameters by providing an existing sid
         self._persistence = persistence
+        simulation_parameters = dict(simulation_parameters)
+        config_seed = simulation_parameters.pop('seed', None)
+        self._random = BatchedRandom(config_seed if seed is None else seed)
 
         # initialize simulation
         self._sid = self._persistence.init_simulation(**simulation_parameters)
         self._sim_turn = 0
-        self._spawn()
+        with self._persistence.turn(self._sid):
+            self._spawn()
+            self._persistence.flush()
 
     def display_grid(self):
         """
@@ -43,6 +56,20 @@ class SimulationGrid:
     def get_simulation_grid_data(self) -> pd.DataFrame:
         return self._persistence.get_animals_df(sim_id=self._sid)
 
+    def _shuffled(self, animals: pd.DataFrame) -> pd.DataFrame:
+        """
+        Animals in a random order drawn from the simulation random generator
+        """
+        return animals.iloc[self._random.permutation(len(animals))]
+
+    def _neighbourhood(self, animals: pd.DataFrame) -> Dict[Tuple[int, int], Animal]:
+        """
+        Occupants of the cells around the animals acting in a phase, fetched at once. The phase keeps it up to date as
+        animals move and spawn, cells around the animals missing from it are free
+        """
+        centres = [SquareGridCoordinate(x, y) for x, y in zip(animals.coord_x, animals.coord_y)]
+        return self._persistence.get_neighbourhood(sim_id=self._sid, centres=centres)
+
     def _spawn(self):
         """
         function to create the grid by spawning fishes and sharks initially (and only at start)
@@ -52,7 +79,7 @@ class SimulationGrid:
         simulation_params = self.get_simulation_parameters(self._sid)
         grid_size = simulation_params.grid_size
         coord_array = [(x, y) for x in range(grid_size) for y in range(grid_size)]
-        random.shuffle(coord_array)
+        self._random.shuffle(coord_array)
         # spawn fish and Sharks
         fishes = 0
         sharks = 0
@@ -76,14 +103,10 @@ class SimulationGrid:
         """
         _debug = 'Turn: {:<3} - Deads - '.format(self._sim_turn)
         simulation_params = self.get_simulation_parameters(self._sid)
-        sharks = self._persistence.get_animals_by_type(sim_id=self._sid, animal_type=Animal.Shark)
-        sharks_starving = []
-        for idx, shark in sharks.iterrows():
-            if (self._sim_turn - shark.last_fed) > simulation_params.shark_starving:
-                sharks_starving.append(shark.oid)
+        sharks_starving = self._persistence.kill_starving_sharks(sim_id=self._sid, current_turn=self._sim_turn,
+                                                                 shark_starving=simulation_params.shark_starving)
         if len(sharks_starving) > 0:
             _logger.info('{}Found {} shark starving'.format(_debug, len(sharks_starving)))
-            self._persistence.kill_animal(sim_id=self._sid, animal_ids=sharks_starving)
         return
 
     def _eat(self) -> Dict[int, SquareGridCoordinate]:
@@ -94,18 +117,19 @@ class SimulationGrid:
         _debug = 'Turn: {:<3} - Eat - '.format(self._sim_turn)
         simulation_params = self.get_simulation_parameters(self._sid)
         # get a randomized df of all sharks
-        sharks = self._persistence.get_animals_by_type(sim_id=self._sid, animal_type=Animal.Shark).sample(frac=1)
+        sharks = self._shuffled(self._persistence.get_animals_by_type(sim_id=self._sid, animal_type=Animal.Shark))
+        occupants = self._neighbourhood(sharks)
         sharks_eating = dict()
         shark_update = dict()
         for idx, shark in sharks.iterrows():
             # get shark neighbour square
             shark_position = SquareGridCoordinate(shark.coord_x, shark.coord_y)
-            shark_neighbour = square_grid_neighbours(simulation_params.grid_size, shark_position)
+            shark_neighbour = square_grid_neighbours(simulation_params.grid_size, shark_position, rng=self._random)
             # try to find fish
-            has_fish = self._persistence.has_fish_in_square(sim_id=self._sid, coordinates=shark_neighbour)
+            has_fish = [coord for coord in shark_neighbour if occupants.get(_cell(coord)) == Animal.Fish]
             if len(has_fish) > 0:
                 # Shark is eating
-                random.shuffle(has_fish)
+                self._random.shuffle(has_fish)
                 eating_coord = has_fish[0]
                 if self._persistence.eat_animal_in_square(sim_id=self._sid, coordinate=eating_coord):
                     _logger.debug('{}Shark {} {} eat Fish {} and move'.format(_debug, shark.oid, shark_position,
@@ -115,6 +139,8 @@ class SimulationGrid:
                     # move shark to eating position
                     self._persistence.move_animal(sim_id=self._sid, animal_id=shark.oid,
                                                   new_position=eating_coord)
+                    occupants.pop(_cell(shark_position), None)
+                    occupants[_cell(eating_coord)] = Animal.Shark
                     # add to update dictionary
                     shark_update[shark.oid] = {'last_fed': self._sim_turn}
                 else:
@@ -139,18 +165,20 @@ class SimulationGrid:
         moved = []
         to_update = {}
         # First for sharks
-        sharks = self._persistence.get_animals_by_type(sim_id=self._sid, animal_type=Animal.Shark).sample(frac=1)
+        sharks = self._shuffled(self._persistence.get_animals_by_type(sim_id=self._sid, animal_type=Animal.Shark))
+        # a fed shark previous position is around its current one
+        occupants = self._neighbourhood(sharks)
         for idx, shark in sharks.iterrows():
             # can shark breed?
             if (self._sim_turn - shark.spawn_turn) >= simulation_params.shark_breed_maturity:
                 # shark can breed
-                if random.randint(0, 100) <= simulation_params.shark_breed_probability:
+                if self._random.randint(0, 100) <= simulation_params.shark_breed_probability:
                     # shark is possibly breeding...
                     breed_coord = None
                     if shark.oid in fed_sharks:
                         # ...if shark has eaten...
                         breed_coord = fed_sharks[shark.oid]
-                        if self._persistence.coordinate_is_occupied(self._sid, breed_coord):
+                        if _cell(breed_coord) in occupants:
                             # someone took that space before breeding
                             _logger.debug('{}This shark {} breeding has fed and moved,' +
                                           ' cannot breed in {} because position is taken'.format(_debug, shark.oid,
@@ -165,12 +193,14 @@ class SimulationGrid:
                         # ... or if free space is available
                         neighbors = square_grid_neighbours(simulation_params.grid_size,
                                                            SquareGridCoordinate(shark.coord_x,
-                                                                                shark.coord_y))
+                                                                                shark.coord_y),
+                                                           rng=self._random)
                         for neigh in neighbors:
-                            if not self._persistence.coordinate_is_occupied(self._sid, neigh):
+                            if _cell(neigh) not in occupants:
                                 breed_coord = SquareGridCoordinate(int(shark.coord_x), int(shark.coord_y))
                                 # move shark to this slot
                                 self._persistence.move_animal(sim_id=self._sid, animal_id=shark.oid, new_position=neigh)
+                                occupants[_cell(neigh)] = Animal.Shark
                                 moved.append(shark.oid)
                                 _logger.debug('{}Shark {} not fed breeding in {}, moving to {}'.format(_debug,
                                                                                                        shark.oid,
@@ -183,22 +213,25 @@ class SimulationGrid:
                         # spawn new fish in breed_coord
                         new_oid = self._persistence.init_animal(sim_id=self._sid, current_turn=self._sim_turn,
                                                                 animal_type=Animal.Shark, coordinate=breed_coord)
+                        occupants[_cell(breed_coord)] = Animal.Shark
                         _logger.debug('{}Spawning new shark {} {}'.format(_debug, new_oid, breed_coord))
         # Last Fishes, randomize
-        fishes = self._persistence.get_animals_by_type(sim_id=self._sid, animal_type=Animal.Fish).sample(frac=1)
+        fishes = self._shuffled(self._persistence.get_animals_by_type(sim_id=self._sid, animal_type=Animal.Fish))
+        occupants = self._neighbourhood(fishes)
         for idx, fish in fishes.iterrows():
             # can fish breed?
             if (self._sim_turn - fish.spawn_turn) >= simulation_params.fish_breed_maturity:
                 # fish can breed
-                if random.randint(0, 100) <= simulation_params.fish_breed_probability:
+                if self._random.randint(0, 100) <= simulation_params.fish_breed_probability:
                     # fish is possibly breeding if free space is available
                     breed_coord = SquareGridCoordinate(int(fish.coord_x), int(fish.coord_y))
                     _logger.debug('{}Fish breeding in {} if space is available'.format(_debug, breed_coord))
                     neighbors = square_grid_neighbours(simulation_params.grid_size,
                                                        SquareGridCoordinate(fish.coord_x,
-                                                                            fish.coord_y))
+                                                                            fish.coord_y),
+                                                       rng=self._random)
                     for neigh in neighbors:
-                        if not self._persistence.coordinate_is_occupied(self._sid, neigh):
+                        if _cell(neigh) not in occupants:
                             _logger.debug('{}Space found in {}, fish breed and move'.format(_debug, neigh))
                             to_update[fish.oid] = {'last_breed': self._sim_turn,
                                                    'breed_count': fish.breed_count + 1}
@@ -209,6 +242,9 @@ class SimulationGrid:
                             # spawn new fish in breed_coord
                             self._persistence.init_animal(sim_id=self._sid, current_turn=self._sim_turn,
                                                           animal_type=Animal.Fish, coordinate=breed_coord)
+                            occupants[_cell(neigh)] = Animal.Fish
+                            # the baby takes the cell the fish left
+                            occupants[_cell(breed_coord)] = Animal.Fish
                             # break out of loop
                             break
         # now, update all animals
@@ -247,7 +283,8 @@ class SimulationGrid:
         """
         _debug = 'Turn: {:<3} - Move - '.format(self._sim_turn)
         simulation_params = self.get_simulation_parameters(self._sid)
-        animals = self._persistence.get_animals_by_type(sim_id=self._sid, animal_type=animal_type).sample(frac=1)
+        animals = self._shuffled(self._persistence.get_animals_by_type(sim_id=self._sid, animal_type=animal_type))
+        occupants = self._neighbourhood(animals)
         for _, animal in animals.iterrows():
             _logger.debug(animal)
             if animal.oid in already_moved:
@@ -260,12 +297,17 @@ class SimulationGrid:
                 continue
             else:
                 neighbors = square_grid_neighbours(simulation_params.grid_size, SquareGridCoordinate(animal.coord_x,
-                                                                                                     animal.coord_y))
+                                                                                                     animal.coord_y),
+                                                   rng=self._random)
+                position = SquareGridCoordinate(animal.coord_x, animal.coord_y)
                 for neigh in neighbors:
-                    if not self._persistence.coordinate_is_occupied(self._sid, neigh):
+                    if _cell(neigh) not in occupants:
                         # move animal to this slot
                         _logger.debug('{}{} oid[{}] moved to {}'.format(_debug, animal_type.name, animal.oid, neigh))
                         self._persistence.move_animal(sim_id=self._sid, animal_id=animal.oid, new_position=neigh)
+                        occupants.pop(_cell(position), None)
+                        occupants[_cell(neigh)] = animal_type
+                        position = neigh
                     else:
                         _logger.debug('{}{}: {} had no space to move to'.format(_debug, animal_type.name, animal.oid))
         return
@@ -292,10 +334,14 @@ class SimulationGrid:
         :return:
         """
         _logger.debug('********************TURN: {:<3}********************'.format(self._sim_turn))
-        self._check_deads()
-        fed_sharks = self._eat()
-        moved_animals = self._breed_and_move(fed_sharks=fed_sharks)
-        self._move(already_moved=moved_animals)
+        # all the phases of the turn are committed at once
+        with self._persistence.turn(self._sid):
+            self._check_deads()
+            fed_sharks = self._eat()
+            moved_animals = self._breed_and_move(fed_sharks=fed_sharks)
+            self._move(already_moved=moved_animals)
+            # changes buffered by a write-behind client are written once per turn
+            self._persistence.flush()
         # TODO incrementing turn for next round, misleading for current state
         self._sim_turn += 1
         _logger.debug('********************END***************************'.format(self._sim_turn))
@@ -0,0 +1,116 @@
+from typing import List, Sequence
+
+import numpy as np
+
+
+class BatchedRandom(object):
+    """
+    Random source of one simulation: a numpy Generator seeded once, whose uniform draws are made in bulk. A phase
+    takes the values it needs as one list with draws and indexes it per animal, the choice / shuffle / randint subset
+    of the random module hands them out one at a time. Every value comes from the same stream of uniforms and drawing
+    n then m values gives the same stream as drawing n + m, so results only depend on the seed, not on the batch sizes.
+    An instance is not shared between threads: each thread, strip or worker process takes its own from spawn, whose
+    generators are independent streams derived from the seed by SeedSequence.spawn.
+    """
+
+    def __init__(self, seed=None, batch_size: int = 4096):
+        """
+        :param seed: seed of the generator, an int or a numpy SeedSequence, fresh entropy if not set
+        :param batch_size: minimum number of values drawn at once
+        """
+        self._seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.generator = np.random.default_rng(self._seed_sequence)
+        self._batch_size = batch_size
+        self._uniforms = []
+        self._next = 0
+
+    def prefetch(self, count: int):
+        """
+        Make sure at least count values are drawn in advance, with a single call to the generator
+        """
+        remaining = len(self._uniforms) - self._next
+        if remaining < count:
+            self._uniforms = self._uniforms[self._next:] + \
+                self.generator.random(max(count - remaining, self._batch_size)).tolist()
+            self._next = 0
+
+    def spawn_seeds(self, count: int) -> List[np.random.SeedSequence]:
+        """
+        Seeds of count independent streams, to give to threads or worker processes. The same seed always spawns the
+        same children, in the order of the calls
+        """
+        return self._seed_sequence.spawn(count)
+
+    def spawn(self, count: int) -> List['BatchedRandom']:
+        """
+        Independent random sources for count threads or strips
+        """
+        return [BatchedRandom(seed, self._batch_size) for seed in self.spawn_seeds(count)]
+
+    def draws(self, count: int) -> List[float]:
+        """
+        List of count uniform floats in [0, 1) taken from the stream at once, for a phase to index
+        """
+        self.prefetch(count)
+        values = self._uniforms[self._next:self._next + count]
+        self._next += count
+        return values
+
+    def random(self) -> float:
+        """
+        Uniform float in [0, 1)
+        """
+        if self._next == len(self._uniforms):
+            self.prefetch(1)
+        value = self._uniforms[self._next]
+        self._next += 1
+        return value
+
+    def randint(self, low: int, high: int) -> int:
+        """
+        Integer in [low, high], both included like random.randint
+        """
+        return low + int(self.random() * (high - low + 1))
+
+    def choice(self, seq: Sequence):
+        return seq[int(self.random() * len(seq))]
+
+    def shuffle(self, values: List):
+        """
+        Shuffle a list in place
+        """
+        for i in range(len(values) - 1, 0, -1):
+            j = int(self.random() * (i + 1))
+            values[i], values[j] = values[j], values[i]
+
+    def uniforms(self, count: int) -> np.ndarray:
+        """
+        Array of count uniform floats in [0, 1), taken from the same stream
+        """
+        return np.array(self.draws(count))
+
+    def permutation(self, count: int) -> np.ndarray:
+        """
+        Random permutation of range(count), the order of count uniform draws
+        """
+        return np.argsort(self.uniforms(count), kind='stable')
+
+    def sample(self, population: int, count: int) -> List[int]:
+        """
+        count distinct integers of range(population) in random order. Small samples are drawn with rejection of
+        repeated values, without building range(population), large ones are the head of a permutation
+        """
+        if count > population:
+            raise ValueError('Sample larger than population')
+        if 2 * count > population:
+            return self.permutation(population)[:count].tolist()
+        values = []
+        seen = set()
+        while len(values) < count:
+            self.prefetch(count - len(values))
+            for _ in range(count - len(values)):
+                value = int(self.random() * population)
+                if value not in seen:
+                    seen.add(value)
+                    values.append(value)
+        return values
@@ -0,0 +1,50 @@
+from typing import Dict, Tuple
+
+import logging
+
+from fish_bowl.process.simple_simulation_engine import SimpleSimulationEngine
+
+_logger = logging.getLogger(__name__)
+
+
+class BitboardSimulationEngine(SimpleSimulationEngine):
+    """
+    SimpleSimulationEngine running on a BitboardFishTank.
+    Rules and random draws are the ones of SimpleSimulationEngine, so from the same seed both engines play the same
+    turns. Whole grid bitboard queries let feeding skip the sharks without any fish around.
+    """
+
+    def __init__(self, simulation_parameters: Dict, use_pacman=False, sim_id: int = None, synchronous=False,
+                 seed=None, active_set=False, persist=True):
+        """
+        :param simulation_parameters:
+        :param use_pacman: use a Pacman style topology
+        :param sim_id: simulation id, allocated by the process simulation id allocator if not set
+        :param synchronous: animals breed and move based on the state at the start of the phase
+        :param seed: seed of the simulation random generator, the 'seed' simulation parameter if not set
+        :param active_set: breed and move phases only look at the animals around changed cells
+        :param persist: save the simulation to the database when it ends
+        """
+        super().__init__(simulation_parameters, use_pacman=use_pacman, use_bitboard=True, sim_id=sim_id,
+                         synchronous=synchronous, seed=seed, active_set=active_set, persist=persist)
+
+    def _feed_sharks(self) -> Dict[int, Tuple]:
+        """
+        Feed sharks by looking for available fish.  If found, then remove the fish, and move the shark to the new
+        coordinates. No fish appears while sharks feed, so sharks without adjacent fish at the start are skipped.
+        :return: Dictionary of fed shark oid to shark coordinates before feeding
+        """
+        fed_sharks_oid_dict = {}
+        hunting = self._fish_tank.get_hunting_sharks()
+        for shark_coord, shark in self._fish_tank.get_current_sharks():
+            if not hunting.test(*shark_coord):
+                continue
+            fish_tuple = self._fish_tank.find_fish_to_eat(shark_coord)
+            if fish_tuple is not None:
+                fish_coord, fish_to_eat = fish_tuple
+                self._fish_tank.eat_fish(self._sim_turn, shark_coord, fish_coord)
+                self._fish_eaten_total += 1
+                fed_sharks_oid_dict[shark.oid] = shark_coord
+                self._mark_moved(fish_coord)
+                self._schedule_starvation(shark)
+        return fed_sharks_oid_dict
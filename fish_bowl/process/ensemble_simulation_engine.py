@@ -0,0 +1,177 @@
+from typing import Dict, List, Tuple
+
+import logging
+import numpy as np
+
+from fish_bowl.data_struct.ensemble_fish_tank import EnsembleFishTank, PacmanEnsembleFishTank
+from fish_bowl.process.batched_random import BatchedRandom
+from fish_bowl.process.id_allocator import IdAllocator, next_simulation_id
+from fish_bowl.process.vectorized_simulation_engine import VectorizedSimulationEngine
+from fish_bowl.process.utils import Animal
+
+from fish_bowl.dataio.threaded_persistence import PersistenceClient, get_database_string
+
+_logger = logging.getLogger(__name__)
+
+# per member running totals, named like the SimStats columns
+MEMBER_STATS = ('shark_breed_total', 'fish_breed_total', 'fish_eaten_total', 'shark_starved_total')
+
+
+class EnsembleSimulationEngine(VectorizedSimulationEngine):
+    """
+    Runs several independent simulations of the same grid size at once, e.g. the members of a parameter sweep.
+    Their grids are stacked in one EnsembleFishTank and each phase of a turn is a single VectorizedSimulationEngine
+    kernel over the animals of every member, breeding, starving and speed parameters are looked up per member.
+    A member ends like a simulation on its own, at its max_turns or when it has no shark left, and its cells are left out
+    of the following turns. The ensemble ends with its last member.
+    Members draw from one shared random generator, a member does not replay the turns of the same simulation run alone.
+    """
+
+    def __init__(self, simulation_parameters: List[Dict], use_pacman=False, seed=None, sim_ids: List[int] = None,
+                 persist=True):
+        """
+        :param simulation_parameters: simulation parameters of each member, all with the same grid_size
+        :param use_pacman: use a Pacman style topology for every member
+        :param seed: seed of the random generator, the 'seed' parameter of the first member if not set
+        :param sim_ids: simulation id of each member, allocated by the process simulation id allocator if not set
+        :param persist: save the members to the database when the ensemble ends
+        """
+        if not simulation_parameters:
+            raise ValueError('An ensemble needs at least one member')
+        if len({parameters['grid_size'] for parameters in simulation_parameters}) > 1:
+            raise ValueError('Ensemble members must have the same grid size')
+        # checks the parameters of each member, the scalars left are replaced by per member vectors below
+        for parameters in simulation_parameters:
+            self._init_simulation(**parameters)
+        nb_members = len(simulation_parameters)
+        if sim_ids is not None and len(sim_ids) != nb_members:
+            raise ValueError('One simulation id per member expected')
+        self._sids = [next_simulation_id() for _ in range(nb_members)] if sim_ids is None else list(sim_ids)
+        # members have their own simulation ids
+        self._sid = None
+        self._simulation_parameters = simulation_parameters
+        self._persist = persist
+        for name in ('init_nb_fish', 'init_nb_shark', 'fish_breed_maturity', 'fish_breed_probability',
+                     'shark_breed_maturity', 'shark_breed_probability', 'shark_starving', 'max_turns', 'fish_speed',
+                     'shark_speed'):
+            setattr(self, '_' + name, np.array([parameters[name] for parameters in simulation_parameters]))
+        self._oids = IdAllocator()
+        self._sim_turn = 0
+        self._random = BatchedRandom(simulation_parameters[0].get('seed') if seed is None else seed)
+        self._rng = self._random.generator
+        tank_class = PacmanEnsembleFishTank if use_pacman else EnsembleFishTank
+        self._fish_tank = tank_class(self._grid_size, nb_members, self._random)
+        self._moved = np.zeros(nb_members * self._grid_size ** 2, dtype=bool)
+        self._member_stats = np.zeros((nb_members, len(MEMBER_STATS)), dtype=np.int64)
+        # turn each member ended on, 0 while it runs
+        self._end_turns = np.zeros(nb_members, dtype=np.int64)
+        self._spawn()
+        self.sim_ended = False
+
+        # totals over all the members
+        self._fish_eaten_total = 0
+        self._fish_breed_total = 0
+        self._shark_breed_total = 0
+        self._shark_starved_total = 0
+
+    @property
+    def nb_members(self) -> int:
+        return len(self._sids)
+
+    def _add_stats(self, cells: np.ndarray, name: str):
+        """
+        Add one to the stat of the member of each cell
+        """
+        self._member_stats[:, MEMBER_STATS.index(name)] += np.bincount(self._fish_tank.get_members(cells),
+                                                                       minlength=self.nb_members)
+
+    def _spawn(self):
+        """
+        Spawn the initial fishes and sharks of each member in random cells of its grid
+        """
+        member_cells = self._fish_tank.member_cells
+        fish_cells = []
+        shark_cells = []
+        for member in range(self.nb_members):
+            nb_fish = self._init_nb_fish[member]
+            cells = self._rng.choice(member_cells, size=nb_fish + self._init_nb_shark[member], replace=False)
+            fish_cells.append(cells[:nb_fish] + member * member_cells)
+            shark_cells.append(cells[nb_fish:] + member * member_cells)
+        fish_cells = np.concatenate(fish_cells)
+        shark_cells = np.concatenate(shark_cells)
+        self._fish_tank.spawn_animals(fish_cells, Animal.Fish, None, 0, self._new_oids(len(fish_cells)))
+        self._fish_tank.spawn_animals(shark_cells, Animal.Shark, None, 1, self._new_oids(len(shark_cells)))
+
+    def _remove_dead_sharks(self, sim_turn):
+        """
+        Remove the sharks that have not eaten for longer than the shark_starving of their member
+        :param sim_turn: Current simulation turn
+        """
+        tank = self._fish_tank
+        sharks = tank.get_cells(Animal.Shark)
+        starving = self._shark_starving[tank.get_members(sharks)]
+        starved = sharks[(sim_turn - tank.get_last_fed(sharks)) > starving]
+        tank.remove_animals(starved)
+        self._add_stats(starved, 'shark_starved_total')
+        self._shark_starved_total += len(starved)
+
+    def _feed_sharks(self) -> Tuple[np.ndarray, np.ndarray]:
+        fed_from, fish_cells = super()._feed_sharks()
+        self._add_stats(fish_cells, 'fish_eaten_total')
+        return fed_from, fish_cells
+
+    def _breeding_mask(self, cells: np.ndarray, maturity, probability) -> np.ndarray:
+        """
+        Animals old enough to breed that pass their breeding roll this turn
+        :param maturity: breeding maturity of each member
+        :param probability: breeding probability of each member
+        """
+        members = self._fish_tank.get_members(cells)
+        return super()._breeding_mask(cells, maturity[members], probability[members])
+
+    def _move_speeds(self, cells: np.ndarray, animal_type: Animal) -> np.ndarray:
+        speeds = self._fish_speed if animal_type == Animal.Fish else self._shark_speed
+        return speeds[self._fish_tank.get_members(cells)]
+
+    def _spawn_babies(self, baby_cells: np.ndarray, parent_cells: np.ndarray, animal_type: Animal):
+        super()._spawn_babies(baby_cells, parent_cells, animal_type)
+        self._add_stats(baby_cells, 'shark_breed_total' if animal_type == Animal.Shark else 'fish_breed_total')
+
+    def _check_simulation_ends(self):
+        """
+        End the members reaching their max turns or without sharks, and leave them out of the next turns
+        :return: True once every member has ended
+        """
+        running = self._end_turns == 0
+        sharks = self._fish_tank.count_by_member(Animal.Shark)
+        ended = running & ((self._sim_turn >= self._max_turns) | (sharks == 0))
+        if ended.any():
+            _logger.info('Members {} completed at turn {}'.format(np.flatnonzero(ended).tolist(), self._sim_turn))
+        self._end_turns[ended] = self._sim_turn
+        self._fish_tank.set_active(self._end_turns == 0)
+        return not (self._end_turns == 0).any()
+
+    def get_member_stats(self) -> List[Dict]:
+        """
+        Statistics of each member, as saved in SimStats, with the number of turns it played and its final population
+        """
+        fishes = self._fish_tank.count_by_member(Animal.Fish)
+        sharks = self._fish_tank.count_by_member(Animal.Shark)
+        turns = np.where(self._end_turns == 0, self._sim_turn, self._end_turns)
+        stats = []
+        for member, sid in enumerate(self._sids):
+            member_stats = dict(zip(MEMBER_STATS, self._member_stats[member].tolist()))
+            member_stats.update(sim_id=sid, sim_turn=int(turns[member]), nb_fish=int(fishes[member]),
+                                nb_shark=int(sharks[member]))
+            stats.append(member_stats)
+        return stats
+
+    def persist_to_db(self):
+        """
+        Save the parameters and statistics of each member, the animals are not saved
+        """
+        client = PersistenceClient(get_database_string())
+        for parameters, stats in zip(self._simulation_parameters, self.get_member_stats()):
+            sim_params = {k: v for k, v in parameters.items() if k != 'seed'}
+            client.save_sim_params(sid=stats['sim_id'], **sim_params)
+            client.save_simstats(stats['sim_id'], *[stats[name] for name in MEMBER_STATS])
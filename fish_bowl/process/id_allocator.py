@@ -0,0 +1,83 @@
+import itertools
+import threading
+
+import numpy as np
+
+
+class IdAllocator(object):
+    """
+    Dense id allocator scoped to one simulation: ids are start, start + 1, ... in allocation order, so they can
+    index arrays directly. Each simulation owns its allocator, nothing is shared between simulations or processes.
+    Allocation is guarded by a lock so threads of one simulation can share it.
+    Processes sharing a simulation each use a step of the number of processes from a distinct start.
+    """
+
+    def __init__(self, start: int = 0, step: int = 1):
+        self._start = start
+        self._step = step
+        self._next = start
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            new_id = self._next
+            self._next += self._step
+        return new_id
+
+    def next_ids(self, count: int) -> np.ndarray:
+        """
+        :param count: number of ids to allocate
+        :return: array of consecutive ids
+        """
+        with self._lock:
+            first = self._next
+            self._next += count * self._step
+        return np.arange(first, self._next, self._step)
+
+    @property
+    def count(self) -> int:
+        """
+        Number of ids allocated so far, ids are all lower than start + count * step
+        """
+        return (self._next - self._start) // self._step
+
+
+class SimulationIdAllocator(object):
+    """
+    Simulation id allocator for a pool of workers: worker w of n hands out w + 1, w + 1 + n, w + 1 + 2n, ...
+    Workers never share an id without sharing any state, which works for forked or spawned processes alike,
+    and ids stay dense when workers run a similar number of simulations.
+    """
+
+    def __init__(self, worker_id: int = 0, nb_workers: int = 1):
+        """
+        :param worker_id: index of the worker in the pool, from 0 to nb_workers - 1
+        :param nb_workers: number of workers in the pool
+        """
+        if not 0 <= worker_id < nb_workers:
+            raise ValueError('worker_id must be in [0, {})'.format(nb_workers))
+        self.worker_id = worker_id
+        self.nb_workers = nb_workers
+        self._ids = itertools.count(worker_id + 1, nb_workers)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+
+_simulation_ids = SimulationIdAllocator()
+
+
+def configure_worker(worker_id: int, nb_workers: int):
+    """
+    Make the simulation ids of this process unique within a pool of workers, to call once when a worker starts
+    :param worker_id: index of the worker in the pool, from 0 to nb_workers - 1
+    :param nb_workers: number of workers in the pool
+    """
+    global _simulation_ids
+    _simulation_ids = SimulationIdAllocator(worker_id, nb_workers)
+
+
+def next_simulation_id() -> int:
+    return _simulation_ids.next_id()
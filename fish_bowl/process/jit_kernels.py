@@ -0,0 +1,235 @@
+"""
+Turn phases of the sequential rules as compiled loops over the arrays of an ArrayFishTank
+
+Animals act one at a time in the order of SimpleSimulationEngine, each seeing the moves of the animals before it.
+Kernels take the flat state arrays of the tank (grid: type, oid, spawn_turn, last_fed, last_breed, breed_count), the
+neighbour masks and the padded neighbour table, and keep the masks up to date as animals move.
+Random draws are uniforms drawn in bulk by the engine and consumed in order by the kernel.
+
+Kernels are compiled with numba when it is installed and cached on disk (set FISH_BOWL_JIT_CACHE=0 to disable the
+cache). Without numba they run as plain Python, with the same results.
+"""
+import logging
+import os
+
+from fish_bowl.data_struct.array_fish_tank import EMPTY_CELL, FISH_LAYER, FREE_LAYER
+from fish_bowl.process.utils import Animal
+
+_logger = logging.getLogger(__name__)
+
+JIT_CACHE = os.environ.get('FISH_BOWL_JIT_CACHE', '1') != '0'
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """
+        Stand in for numba.njit, leaves the function as it is
+        """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+FISH = Animal.Fish.value
+SHARK = Animal.Shark.value
+
+
+@njit(cache=JIT_CACHE)
+def _update_masks(masks, padded, opposite, cell, set_layers, clear_layers):
+    """
+    Set and clear the bits of a cell in the neighbour masks of its neighbours
+    """
+    for direction in range(padded.shape[1]):
+        neighbour = padded[cell, direction]
+        if neighbour >= 0:
+            shift = opposite[direction]
+            masks[neighbour] = (masks[neighbour] & ~(clear_layers << shift)) | (set_layers << shift)
+
+
+@njit(cache=JIT_CACHE)
+def _move(grid, masks, padded, opposite, old_cell, new_cell):
+    """
+    Move the animal of old_cell to the free new_cell
+    """
+    types, oids, spawn_turns, last_fed, last_breed, breed_count = grid
+    fish_layer = FISH_LAYER if types[old_cell] == FISH else 0
+    types[new_cell] = types[old_cell]
+    oids[new_cell] = oids[old_cell]
+    spawn_turns[new_cell] = spawn_turns[old_cell]
+    last_fed[new_cell] = last_fed[old_cell]
+    last_breed[new_cell] = last_breed[old_cell]
+    breed_count[new_cell] = breed_count[old_cell]
+    types[old_cell] = EMPTY_CELL
+    _update_masks(masks, padded, opposite, old_cell, FREE_LAYER, fish_layer)
+    _update_masks(masks, padded, opposite, new_cell, fish_layer, FREE_LAYER)
+
+
+@njit(cache=JIT_CACHE)
+def _spawn(grid, masks, padded, opposite, cell, animal_type, sim_turn, oid):
+    """
+    Place a new animal into a free cell, sharks are considered fed at spawn
+    """
+    types, oids, spawn_turns, last_fed, last_breed, breed_count = grid
+    types[cell] = animal_type
+    oids[cell] = oid
+    spawn_turns[cell] = sim_turn
+    last_fed[cell] = sim_turn if animal_type == SHARK else 0
+    last_breed[cell] = 0
+    breed_count[cell] = 0
+    _update_masks(masks, padded, opposite, cell, FISH_LAYER if animal_type == FISH else 0, FREE_LAYER)
+
+
+@njit(cache=JIT_CACHE)
+def _pick_free_neighbour(masks, padded, cell, uniform):
+    """
+    Random free neighbour of a cell, -1 if there is none
+    """
+    free = masks[cell] & 0xFF
+    count = 0
+    for direction in range(padded.shape[1]):
+        count += (free >> direction) & 1
+    if count == 0:
+        return -1
+    rank = int(uniform * count)
+    for direction in range(padded.shape[1]):
+        if (free >> direction) & 1:
+            if rank == 0:
+                return padded[cell, direction]
+            rank -= 1
+    return -1
+
+
+@njit(cache=JIT_CACHE)
+def _pick_reachable(masks, padded, cell, speed, uniform, stamps, stamp, queue):
+    """
+    Random free cell reachable within speed steps through free cells, -1 if there is none
+    :param stamps: per cell scratch array, cells reached by this search are set to stamp
+    :param queue: scratch array as long as the grid
+    """
+    stamps[cell] = stamp
+    queue[0] = cell
+    head = 0
+    tail = 1
+    for level in range(speed):
+        level_end = tail
+        while head < level_end:
+            current = queue[head]
+            head += 1
+            free = masks[current] & 0xFF
+            for direction in range(padded.shape[1]):
+                if (free >> direction) & 1:
+                    neighbour = padded[current, direction]
+                    if stamps[neighbour] != stamp:
+                        stamps[neighbour] = stamp
+                        queue[tail] = neighbour
+                        tail += 1
+        if tail == level_end:
+            break
+    if tail == 1:
+        return -1
+    return queue[1 + int(uniform * (tail - 1))]
+
+
+@njit(cache=JIT_CACHE)
+def feed_sharks(grid, masks, padded, opposite, sharks, sim_turn, fed_from, moved):
+    """
+    Each shark eats its first neighbouring fish, in SQUARE_NEIGH order, and moves into its cell
+    :param sharks: cells of the sharks, in the order they act
+    :param fed_from: set to the cell each fed shark came from, at the cell it is in
+    :param moved: set for the cells of the fed sharks
+    :return: number of fish eaten
+    """
+    last_fed = grid[3]
+    eaten = 0
+    for shark in sharks:
+        fishes = masks[shark] >> 8
+        if fishes == 0:
+            continue
+        direction = 0
+        while not (fishes >> direction) & 1:
+            direction += 1
+        fish = padded[shark, direction]
+        # the fish cell stays occupied, it only loses its fish
+        _update_masks(masks, padded, opposite, fish, 0, FISH_LAYER)
+        _move(grid, masks, padded, opposite, shark, fish)
+        last_fed[fish] = sim_turn
+        fed_from[fish] = shark
+        moved[fish] = True
+        eaten += 1
+    return eaten
+
+
+@njit(cache=JIT_CACHE)
+def breed_animals(grid, masks, padded, opposite, cells, sim_turn, uniforms, fed_from, moved, fish_maturity,
+                  fish_probability, shark_maturity, shark_probability, first_oid):
+    """
+    Mature animals passing their breeding roll move to a free neighbour and leave a baby in the cell they left.
+    Fed sharks have moved already, they leave their baby in the cell they fed from.
+    :param cells: cells of the animals, sharks first, in the order they act
+    :param uniforms: at least two uniform draws per animal
+    :param first_oid: oid of the first baby, the next ones follow
+    :return: number of fish and shark babies
+    """
+    types, oids, spawn_turns, last_fed, last_breed, breed_count = grid
+    draw = 0
+    fish_babies = 0
+    shark_babies = 0
+    for cell in cells:
+        is_shark = types[cell] == SHARK
+        maturity = shark_maturity if is_shark else fish_maturity
+        if sim_turn - spawn_turns[cell] < maturity:
+            continue
+        roll = int(uniforms[draw] * 101)
+        draw += 1
+        if roll > (shark_probability if is_shark else fish_probability):
+            continue
+        oid = first_oid + fish_babies + shark_babies
+        if is_shark and fed_from[cell] >= 0:
+            if types[fed_from[cell]] == EMPTY_CELL:
+                _spawn(grid, masks, padded, opposite, fed_from[cell], SHARK, sim_turn, oid)
+                last_breed[cell] = sim_turn
+                breed_count[cell] += 1
+                shark_babies += 1
+            continue
+        target = _pick_free_neighbour(masks, padded, cell, uniforms[draw])
+        draw += 1
+        if target < 0:
+            continue
+        _move(grid, masks, padded, opposite, cell, target)
+        moved[target] = True
+        if is_shark:
+            last_breed[target] = sim_turn
+            breed_count[target] += 1
+            _spawn(grid, masks, padded, opposite, cell, SHARK, sim_turn, oid)
+            shark_babies += 1
+        else:
+            _spawn(grid, masks, padded, opposite, cell, FISH, sim_turn, oid)
+            fish_babies += 1
+    return fish_babies, shark_babies
+
+
+@njit(cache=JIT_CACHE)
+def move_animals(grid, masks, padded, opposite, cells, uniforms, moved, fish_speed, shark_speed, stamps, stamp, queue):
+    """
+    Animals that have not moved yet this turn move to a random free cell within their speed
+    :param cells: cells of the animals, in the order they act
+    :param uniforms: one uniform draw per animal
+    :param stamps: per cell scratch array of the reachable cell searches
+    :param stamp: last stamp used in stamps
+    :param queue: scratch array as long as the grid
+    :return: last stamp used
+    """
+    types = grid[0]
+    for index in range(len(cells)):
+        cell = cells[index]
+        if moved[cell]:
+            continue
+        stamp += 1
+        speed = fish_speed if types[cell] == FISH else shark_speed
+        target = _pick_reachable(masks, padded, cell, speed, uniforms[index], stamps, stamp, queue)
+        if target >= 0:
+            _move(grid, masks, padded, opposite, cell, target)
+    return stamp
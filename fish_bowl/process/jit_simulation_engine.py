@@ -0,0 +1,147 @@
+from typing import Dict
+
+import logging
+import numpy as np
+
+from fish_bowl.process import jit_kernels
+from fish_bowl.process.jit_kernels import NUMBA_AVAILABLE
+from fish_bowl.process.simple_simulation_engine import SimpleSimulationEngine
+from fish_bowl.process.topology import OPPOSITE_DIRECTION
+from fish_bowl.process.utils import Animal
+
+_logger = logging.getLogger(__name__)
+
+# small simulation played by warm_up
+WARM_UP_CONFIG = {
+    'grid_size': 5,
+    'init_nb_fish': 8,
+    'fish_breed_maturity': 1,
+    'fish_breed_probability': 100,
+    'fish_speed': 2,
+    'init_nb_shark': 2,
+    'shark_breed_maturity': 1,
+    'shark_breed_probability': 100,
+    'shark_speed': 2,
+    'shark_starving': 2,
+    'max_turns': 3
+}
+
+
+class JitSimulationEngine(SimpleSimulationEngine):
+    """
+    Simulation engine playing the sequential rules of SimpleSimulationEngine with compiled loops (jit_kernels) over
+    the arrays of an ArrayFishTank: animals act one at a time in grid order, sharks first when breeding, and see the
+    moves of the animals before them. Fish and sharks move up to fish_speed / shark_speed cells.
+    Kernels are compiled with numba when it is installed, they run as plain Python otherwise, which is much slower:
+    use jit_engine_class to fall back to SimpleSimulationEngine instead.
+    Random draws come from the engine BatchedRandom, in bulk for each phase, so a seed gives the same simulation with
+    or without numba. They differ from the draws of SimpleSimulationEngine.
+    """
+
+    def __init__(self, simulation_parameters: Dict, use_pacman=False, sim_id: int = None, seed=None, persist=True):
+        """
+        :param simulation_parameters:
+        :param use_pacman: use a Pacman style topology
+        :param sim_id: simulation id, allocated by the process simulation id allocator if not set
+        :param seed: seed of the simulation random generator, the 'seed' simulation parameter if not set
+        :param persist: save the simulation to the database when it ends
+        """
+        if not NUMBA_AVAILABLE:
+            _logger.warning('numba is not installed, JitSimulationEngine kernels run as plain Python')
+        super().__init__(simulation_parameters, use_pacman=use_pacman, use_array=True, sim_id=sim_id, seed=seed,
+                         persist=persist)
+        nb_cells = self._grid_size ** 2
+        arrays = self._fish_tank.get_arrays()
+        self._grid = tuple(arrays[name].ravel() for name in ('type', 'oid', 'spawn_turn', 'last_fed', 'last_breed',
+                                                             'breed_count'))
+        self._masks = arrays['neighbour_masks']
+        self._padded = self._fish_tank.padded_neighbours
+        self._opposite = np.array(OPPOSITE_DIRECTION, dtype=np.int64)
+        # per cell state of the turn and scratch arrays of the kernels
+        self._moved = np.zeros(nb_cells, dtype=bool)
+        self._fed_from = np.full(nb_cells, -1, dtype=np.int64)
+        self._stamps = np.zeros(nb_cells, dtype=np.int64)
+        self._stamp = 0
+        self._queue = np.zeros(nb_cells, dtype=np.int64)
+
+    def play_turn(self):
+        """
+        Create a new turn,
+        sharks starve -> sharks eat -> sharks breed -> fish breed -> animals move
+        """
+        if self.sim_ended:
+            _logger.warning("Simulation id ({}) has ended".format(self._sid))
+            return
+
+        self._sim_turn += 1
+        _logger.debug('********************TURN: {:<3}********************'.format(self._sim_turn))
+        self._remove_dead_sharks(self._sim_turn)
+        self._moved[:] = False
+        self._fed_from[:] = -1
+        self._feed_sharks()
+        self._breed_animals()
+        self._move_remaining_animals()
+        self._fish_tank.recount_population()
+
+        _logger.debug('********************END TURN: {:<3}*******************'.format(self._sim_turn))
+        self.sim_ended = self._check_simulation_ends()
+        if self.sim_ended and self._persist:
+            self.persist_to_db()
+
+    def _remove_dead_sharks(self, sim_turn):
+        # the array tank checks every shark at once, babies are not queued
+        self._shark_starved_total += self._fish_tank.remove_starved_sharks(sim_turn, self._shark_starving)
+
+    def _schedule_starvation(self, shark):
+        """
+        Nothing to queue, _remove_dead_sharks checks every shark of the tank each turn
+        """
+
+    def _feed_sharks(self):
+        """
+        Feed the sharks one at a time, a fed shark moves into the cell of the fish it ate
+        """
+        sharks = self._fish_tank.get_cells(Animal.Shark)
+        self._fish_eaten_total += jit_kernels.feed_sharks(self._grid, self._masks, self._padded, self._opposite,
+                                                          sharks, self._sim_turn, self._fed_from, self._moved)
+
+    def _breed_animals(self):
+        """
+        Breed the sharks then the fishes, one at a time
+        """
+        tank = self._fish_tank
+        cells = np.concatenate((tank.get_cells(Animal.Shark), tank.get_cells(Animal.Fish)))
+        fish_babies, shark_babies = jit_kernels.breed_animals(
+            self._grid, self._masks, self._padded, self._opposite, cells, self._sim_turn,
+            self._random.uniforms(2 * len(cells)), self._fed_from, self._moved, self._fish_breed_maturity,
+            self._fish_breed_probability, self._shark_breed_maturity, self._shark_breed_probability,
+            self._oids.count)
+        self._oids.next_ids(fish_babies + shark_babies)
+        self._fish_breed_total += fish_babies
+        self._shark_breed_total += shark_babies
+
+    def _move_remaining_animals(self):
+        """
+        Move the animals that have not moved yet this turn, one at a time in grid order
+        """
+        cells = self._fish_tank.get_cells()
+        self._stamp = jit_kernels.move_animals(self._grid, self._masks, self._padded, self._opposite, cells,
+                                               self._random.uniforms(len(cells)), self._moved, self._fish_speed,
+                                               self._shark_speed, self._stamps, self._stamp, self._queue)
+
+
+def jit_engine_class() -> type:
+    """
+    JitSimulationEngine when numba is installed, SimpleSimulationEngine otherwise
+    """
+    return JitSimulationEngine if NUMBA_AVAILABLE else SimpleSimulationEngine
+
+
+def warm_up():
+    """
+    Compile the kernels, or load them from the numba cache, by playing a small simulation. Call it once at the start
+    of a process so the first simulation does not pay for the compilation
+    """
+    engine = JitSimulationEngine(WARM_UP_CONFIG, seed=0, persist=False)
+    while not engine.sim_ended:
+        engine.play_turn()
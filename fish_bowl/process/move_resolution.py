@@ -0,0 +1,70 @@
+"""
+Propose / accept resolution of simultaneous moves
+
+Every animal proposes one of its candidate cells, when several animals propose the same cell a random priority decides
+which one gets it. Losers retry with the candidates nobody took, animals left without candidates stay put.
+This lets a whole phase be decided at once instead of one animal after the other.
+"""
+from typing import Tuple
+
+import numpy as np
+
+from fish_bowl.process.topology import SQUARE_NEIGH
+
+
+def pick_random_true(mask: np.ndarray, uniform: np.ndarray) -> np.ndarray:
+    """
+    Pick one True column per row of a boolean matrix
+    :param mask: (k, m) boolean array, each row must have at least one True value
+    :param uniform: k uniform draws in [0, 1)
+    :return: column index chosen for each row
+    """
+    counts = mask.sum(axis=1)
+    rank = (uniform * counts).astype(np.int64)
+    return np.argmax(mask.cumsum(axis=1) > rank[:, None], axis=1)
+
+
+def resolve_conflicts(targets: np.ndarray, priorities: np.ndarray, nb_cells: int) -> np.ndarray:
+    """
+    When several animals target the same cell, only one of them gets it.
+    Claims are written in priority order and the surviving claim of each cell wins, which avoids sorting.
+    :param targets: target flat cell index of each animal
+    :param priorities: random permutation of the animal indices
+    :param nb_cells: number of cells in the grid
+    :return: indices of the animals that got their target
+    """
+    claims = np.empty(nb_cells, dtype=np.int64)
+    claims[targets[priorities]] = priorities
+    return np.flatnonzero(claims[targets] == np.arange(len(targets)))
+
+
+def propose_accept(candidates: np.ndarray, allowed: np.ndarray, rng: np.random.Generator, nb_cells: int,
+                   max_rounds: int = len(SQUARE_NEIGH)) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Give each animal at most one of its candidate cells, no cell is given twice
+    :param candidates: (k, m) flat indices of the cells each animal could take
+    :param allowed: (k, m) mask of the candidates that can be taken
+    :param rng: random generator used for the proposals and priorities
+    :param nb_cells: number of cells in the grid
+    :param max_rounds: number of proposal rounds, with m rounds every animal that can get a cell gets one
+    :return: indices of the animals that got a cell, and the cells they got
+    """
+    allowed = allowed.copy()
+    pending = np.flatnonzero(allowed.any(axis=1))
+    taken = np.zeros(nb_cells, dtype=bool)
+    accepted, accepted_cells = [], []
+    for _ in range(max_rounds):
+        if len(pending) == 0:
+            break
+        proposals = candidates[pending, pick_random_true(allowed[pending], rng.random(len(pending)))]
+        winners = resolve_conflicts(proposals, rng.permutation(len(pending)), nb_cells)
+        accepted.append(pending[winners])
+        accepted_cells.append(proposals[winners])
+        taken[proposals[winners]] = True
+        # losers retry with the cells nobody took
+        pending = np.delete(pending, winners)
+        allowed[pending] &= ~taken[candidates[pending]]
+        pending = pending[allowed[pending].any(axis=1)]
+    if not accepted:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(accepted), np.concatenate(accepted_cells)
@@ -1,12 +1,18 @@
 from typing import Dict, List, Tuple
 
-import random
 import logging
+import numpy as np
 import pandas as pd
 
 from fish_bowl.process.simulation_engine import SimulationEngine
 from fish_bowl.data_struct.fish_tank import FishTank, PacmanFishTank
+from fish_bowl.data_struct.array_fish_tank import ArrayFishTank, PacmanArrayFishTank
+from fish_bowl.data_struct.bitboard_fish_tank import BitboardFishTank, PacmanBitboardFishTank
+from fish_bowl.data_struct.tiled_fish_tank import TiledFishTank, PacmanTiledFishTank
 from fish_bowl.data_struct.animals import *
+from fish_bowl.process.batched_random import BatchedRandom
+from fish_bowl.process.id_allocator import IdAllocator, next_simulation_id
+from fish_bowl.process.turn_queue import TurnQueue
 
 from fish_bowl.dataio.threaded_persistence import PersistenceClient, get_database_string
 
@@ -18,23 +24,66 @@ class SimpleSimulationEngine(SimulationEngine):
     The SimpleSimulationEngine holds all business logic for the simulation and makes calls to the FishTank for
     state changes
     """
-    start_sid = 1
 
-    def __init__(self, simulation_parameters: Dict, use_pacman=False):
+    def __init__(self, simulation_parameters: Dict, use_pacman=False, use_array=False, use_bitboard=False,
+                 sim_id: int = None, synchronous=False, seed=None, active_set=False, use_tiled=False,
+                 persist=True):
         """
         Initialise internals such as FishTank
         :param simulation_parameters:
         :param use_pacman: use a Pacman style topology
-        """
-        self._sid = SimpleSimulationEngine.start_sid
-        SimpleSimulationEngine.start_sid += 1
+        :param use_array: use the numpy array backed FishTank
+        :param use_bitboard: use the bitboard backed FishTank
+        :param use_tiled: use the FishTank allocating its grid in tiles, for very large sparse grids
+        :param sim_id: simulation id, allocated by the process simulation id allocator if not set
+        :param synchronous: animals breed and move based on the state at the start of the phase instead of the moves
+                            of the animals before them
+        :param seed: seed of the simulation random generator, the 'seed' simulation parameter if not set and fresh
+                     entropy if neither is set
+        :param active_set: breed and move phases only look at the animals with a free neighbour, found around the
+                           cells that changed since the previous phase. Boxed in animals do not roll for breeding.
+                           In sequential mode an animal boxed in at the start of a phase waits for the next one
+        :param persist: save the simulation to the database when it ends
+        """
+        self._sid = next_simulation_id() if sim_id is None else sim_id
+        # dense animal ids of this simulation
+        self._oids = IdAllocator()
         self._sim_turn = 0
         self._init_simulation(**simulation_parameters)
+        # moved animals are tracked per cell, the cells marked during a turn are cleared at the start of the next one
+        # so the buffer is allocated once and only the pages of cells animals moved to are ever written
+        self._moved = np.zeros(self._grid_size ** 2, dtype=bool)
+        self._moved_cells = []
         self._simulation_parameters = simulation_parameters
-        if use_pacman:
-            self._fish_tank = PacmanFishTank(self._grid_size)
+        self._random = BatchedRandom(self._seed if seed is None else seed)
+        self._rng = self._random.generator
+        if use_array:
+            if use_pacman:
+                self._fish_tank = PacmanArrayFishTank(self._grid_size, synchronous, self._random)
+            else:
+                self._fish_tank = ArrayFishTank(self._grid_size, synchronous, self._random)
+        elif use_tiled:
+            if use_pacman:
+                self._fish_tank = PacmanTiledFishTank(self._grid_size, synchronous, self._random)
+            else:
+                self._fish_tank = TiledFishTank(self._grid_size, synchronous, self._random)
+        elif use_bitboard:
+            if use_pacman:
+                self._fish_tank = PacmanBitboardFishTank(self._grid_size, synchronous, self._random)
+            else:
+                self._fish_tank = BitboardFishTank(self._grid_size, synchronous, self._random)
+        elif use_pacman:
+            self._fish_tank = PacmanFishTank(self._grid_size, synchronous, self._random)
         else:
-            self._fish_tank = FishTank(self._grid_size)
+            self._fish_tank = FishTank(self._grid_size, synchronous, self._random)
+        self._active_set = active_set
+        self._persist = persist
+        # oids of the sharks by the turn they starve on unless fed before
+        self._starvation = TurnQueue()
+        # cells of the animals having a free neighbour at the last check
+        self._open_cells = set()
+        if active_set:
+            self._fish_tank.track_dirty_cells()
         self._spawn()
         self.sim_ended = False
 
@@ -45,7 +94,7 @@ class SimpleSimulationEngine(SimulationEngine):
 
     def _init_simulation(self, grid_size, init_nb_fish, init_nb_shark, fish_breed_maturity, fish_breed_probability,
                          fish_speed, shark_breed_maturity, shark_breed_probability, shark_speed,
-                         shark_starving, max_turns):
+                         shark_starving, max_turns, seed=None):
         """
         Initialize a simulation and return the sid
         :param grid_size:
@@ -59,6 +108,7 @@ class SimpleSimulationEngine(SimulationEngine):
         :param shark_speed:
         :param shark_starving:
         :param max_turns:
+        :param seed: optional seed of the simulation random generator
         """
         # first check some inputs
         if grid_size ** 2 < (init_nb_fish + init_nb_shark):
@@ -80,6 +130,7 @@ class SimpleSimulationEngine(SimulationEngine):
         self._shark_speed = shark_speed
         self._shark_starving = shark_starving
         self._max_turns = max_turns
+        self._seed = seed
 
     def _spawn(self):
         """
@@ -88,18 +139,18 @@ class SimpleSimulationEngine(SimulationEngine):
         """
         # get simulation elements
         grid_size = self._grid_size
-        coord_array = [(x, y) for x in range(grid_size) for y in range(grid_size)]
-        random.shuffle(coord_array)
+        cells = self._random.sample(grid_size ** 2, self._init_nb_fish + self._init_nb_shark)
         fishes = 0
         sharks = 0
-        for coord in coord_array:
+        for coord in [divmod(cell, grid_size) for cell in cells]:
             if fishes < self._init_nb_fish:
-                fish = Fish(self._sid, 0)
+                fish = Fish(self._sid, 0, self._oids.next_id())
                 self._fish_tank.put_animal(coord, fish)
                 fishes += 1
             elif sharks < self._init_nb_shark:
-                shark = Shark(self._sid, 1)
+                shark = Shark(self._sid, 1, self._oids.next_id())
                 self._fish_tank.put_animal(coord, shark)
+                self._schedule_starvation(shark)
                 sharks += 1
             else:
                 break
@@ -174,13 +225,15 @@ class SimpleSimulationEngine(SimulationEngine):
         self._sim_turn += 1
         _logger.debug('********************TURN: {:<3}********************'.format(self._sim_turn))
         self._remove_dead_sharks(self._sim_turn)
+        self._moved[self._moved_cells] = False
+        del self._moved_cells[:]
         fed_sharks_oid_dict = self._feed_sharks()
-        fed_and_moved_oid_dict = self._breed_animals(fed_sharks_oid_dict=fed_sharks_oid_dict)
-        self._move_remaining_animals(already_moved_oid_dict=fed_and_moved_oid_dict)
+        self._breed_animals(fed_sharks_oid_dict=fed_sharks_oid_dict)
+        self._move_remaining_animals()
 
         _logger.debug('********************END TURN: {:<3}*******************'.format(self._sim_turn))
         self.sim_ended = self._check_simulation_ends()
-        if self.sim_ended:
+        if self.sim_ended and self._persist:
             self.persist_to_db()
 
     def _remove_dead_sharks(self, sim_turn):
@@ -188,14 +241,32 @@ class SimpleSimulationEngine(SimulationEngine):
         Wrapper to call fish tank to remove starved sharks
         :param sim_turn: Current simulation turn
         """
-        number_starved_sharks = self._fish_tank.remove_starved_sharks(sim_turn, self._shark_starving)
+        number_starved_sharks = self._fish_tank.remove_starved_sharks(sim_turn, self._shark_starving,
+                                                                      self._starvation.pop(sim_turn))
         self._shark_starved_total += number_starved_sharks
 
+    def _schedule_starvation(self, shark):
+        """
+        Queue a shark for the turn it starves on if it does not feed again, to call when it spawns or feeds
+        """
+        self._starvation.push(shark.last_fed + self._shark_starving + 1, shark.oid)
+
+    def _mark_moved(self, coord):
+        """
+        Mark the animal that moved to coord this turn, it keeps that cell until the move phase
+        """
+        cell = coord[0] * self._grid_size + coord[1]
+        self._moved[cell] = True
+        self._moved_cells.append(cell)
+
+    def _has_moved(self, coord) -> bool:
+        return self._moved[coord[0] * self._grid_size + coord[1]]
+
     def _feed_sharks(self) -> Dict[int, Tuple]:
         """
         Feed sharks by looking for available fish.  If found, then remove the fish, and move the shark to the new
         coordinates.
-        :return: Dictionary of shark oid to shark coordinates
+        :return: Dictionary of fed shark oid to shark coordinates before feeding
         """
         fed_sharks_oid_dict = {}
         current_sharks_tuple_list = self._fish_tank.get_current_sharks()
@@ -209,112 +280,160 @@ class SimpleSimulationEngine(SimulationEngine):
                 self._fish_tank.eat_fish(self._sim_turn, shark_coord, fish_coord)
                 self._fish_eaten_total += 1
                 fed_sharks_oid_dict[shark.oid] = shark_coord
+                self._mark_moved(fish_coord)
+                self._schedule_starvation(shark)
         return fed_sharks_oid_dict
 
-    def _move_remaining_animals(self, already_moved_oid_dict):
+    def _active_animals(self, fed_sharks=None) -> List[Tuple]:
+        """
+        Animals that can act in the next phase: the ones with a free neighbour among those around a changed cell or
+        having a free neighbour at the previous check, and the fed sharks which breed without free space
+        :param fed_sharks: dict of fed shark oid to original coords in turn
+        :return: List of coordinates and animals
+        """
+        tank = self._fish_tank
+        animals = []
+        open_cells = set()
+        for coord in self._open_cells | tank.take_dirty_region():
+            animal = tank.check_animal(coord)
+            if animal is None:
+                continue
+            if tank.has_available_nearby_space(coord):
+                open_cells.add(coord)
+                animals.append((coord, animal))
+            elif fed_sharks and animal.oid in fed_sharks:
+                animals.append((coord, animal))
+        self._open_cells = open_cells
+        return animals
+
+    def _phase_draws(self, animals, per_animal: int) -> List[float]:
+        """
+        Uniform draws of a phase, drawn at once and indexed by the position of the animals in the phase
+        :param animals: animals the phase acts on, every animal if None
+        :param per_animal: number of draws per animal
+        """
+        if animals is None:
+            nb_animals = self._fish_tank.get_current_number_fishes() + self._fish_tank.get_current_number_sharks()
+        else:
+            nb_animals = len(animals)
+        return self._random.draws(per_animal * nb_animals)
+
+    def _move_remaining_animals(self):
         """
-        Move any animals that haven't already moved
-        TODO implement move greater than 1 square
-        :param already_moved_oid_dict: Dictionary of animal oid to coordinates already moved
+        Move any animals that haven't already moved, as a phase
+        Animals move to any free cell reachable within fish_speed / shark_speed steps through free cells
         """
-        fish_tank_grid = self._fish_tank.get_grid()
-        for coord, animal in fish_tank_grid.copy().items():
-            if animal.oid not in already_moved_oid_dict:
+        animals = self._active_animals() if self._active_set else None
+        draws = self._phase_draws(animals, 1)
+        for index, coord, animal in self._fish_tank.begin_phase(animals=animals):
+            move_coord = None
+            if not self._has_moved(coord):
                 _logger.debug("_move_remaining_animals() - looking at animal ({}) in [{}]".format(animal.oid, coord))
-                available_neighbors = self._fish_tank.find_available_nearby_space(coord)
-                if len(available_neighbors) > 0:
-                    move_coord = available_neighbors[0]
-                    self._fish_tank.move_animal(coord, animal, move_coord)
-                    _logger.debug("_move_remaining_animals() - move animal ({}) to [{}]".format(animal.oid, move_coord))
+                speed = self._fish_speed if animal.animal_type is Animal.Fish else self._shark_speed
+                move_coord = self._fish_tank.pick_reachable_space(coord, speed, draws[index])
+            if self._fish_tank.carry_animal(coord, animal, move_coord) != coord:
+                _logger.debug("_move_remaining_animals() - move animal ({}) to [{}]".format(animal.oid, move_coord))
+        self._fish_tank.end_phase()
 
-    def _breed_animals(self, fed_sharks_oid_dict) -> Dict[int, Tuple]:
+    def _breed_animals(self, fed_sharks_oid_dict):
         """
-        Breed animals where possible
+        Breed animals where possible as a phase, parents moving to breed are marked as moved
         Sharks first, but must check if they have fed (which indicates movement)
-        :param fed_sharks_oid_dict: dict of shark oid to original coords in turn. Tracks already moved animals.
-        :return: Dictionary of animal oid to animal coordinates
+        :param fed_sharks_oid_dict: dict of fed shark oid to original coords in turn
         """
-        already_moved_animals = fed_sharks_oid_dict
-        fish_tank_grid = self._fish_tank.get_grid()
-        for coord, animal in fish_tank_grid.copy().items():
+        animals = self._active_animals(fed_sharks_oid_dict) if self._active_set else None
+        # a breeding roll and a neighbour pick per animal
+        draws = self._phase_draws(animals, 2)
+        for index, coord, animal in self._fish_tank.begin_phase(sharks_first=True, animals=animals):
             if animal.animal_type == Animal.Shark:
-                self._breed_shark(animal, coord, already_moved_animals)
-        for coord, animal in fish_tank_grid.copy().items():
-            if animal.animal_type == Animal.Fish:
-                self._breed_fish(animal, coord, already_moved_animals)
-        return already_moved_animals
+                self._breed_shark(animal, coord, fed_sharks_oid_dict, draws[2 * index], draws[2 * index + 1])
+            else:
+                self._breed_fish(animal, coord, draws[2 * index], draws[2 * index + 1])
+        self._fish_tank.end_phase()
         # TODO collect Audit actions
 
-    def _breed_fish(self, animal, coord, already_moved_animals):
+    def _breed_fish(self, animal, coord, roll: float, pick: float):
         """
         Breed fish
         :param animal:Fish to check for breeding
         :param coord: Current coordinates of fish
-        :param already_moved_animals: Animals that have already moved.
-                                        Append to this list for movement due to breeding
+        :param roll: uniform draw of the breeding roll
+        :param pick: uniform draw choosing the free neighbour
         """
+        move_parent_coord = None
         if (self._sim_turn - animal.spawn_turn) >= self._fish_breed_maturity:
-            # fish can breed
-            if random.randint(0, 100) <= self._fish_breed_probability:
-                # always use the underlying grid to check availability and for puts
-                available_neighbors = self._fish_tank.find_available_nearby_space(coord)
-                if len(available_neighbors) > 0:
-                    baby_fish = Fish(self._sid, self._sim_turn)
-                    move_parent_coord = available_neighbors[0]
-                    self._fish_tank.move_animal(coord, animal, move_parent_coord)
-                    _logger.debug("_breed_fish() - move parent fish ({}) to [{}]".format(animal.oid, move_parent_coord))
-                    already_moved_animals[animal.oid] = coord
-                    self._fish_tank.put_animal(coord, baby_fish)
-                    _logger.debug("_breed_fish() - new fish ({}) at [{}]".format(baby_fish.oid, coord))
-                    self._fish_breed_total += 1
-
-    def _breed_shark(self, animal, coord, already_moved_animals):
+            # fish can breed, the roll is an integer in [0, 100]
+            if int(roll * 101) <= self._fish_breed_probability:
+                move_parent_coord = self._fish_tank.pick_available_nearby_space(coord, pick)
+        if self._fish_tank.carry_animal(coord, animal, move_parent_coord) != coord:
+            _logger.debug("_breed_fish() - move parent fish ({}) to [{}]".format(animal.oid, move_parent_coord))
+            self._mark_moved(move_parent_coord)
+            baby_fish = Fish(self._sid, self._sim_turn, self._oids.next_id())
+            self._fish_tank.spawn_animal(coord, baby_fish)
+            _logger.debug("_breed_fish() - new fish ({}) at [{}]".format(baby_fish.oid, coord))
+            self._fish_breed_total += 1
+
+    def _breed_shark(self, animal, coord, fed_sharks, roll: float, pick: float):
         """
         Breed shark.  Different method to fish, since sharks can feed first.
         :param animal: Shark  to check for breeding
         :param coord: Current coordinates of shark
-        :param already_moved_animals: Animals that have already moved.
-                                        Append to this list for movement due to breeding
+        :param fed_sharks: dict of fed shark oid to original coords in turn
+        :param roll: uniform draw of the breeding roll
+        :param pick: uniform draw choosing the free neighbour
         """
-
+        can_breed = False
         if (self._sim_turn - animal.spawn_turn) >= self._shark_breed_maturity:
-            # shark can breed
-            if random.randint(0, 100) <= self._shark_breed_probability:
-                if animal.oid in already_moved_animals:
-                    animal.breed_count += 1
-                    animal.last_breed = self._sim_turn
-                    baby_shark = Shark(self._sid, self._sim_turn)
-                    # use original coord
-                    breed_coord = already_moved_animals[animal.oid]
-                    self._fish_tank.put_animal(breed_coord, baby_shark)
-                    _logger.debug(
-                        "_breed_shark() - new shark ({}) to [{}] from parent ({})".format(baby_shark.oid, breed_coord,
-                                                                                          animal.oid))
-                    self._shark_breed_total += 1
-
-                else:
-                    available_neighbors = self._fish_tank.find_available_nearby_space(coord)
-                    if len(available_neighbors) > 0:
-                        animal.breed_count += 1
-                        animal.last_breed = self._sim_turn
-                        baby_shark = Shark(self._sid, self._sim_turn)
-                        move_parent_coord = available_neighbors[0]
-                        self._fish_tank.move_animal(coord, animal, move_parent_coord)
-                        _logger.debug(
-                            "_breed_shark() - move parent shark ({}) to [{}]".format(animal.oid, move_parent_coord))
-                        already_moved_animals[animal.oid] = coord
-                        self._fish_tank.put_animal(coord, baby_shark)
-                        _logger.debug("_breed_shark() - new shark ({}) at [{}]".format(baby_shark.oid, coord))
-                        self._shark_breed_total += 1
+            # shark can breed, the roll is an integer in [0, 100]
+            can_breed = int(roll * 101) <= self._shark_breed_probability
+        if can_breed and animal.oid in fed_sharks:
+            baby_shark = Shark(self._sid, self._sim_turn, self._oids.next_id())
+            # use original coord
+            breed_coord = fed_sharks[animal.oid]
+            if self._fish_tank.spawn_animal(breed_coord, baby_shark):
+                self._schedule_starvation(baby_shark)
+                self._fish_tank.record_breed(coord, self._sim_turn)
+                _logger.debug(
+                    "_breed_shark() - new shark ({}) to [{}] from parent ({})".format(baby_shark.oid, breed_coord,
+                                                                                      animal.oid))
+                self._shark_breed_total += 1
+            return
+        move_parent_coord = self._fish_tank.pick_available_nearby_space(coord, pick) if can_breed else None
+        if self._fish_tank.carry_animal(coord, animal, move_parent_coord) != coord:
+            self._fish_tank.record_breed(move_parent_coord, self._sim_turn)
+            _logger.debug("_breed_shark() - move parent shark ({}) to [{}]".format(animal.oid, move_parent_coord))
+            self._mark_moved(move_parent_coord)
+            baby_shark = Shark(self._sid, self._sim_turn, self._oids.next_id())
+            self._fish_tank.spawn_animal(coord, baby_shark)
+            self._schedule_starvation(baby_shark)
+            _logger.debug("_breed_shark() - new shark ({}) at [{}]".format(baby_shark.oid, coord))
+            self._shark_breed_total += 1
 
     @property
     def sim_turn(self):
         return self._sim_turn
 
+    @property
+    def fish_tank(self):
+        """
+        Fish tank holding the grid of the simulation
+        """
+        return self._fish_tank
+
     @property
     def max_turns(self):
         return self._max_turns
 
+    def get_stats(self) -> Dict:
+        """
+        Statistics of the simulation, as saved in SimStats, with the number of turns played and the current population
+        """
+        return {'sim_id': self._sid, 'sim_turn': self._sim_turn,
+                'shark_breed_total': self._shark_breed_total, 'fish_breed_total': self._fish_breed_total,
+                'fish_eaten_total': self._fish_eaten_total, 'shark_starved_total': self._shark_starved_total,
+                'nb_fish': self._fish_tank.get_current_number_fishes(),
+                'nb_shark': self._fish_tank.get_current_number_sharks()}
+
     def persist_to_db(self):
         """
         Persist all audit actions to database
@@ -322,11 +441,10 @@ class SimpleSimulationEngine(SimulationEngine):
         rather than single calls to the database for each object
         """
         client = PersistenceClient(get_database_string())
-        sim_params = self._simulation_parameters
+        sim_params = {k: v for k, v in self._simulation_parameters.items() if k != 'seed'}
         sim_params["sid"] = self._sid
         client.save_sim_params(**sim_params)
-        fish_tank_grid = self._fish_tank.get_grid()
-        for coord, animal in fish_tank_grid.items():
+        for coord, animal in self._fish_tank.get_animals():
             x, y = coord
             client.save_animal(animal.oid, self._sid, animal.animal_type, animal.spawn_turn,
                                animal.breed_count, animal.last_breed, animal.last_fed, animal.alive, x, y)
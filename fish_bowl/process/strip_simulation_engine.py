@@ -0,0 +1,356 @@
+import logging
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+from threading import BrokenBarrierError
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from fish_bowl.data_struct.animals import Fish, Shark
+from fish_bowl.data_struct.array_fish_tank import ArrayFishTank, PacmanArrayFishTank, array_specs, EMPTY_CELL
+from fish_bowl.process.batched_random import BatchedRandom
+from fish_bowl.process.id_allocator import IdAllocator
+from fish_bowl.process.simple_simulation_engine import SimpleSimulationEngine
+from fish_bowl.process.utils import Animal
+
+_logger = logging.getLogger(__name__)
+
+# columns of the shared stats array, running totals of each worker
+STATS = ('fish_breed', 'shark_breed', 'fish_eaten', 'shark_starved')
+
+
+def strip_bounds(grid_size: int, nb_strips: int) -> List[Tuple[int, int]]:
+    """
+    Split the rows of a grid in strips of nearly equal height
+    :return: [first row, last row + 1) of each strip
+    """
+    edges = [grid_size * i // nb_strips for i in range(nb_strips + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def min_strip_rows(speed: int) -> int:
+    """
+    Rows a strip needs so that strips of the same colour never touch the same rows: an animal can move speed rows out
+    of its strip and its move updates the masks of the row after, on each side
+    """
+    return 2 * speed + 2
+
+
+def strip_colours(nb_strips: int, wrap: bool) -> List[int]:
+    """
+    Colour of each strip, adjacent strips never share a colour so strips of a colour can run at the same time.
+    The first and last strips are adjacent with a wrapping topology, an odd number of strips then needs a third colour
+    """
+    colours = [strip % 2 for strip in range(nb_strips)]
+    if wrap and nb_strips > 1 and nb_strips % 2 == 1:
+        colours[-1] = 2
+    return colours
+
+
+def _release_shared_memory(blocks: List[shared_memory.SharedMemory], stop, start_barrier):
+    """
+    Stop the workers of an engine and unlink its shared memory, the memory is freed once its last mapping is closed
+    """
+    stop.value = 1
+    start_barrier.abort()
+    for block in blocks:
+        block.unlink()
+
+
+def _shared_arrays(blocks: Dict[str, shared_memory.SharedMemory], specs: Dict) -> Dict[str, np.ndarray]:
+    return {name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf) for name, (shape, dtype) in specs.items()}
+
+
+class StripWorker(object):
+    """
+    Plays the turns of one strip of rows, on a fish tank attached to the shared arrays.
+    Animals act one at a time like in SimpleSimulationEngine: the ones starting the turn in the strip starve, feed,
+    breed and move, and can end it in the edge rows of a neighbour strip. They are then flagged in the shared done array
+    so the neighbour strip does not play them again in the same turn.
+    """
+
+    def __init__(self, strip: int, nb_strips: int, grid_size: int, use_pacman: bool, parameters: Dict,
+                 block_names: Dict[str, str], seed, first_oid: int, sim_id: int):
+        """
+        :param strip: index of the strip
+        :param nb_strips: number of strips
+        :param grid_size: size of the grid
+        :param use_pacman: use a Pacman style topology
+        :param parameters: simulation parameters
+        :param block_names: name of the shared memory block of each array
+        :param seed: seed of the random generator of the strip, a SeedSequence spawned by the engine
+        :param first_oid: first oid free when the workers start, workers allocate oids with a step of nb_strips
+        :param sim_id: simulation id
+        """
+        self._x0, self._x1 = strip_bounds(grid_size, nb_strips)[strip]
+        self._grid_size = grid_size
+        self._parameters = parameters
+        self._sid = sim_id
+        self._specs = self.specs(grid_size, nb_strips)
+        self._blocks = {name: shared_memory.SharedMemory(name=block_name) for name, block_name in block_names.items()}
+        arrays = _shared_arrays(self._blocks, self._specs)
+        self._done = arrays.pop('done')
+        self._stats = arrays.pop('stats')[strip]
+        self._random = BatchedRandom(seed)
+        self._oids = IdAllocator(first_oid + strip, nb_strips)
+        tank_class = PacmanArrayFishTank if use_pacman else ArrayFishTank
+        self._fish_tank = tank_class(grid_size, rng=self._random, arrays=arrays)
+
+    @staticmethod
+    def specs(grid_size: int, nb_strips: int) -> Dict:
+        """
+        Shape and dtype of the shared arrays: the tank arrays, the done flags and the stats of each strip
+        """
+        specs = array_specs(grid_size)
+        specs['done'] = ((grid_size, grid_size), np.dtype(np.uint8))
+        specs['stats'] = ((nb_strips, len(STATS)), np.dtype(np.int64))
+        return specs
+
+    def close(self):
+        self._fish_tank = None
+        self._done = None
+        self._stats = None
+        for block in self._blocks.values():
+            block.close()
+
+    def _alive(self, actor) -> bool:
+        """
+        Check the animal of an actor is still where the actor says, fish eaten by a shark are replaced by the shark
+        """
+        coord, oid = actor[0], actor[1]
+        arrays = self._fish_tank.get_arrays()
+        return arrays['type'].item(coord) != EMPTY_CELL and arrays['oid'].item(coord) == oid
+
+    def play_turn(self, sim_turn: int):
+        """
+        Play a turn for the animals starting it in the strip and not already played by a neighbour strip
+        """
+        tank = self._fish_tank
+        arrays = tank.get_arrays()
+        params = self._parameters
+        done = self._done.ravel()
+        cells = tank.get_cells(rows=(self._x0, self._x1))
+        cells = cells[done[cells] == 0]
+        types = arrays['type'].ravel()[cells]
+        # starve
+        starved = (types == Animal.Shark.value) & \
+                  (sim_turn - arrays['last_fed'].ravel()[cells] > params['shark_starving'])
+        tank.remove_animals(cells[starved])
+        self._stats[STATS.index('shark_starved')] += int(np.count_nonzero(starved))
+        cells, types = cells[~starved], types[~starved]
+        # actors are [coordinates, oid, type, moved], coordinates follow the animal
+        actors = [[divmod(cell, self._grid_size), oid, Animal(animal_type), False] for cell, oid, animal_type
+                  in zip(cells.tolist(), arrays['oid'].ravel()[cells].tolist(), types.tolist())]
+        sharks = [actor for actor in actors if actor[2] == Animal.Shark]
+        fishes = [actor for actor in actors if actor[2] == Animal.Fish]
+        # feed
+        fed = {}
+        for actor in sharks:
+            fish_tuple = tank.find_fish_to_eat(actor[0])
+            if fish_tuple is not None:
+                tank.eat_fish(sim_turn, actor[0], fish_tuple[0])
+                self._stats[STATS.index('fish_eaten')] += 1
+                fed[actor[1]] = actor[0]
+                actor[0], actor[3] = fish_tuple[0], True
+        # breed
+        babies = []
+        for actor in sharks + fishes:
+            if not self._alive(actor):
+                continue
+            is_shark = actor[2] == Animal.Shark
+            maturity, probability = (params['shark_breed_maturity'], params['shark_breed_probability']) if is_shark \
+                else (params['fish_breed_maturity'], params['fish_breed_probability'])
+            if sim_turn - arrays['spawn_turn'].item(actor[0]) < maturity or \
+                    self._random.randint(0, 100) > probability:
+                continue
+            if actor[1] in fed:
+                # fed sharks leave their baby where they were
+                baby_coord = fed[actor[1]]
+                if arrays['type'].item(baby_coord) != EMPTY_CELL:
+                    continue
+                tank.record_breed(actor[0], sim_turn)
+            else:
+                new_coord = tank.pick_available_nearby_space(actor[0])
+                if new_coord is None:
+                    continue
+                baby_coord = actor[0]
+                tank.move_animal(actor[0], tank.check_animal(actor[0]), new_coord)
+                actor[0], actor[3] = new_coord, True
+                if is_shark:
+                    tank.record_breed(new_coord, sim_turn)
+            baby = (Shark if is_shark else Fish)(self._sid, sim_turn, self._oids.next_id())
+            tank.put_animal(baby_coord, baby)
+            babies.append([baby_coord, baby.oid, actor[2], False])
+            self._stats[STATS.index('shark_breed' if is_shark else 'fish_breed')] += 1
+        # move
+        for actor in actors + babies:
+            if actor[3] or not self._alive(actor):
+                continue
+            speed = params['shark_speed'] if actor[2] == Animal.Shark else params['fish_speed']
+            new_coord = tank.pick_reachable_space(actor[0], speed)
+            if new_coord is not None:
+                tank.move_animal(actor[0], tank.check_animal(actor[0]), new_coord)
+                actor[0] = new_coord
+        for actor in actors + babies:
+            if self._alive(actor):
+                done[actor[0][0] * self._grid_size + actor[0][1]] = 1
+
+
+def _run_worker(worker_args: Dict, colour: int, nb_colours: int, turn, stop, start_barrier, strips_barrier,
+                end_barrier):
+    """
+    Worker process loop: wait for a turn, play the strip when its colour comes, repeat until stopped
+    """
+    worker = StripWorker(**worker_args)
+    try:
+        while True:
+            start_barrier.wait()
+            if stop.value:
+                break
+            for current in range(nb_colours):
+                if current == colour:
+                    worker.play_turn(turn.value)
+                strips_barrier.wait()
+            end_barrier.wait()
+    except BrokenBarrierError:
+        pass
+    except Exception:
+        _logger.exception('Strip {} failed'.format(worker_args['strip']))
+        for barrier in (start_barrier, strips_barrier, end_barrier):
+            barrier.abort()
+    finally:
+        worker.close()
+
+
+class StripSimulationEngine(SimpleSimulationEngine):
+    """
+    Simulation engine splitting the grid in horizontal strips of rows, each played by a worker process.
+    The tank arrays live in multiprocessing shared memory: the halo rows a strip reaches are the edge rows of its
+    neighbours, read and written in place. Moves crossing strip edges are resolved deterministically by colouring the
+    strips so that neighbours never run at the same time, the strips of a colour run in parallel then the next colour
+    (the first and last strips are neighbours with the pacman topology). Each strip has its own random generator seeded
+    from the engine one, so a seed and a number of workers always give the same simulation.
+    Animals act one at a time within a strip like in SimpleSimulationEngine, moving up to their speed: strips need
+    more rows for faster animals (min_strip_rows).
+    Call close (or use the engine as a context manager) to stop the workers and release the shared memory, an engine
+    collected without being closed stops its workers and unlinks the shared memory.
+    """
+
+    def __init__(self, simulation_parameters: Dict, nb_workers: int = 4, use_pacman=False, sim_id: int = None,
+                 seed=None, timeout: float = None):
+        """
+        :param simulation_parameters:
+        :param nb_workers: number of strips and worker processes, at least two strips must share a colour: 3 without
+        wrap, 4 with the pacman topology
+        :param use_pacman: use a Pacman style topology
+        :param sim_id: simulation id, allocated by the process simulation id allocator if not set
+        :param seed: seed of the simulation random generator, the 'seed' simulation parameter if not set
+        :param timeout: seconds to wait for the workers to play a turn, no limit if not set
+        """
+        super().__init__(simulation_parameters, use_pacman=use_pacman, use_array=True, sim_id=sim_id, seed=seed)
+        grid_size = self._grid_size
+        strip_rows = min_strip_rows(max(self._fish_speed, self._shark_speed))
+        if grid_size // nb_workers < strip_rows:
+            raise ValueError('Strips need at least {} rows, use at most {} workers'.format(
+                strip_rows, max(grid_size // strip_rows, 1)))
+        colours = strip_colours(nb_workers, use_pacman)
+        if len(set(colours)) == nb_workers:
+            raise ValueError('{} strips would run one after the other, use at least 4 workers'.format(nb_workers))
+        if max(colours) == 2:
+            _logger.warning('The last of {} strips runs alone with the pacman topology, '
+                            'an even number of workers runs every strip with another one'.format(nb_workers))
+        self._timeout = timeout
+        specs = StripWorker.specs(grid_size, nb_workers)
+        self._blocks = {name: shared_memory.SharedMemory(create=True, size=max(dtype.itemsize * int(np.prod(shape)), 1))
+                        for name, (shape, dtype) in specs.items()}
+        arrays = _shared_arrays(self._blocks, specs)
+        for name, array in self._fish_tank.get_arrays().items():
+            arrays[name][...] = array
+        arrays['stats'][...] = 0
+        self._done = arrays.pop('done')
+        self._stats = arrays.pop('stats')
+        self._fish_tank = (PacmanArrayFishTank if use_pacman else ArrayFishTank)(grid_size, rng=self._random,
+                                                                                 arrays=arrays)
+        context = multiprocessing.get_context()
+        self._turn = context.Value('i', 0)
+        self._stop = context.Value('b', 0)
+        self._start_barrier = context.Barrier(nb_workers + 1)
+        self._end_barrier = context.Barrier(nb_workers + 1)
+        strips_barrier = context.Barrier(nb_workers)
+        # unlinks the shared memory when the engine is collected without being closed
+        self._release = weakref.finalize(self, _release_shared_memory, list(self._blocks.values()), self._stop,
+                                         self._start_barrier)
+        # each strip draws from its own stream spawned from the simulation seed
+        seeds = self._random.spawn_seeds(nb_workers)
+        self._workers = []
+        for strip in range(nb_workers):
+            worker_args = dict(strip=strip, nb_strips=nb_workers, grid_size=grid_size, use_pacman=use_pacman,
+                               parameters=self._simulation_parameters,
+                               block_names={name: block.name for name, block in self._blocks.items()},
+                               seed=seeds[strip], first_oid=self._oids.count, sim_id=self._sid)
+            process = context.Process(target=_run_worker, daemon=True,
+                                      args=(worker_args, colours[strip], max(colours) + 1, self._turn, self._stop,
+                                            self._start_barrier, strips_barrier, self._end_barrier))
+            process.start()
+            self._workers.append(process)
+
+    def play_turn(self):
+        """
+        Create a new turn, played by the workers strip by strip
+        """
+        if self.sim_ended:
+            _logger.warning("Simulation id ({}) has ended".format(self._sid))
+            return
+        if not self._workers:
+            raise RuntimeError('Simulation id ({}) is closed'.format(self._sid))
+
+        self._sim_turn += 1
+        _logger.debug('********************TURN: {:<3}********************'.format(self._sim_turn))
+        self._done[...] = 0
+        self._turn.value = self._sim_turn
+        try:
+            self._start_barrier.wait(self._timeout)
+            self._end_barrier.wait(self._timeout)
+        except BrokenBarrierError as err:
+            self.close()
+            raise RuntimeError('A strip worker of simulation id ({}) failed'.format(self._sid)) from err
+        self._fish_tank.recount_population()
+        totals = self._stats.sum(axis=0).tolist()
+        self._fish_breed_total, self._shark_breed_total, self._fish_eaten_total, self._shark_starved_total = totals
+
+        _logger.debug('********************END TURN: {:<3}*******************'.format(self._sim_turn))
+        self.sim_ended = self._check_simulation_ends()
+        if self.sim_ended and self._persist:
+            self.persist_to_db()
+
+    def close(self):
+        """
+        Stop the workers and release the shared memory, the tank is copied to private memory first
+        """
+        if not self._workers:
+            return
+        self._stop.value = 1
+        try:
+            self._start_barrier.wait(self._timeout)
+        except BrokenBarrierError:
+            pass
+        for process in self._workers:
+            process.join(self._timeout)
+            if process.is_alive():
+                process.terminate()
+        self._workers = []
+        arrays = {name: array.copy() for name, array in self._fish_tank.get_arrays().items()}
+        self._fish_tank = type(self._fish_tank)(self._grid_size, rng=self._random, arrays=arrays)
+        self._done = None
+        self._stats = None
+        for block in self._blocks.values():
+            block.close()
+        self._blocks = {}
+        self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
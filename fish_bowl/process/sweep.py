@@ -0,0 +1,211 @@
+"""
+Parameter sweeps: run replicates of many simulation configurations over a process pool
+
+Runs are submitted a few at a time and their results folded into running statistics as they complete, so the parent
+process holds a bounded number of small results whatever the number of runs.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+
+from fish_bowl.process.id_allocator import configure_worker
+from fish_bowl.process.simple_simulation_engine import SimpleSimulationEngine
+from fish_bowl.process.vectorized_simulation_engine import VectorizedSimulationEngine
+
+_logger = logging.getLogger(__name__)
+
+
+def _jit_engine_class() -> type:
+    # imported on first use so that importing the sweep does not import numba
+    from fish_bowl.process.jit_simulation_engine import jit_engine_class
+    return jit_engine_class()
+
+
+# returns the engine class of each engine name when a run starts, the jit engine falls back to the simple one without
+# numba
+ENGINES = {'simple': lambda: SimpleSimulationEngine, 'vectorized': lambda: VectorizedSimulationEngine,
+           'jit': _jit_engine_class}
+# totals of a run, named like the SimStats columns
+RUN_STATS = ('shark_breed_total', 'fish_breed_total', 'fish_eaten_total', 'shark_starved_total')
+
+
+def sweep_configs(base_config: Dict, grid: Dict[str, List]) -> List[Dict]:
+    """
+    Configurations of a parameter grid: base_config with every combination of the grid values
+    :param base_config: simulation parameters shared by all the configurations
+    :param grid: values taken by each swept parameter
+    """
+    names = list(grid)
+    return [dict(base_config, **dict(zip(names, values))) for values in itertools.product(*grid.values())]
+
+
+def run_replicate(config: Dict, seed, engine: str = 'simple') -> Dict:
+    """
+    Play a simulation to its end without saving it to the database
+    :param config: simulation parameters
+    :param seed: seed of the simulation random generator
+    :param engine: name of the engine in ENGINES
+    :return: number of fishes and sharks after each turn (index 0 is the initial state), turn the sharks went extinct
+    on (None if they survived), turns played, simulation id and the SimStats totals
+    """
+    simulation_engine = ENGINES[engine]()(config, seed=seed, persist=False)
+    tank = simulation_engine.fish_tank
+    fishes = [tank.get_current_number_fishes()]
+    sharks = [tank.get_current_number_sharks()]
+    while not simulation_engine.sim_ended:
+        simulation_engine.play_turn()
+        fishes.append(tank.get_current_number_fishes())
+        sharks.append(tank.get_current_number_sharks())
+    result = {'fishes': np.array(fishes), 'sharks': np.array(sharks),
+              'extinction_turn': simulation_engine.sim_turn if sharks[-1] == 0 else None,
+              'sim_turn': simulation_engine.sim_turn}
+    stats = simulation_engine.get_stats()
+    result['sim_id'] = stats['sim_id']
+    result.update((name, stats[name]) for name in RUN_STATS)
+    return result
+
+
+class RunningStats(object):
+    """
+    Mean and variance of a stream of values or of equal shape arrays, updated one value at a time (Welford)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+
+    def add(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        self.count += 1
+        if self.mean is None:
+            self.mean = value.copy()
+            self._m2 = np.zeros_like(value)
+            return
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self._m2 = self._m2 + delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        """
+        Sample variance, 0 with less than two values and None without any
+        """
+        if self.count == 0:
+            return None
+        if self.count < 2:
+            return np.zeros_like(self._m2)
+        return self._m2 / (self.count - 1)
+
+
+class SweepAggregate(object):
+    """
+    Statistics over the runs of one configuration. Trajectories of runs that ended early keep their last populations
+    up to max_turns, so all runs are averaged over the same turns.
+    """
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self.runs = 0
+        self.extinctions = 0
+        self._trajectory_length = config['max_turns'] + 1
+        self._fishes = RunningStats()
+        self._sharks = RunningStats()
+        self._extinction_turn = RunningStats()
+        self._totals = {name: RunningStats() for name in RUN_STATS}
+
+    def _pad(self, trajectory: np.ndarray) -> np.ndarray:
+        return np.pad(trajectory, (0, self._trajectory_length - len(trajectory)), mode='edge')
+
+    def add(self, result: Dict):
+        """
+        Fold the result of a run in
+        """
+        self.runs += 1
+        self._fishes.add(self._pad(result['fishes']))
+        self._sharks.add(self._pad(result['sharks']))
+        if result['extinction_turn'] is not None:
+            self.extinctions += 1
+            self._extinction_turn.add(result['extinction_turn'])
+        for name, stats in self._totals.items():
+            stats.add(result[name])
+
+    def summary(self) -> Dict:
+        """
+        Mean and variance of the population trajectories and of the SimStats totals, extinction rate and mean
+        extinction turn of the runs that went extinct. The means and variances are None before the first run
+        """
+        summary = {'config': self.config, 'runs': self.runs, 'extinctions': self.extinctions,
+                   'fishes_mean': self._fishes.mean, 'fishes_var': self._fishes.variance,
+                   'sharks_mean': self._sharks.mean, 'sharks_var': self._sharks.variance,
+                   'extinction_turn_mean': float(self._extinction_turn.mean) if self.extinctions else None}
+        for name, stats in self._totals.items():
+            summary[name + '_mean'] = float(stats.mean) if self.runs else None
+            summary[name + '_var'] = float(stats.variance) if self.runs else None
+        return summary
+
+
+def _init_worker(started_workers, nb_workers: int):
+    """
+    Give each worker of the pool its own index, so that the simulation ids of the runs are unique across the pool
+    :param started_workers: shared counter of the workers started so far
+    :param nb_workers: number of workers in the pool
+    """
+    with started_workers.get_lock():
+        worker_id = started_workers.value
+        started_workers.value += 1
+    configure_worker(worker_id, nb_workers)
+
+
+def run_sweep(configs: Iterable[Dict], replicates: int, max_workers: int = None, engine: str = 'simple',
+              base_seed: int = 0, on_result: Callable[[int, int, Dict], None] = None) -> List[Dict]:
+    """
+    Run replicates of each configuration on a process pool and aggregate their results as they complete
+    :param configs: simulation parameters of each configuration
+    :param replicates: number of runs of each configuration
+    :param max_workers: number of worker processes, the number of CPUs if not set
+    :param engine: name of the engine in ENGINES
+    :param base_seed: replicate r of configuration c is seeded with [base_seed, c, r], so results do not depend on
+                      the number of workers
+    :param on_result: called with the configuration index, the replicate and the result of each run, e.g. to write
+                      runs out, in completion order
+    :return: summary of each configuration, in configuration order
+    """
+    if replicates < 1:
+        raise ValueError('A sweep needs at least one replicate per configuration')
+    aggregates = [SweepAggregate(config) for config in configs]
+    max_workers = max_workers or os.cpu_count() or 1
+    # a couple of runs per worker in flight keeps the workers busy without queuing every run
+    max_pending = 2 * max_workers
+    pending = {}
+    context = multiprocessing.get_context()
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker,
+                             initargs=(context.Value('i', 0), max_workers)) as executor:
+        for index in range(len(aggregates)):
+            for replicate in range(replicates):
+                if len(pending) >= max_pending:
+                    _collect(pending, aggregates, on_result)
+                future = executor.submit(run_replicate, aggregates[index].config, [base_seed, index, replicate],
+                                         engine)
+                pending[future] = index, replicate
+        while pending:
+            _collect(pending, aggregates, on_result)
+    return [aggregate.summary() for aggregate in aggregates]
+
+
+def _collect(pending: Dict, aggregates: List[SweepAggregate], on_result):
+    """
+    Wait for at least one pending run and fold the results of the completed ones in
+    """
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        index, replicate = pending.pop(future)
+        result = future.result()
+        aggregates[index].add(result)
+        if on_result is not None:
+            on_result(index, replicate, result)
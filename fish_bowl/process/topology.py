@@ -6,9 +6,12 @@ look for neighbours
 
 """
 from collections import namedtuple
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple
 import random
 
+import numpy as np
+
 SQUARE_NEIGH = {
     'nw': (-1, -1),
     'n': (0, -1),
@@ -21,6 +24,11 @@ SQUARE_NEIGH = {
 }
 
 
+SQUARE_TOPOLOGY = 'square'
+# edges wrap around to the opposite edge
+PACMAN_TOPOLOGY = 'pacman'
+
+
 class NonEmptyCoordinate(Exception):
     pass
 
@@ -70,19 +78,224 @@ def square_grid_valid(grid_size: int, coordinates: SquareGridCoordinate, raise_e
 
 
 def square_grid_neighbours(grid_size: int, coordinate: SquareGridCoordinate,
-                           shuffle: bool = True) -> List[SquareGridCoordinate]:
+                           shuffle: bool = True, rng=None) -> List[SquareGridCoordinate]:
     """
     for a given corrdinate, return all 8 neighbours
     :param grid_size:
     :param coordinate:
     :param shuffle:
+    :param rng: random source used to shuffle, such as a BatchedRandom, the random module if not set
     :return:
     """
-    neigh = []
-    for k, (x, y) in SQUARE_NEIGH.items():
-        new_coord = coordinate.move(x, y)
-        if square_grid_valid(grid_size=grid_size, coordinates=new_coord, raise_err=False):
-            neigh.append(new_coord)
+    if square_grid_valid(grid_size=grid_size, coordinates=coordinate, raise_err=False):
+        table = neighbour_table(grid_size)
+        neigh = [SquareGridCoordinate(x, y) for x, y in table.neighbour_coords(int(coordinate.x), int(coordinate.y))]
+    else:
+        # a coordinate off the grid has the neighbours that are on it
+        neigh = []
+        for k, (x, y) in SQUARE_NEIGH.items():
+            new_coord = coordinate.move(x, y)
+            if square_grid_valid(grid_size=grid_size, coordinates=new_coord, raise_err=False):
+                neigh.append(new_coord)
     if shuffle:
-        random.shuffle(neigh)
+        (random if rng is None else rng).shuffle(neigh)
     return neigh
+
+
+# opposite of each direction, in SQUARE_NEIGH order
+OPPOSITE_DIRECTION = [list(SQUARE_NEIGH.values()).index((-x, -y)) for x, y in SQUARE_NEIGH.values()]
+# directions set in each 8 bit neighbour mask, bit d stands for the d-th SQUARE_NEIGH direction
+MASK_DIRECTIONS = [tuple(d for d in range(len(SQUARE_NEIGH)) if mask >> d & 1)
+                   for mask in range(2 ** len(SQUARE_NEIGH))]
+
+
+class NeighbourTable(object):
+    """
+    Neighbours of every cell of a grid, so edge and wrap handling cost nothing when looking them up.
+    Cells are identified by their flat index x * grid_size + y.
+    The offsets to the neighbours of a cell only depend on which edges the cell is on, single cell lookups go through
+    one of the 16 edge classes and take no memory per cell. Arrays covering every cell are built on first use:
+    - padded: (grid_size ** 2, 8) neighbour of each cell in each direction, -1 beyond the edges of a square grid
+    - CSR layout: the neighbours of cell i are indices[indptr[i]:indptr[i + 1]], in SQUARE_NEIGH order
+    """
+
+    def __init__(self, grid_size: int, topology: str = SQUARE_TOPOLOGY):
+        if topology not in (SQUARE_TOPOLOGY, PACMAN_TOPOLOGY):
+            raise TopologyError('Unknown topology: {}'.format(topology))
+        self.grid_size = grid_size
+        self.topology = topology
+        # for each edge class, (dx, dy) offset of the neighbour in each direction or None
+        self.class_offsets = []
+        # for each edge class, flat index offset of each neighbour and the bit standing for the cell in its masks
+        self.class_links = []
+        for edge_class in range(16):
+            offsets = [self._offset(edge_class, dx, dy) for dx, dy in SQUARE_NEIGH.values()]
+            self.class_offsets.append(tuple(offsets))
+            self.class_links.append(tuple((o[0] * grid_size + o[1], 1 << OPPOSITE_DIRECTION[d])
+                                          for d, o in enumerate(offsets) if o is not None))
+        self._padded = None
+        self._indptr = None
+        self._indices = None
+        self._edge_masks = None
+
+    def _offset(self, edge_class: int, dx: int, dy: int):
+        """
+        Offset to the neighbour in direction (dx, dy) of the cells of an edge class, None if there is none
+        """
+        last = self.grid_size - 1
+        # any cell of the class gives the same offsets
+        x = 0 if edge_class & 1 else last if edge_class & 2 else 1
+        y = 0 if edge_class & 4 else last if edge_class & 8 else 1
+        nx, ny = x + dx, y + dy
+        if self.topology == PACMAN_TOPOLOGY:
+            nx %= self.grid_size
+            ny %= self.grid_size
+        elif not (0 <= nx <= last and 0 <= ny <= last):
+            return None
+        return nx - x, ny - y
+
+    def edge_class(self, x: int, y: int) -> int:
+        last = self.grid_size - 1
+        return (x == 0) | (x == last) << 1 | (y == 0) << 2 | (y == last) << 3
+
+    def neighbour_coords(self, x: int, y: int) -> List[Tuple[int, int]]:
+        """
+        Neighbour coordinate tuples of a cell, in SQUARE_NEIGH order
+        """
+        return [(x + o[0], y + o[1]) for o in self.class_offsets[self.edge_class(x, y)] if o is not None]
+
+    def _build_padded(self) -> np.ndarray:
+        xs, ys = np.divmod(np.arange(self.grid_size ** 2), self.grid_size)
+        nx = xs[:, None] + np.array([x for x, y in SQUARE_NEIGH.values()])
+        ny = ys[:, None] + np.array([y for x, y in SQUARE_NEIGH.values()])
+        if self.topology == PACMAN_TOPOLOGY:
+            nx %= self.grid_size
+            ny %= self.grid_size
+            valid = np.ones(nx.shape, dtype=bool)
+        else:
+            valid = (nx >= 0) & (nx < self.grid_size) & (ny >= 0) & (ny < self.grid_size)
+        return np.where(valid, nx * self.grid_size + ny, -1).astype(np.int32)
+
+    @property
+    def padded(self) -> np.ndarray:
+        if self._padded is None:
+            self._padded = self._build_padded()
+        return self._padded
+
+    @property
+    def indptr(self) -> np.ndarray:
+        if self._indptr is None:
+            valid = self.padded >= 0
+            self._indptr = np.zeros(self.grid_size ** 2 + 1, dtype=np.int64)
+            np.cumsum(valid.sum(axis=1), out=self._indptr[1:])
+            self._indices = self.padded[valid]
+        return self._indptr
+
+    @property
+    def indices(self) -> np.ndarray:
+        if self._indices is None:
+            self.indptr
+        return self._indices
+
+    @property
+    def edge_masks(self) -> np.ndarray:
+        """
+        Bit d is set when the cell has a neighbour in direction d
+        """
+        if self._edge_masks is None:
+            class_masks = np.array([sum(1 << d for d, o in enumerate(offsets) if o is not None)
+                                    for offsets in self.class_offsets], dtype=np.uint8)
+            xs, ys = np.divmod(np.arange(self.grid_size ** 2), self.grid_size)
+            last = self.grid_size - 1
+            classes = (xs == 0) | (xs == last) << 1 | (ys == 0) << 2 | (ys == last) << 3
+            self._edge_masks = class_masks[classes]
+        return self._edge_masks
+
+
+class StackedNeighbourTable(object):
+    """
+    Neighbours of several independent grids of the same size stored one after the other: cell i of grid k has the flat
+    index k * grid_size ** 2 + i and its neighbours all are in grid k. Only the per cell arrays are available.
+    """
+
+    def __init__(self, table: NeighbourTable, nb_grids: int):
+        """
+        :param table: neighbour table of a single grid
+        :param nb_grids: number of grids
+        """
+        self.grid_size = table.grid_size
+        self.topology = table.topology
+        self.nb_grids = nb_grids
+        self._table = table
+        self._padded = None
+
+    @property
+    def padded(self) -> np.ndarray:
+        if self._padded is None:
+            padded = self._table.padded
+            offsets = np.arange(self.nb_grids, dtype=np.int32)[:, None, None] * padded.shape[0]
+            self._padded = np.where(padded >= 0, padded + offsets, -1).reshape(-1, padded.shape[1])
+        return self._padded
+
+    @property
+    def edge_masks(self) -> np.ndarray:
+        return np.tile(self._table.edge_masks, self.nb_grids)
+
+
+@lru_cache(maxsize=32)
+def neighbour_table(grid_size: int, topology: str = SQUARE_TOPOLOGY) -> NeighbourTable:
+    """
+    Cached NeighbourTable for a grid size and topology
+    """
+    return NeighbourTable(grid_size, topology)
+
+
+class ReachTable(object):
+    """
+    Cells an animal of a given speed can reach from its cell, as a window of offsets around it, so reach searches
+    step between window indices instead of looking up neighbours.
+    Window cells are in the order a breadth first search from the centre reaches them on an empty grid, neighbours
+    taken in SQUARE_NEIGH order: index 0 is the centre and offsets[1:] are the destinations of an animal with free
+    cells all around it. Coordinates wrap around a pacman grid, a grid smaller than the window does not fit it.
+    """
+
+    def __init__(self, grid_size: int, topology: str, speed: int):
+        if topology not in (SQUARE_TOPOLOGY, PACMAN_TOPOLOGY):
+            raise TopologyError('Unknown topology: {}'.format(topology))
+        self.grid_size = grid_size
+        self.topology = topology
+        self.speed = speed
+        # a pacman grid smaller than the window would reach a cell through two window offsets
+        self.fits = topology == SQUARE_TOPOLOGY or grid_size >= 2 * speed + 1
+        # (dx, dy) offset of each window cell
+        self.offsets = [(0, 0)]
+        index = {(0, 0): 0}
+        level_start = 0
+        for _ in range(speed):
+            level_end = len(self.offsets)
+            for i in range(level_start, level_end):
+                x, y = self.offsets[i]
+                for dx, dy in SQUARE_NEIGH.values():
+                    if (x + dx, y + dy) not in index:
+                        index[(x + dx, y + dy)] = len(self.offsets)
+                        self.offsets.append((x + dx, y + dy))
+            level_start = level_end
+        # window index of the neighbour of each cell in each direction, -1 outside the window
+        self.steps = [tuple(index.get((x + dx, y + dy), -1) for dx, dy in SQUARE_NEIGH.values())
+                      for x, y in self.offsets]
+        # cells closer than speed to the centre and their free neighbour masks when only the centre is occupied,
+        # the animal has every window cell within reach when they all have these masks
+        self.inner = [(x, y, 0xff if (x, y) == (0, 0) else
+                       0xff & ~sum(1 << d for d, step in enumerate(self.steps[i]) if step == 0))
+                      for i, (x, y) in enumerate(self.offsets) if max(abs(x), abs(y)) < speed]
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+@lru_cache(maxsize=32)
+def reach_table(grid_size: int, topology: str = SQUARE_TOPOLOGY, speed: int = 1) -> ReachTable:
+    """
+    Cached ReachTable for a grid size, topology and speed
+    """
+    return ReachTable(grid_size, topology, speed)
@@ -0,0 +1,30 @@
+from collections import defaultdict
+from typing import List
+
+
+class TurnQueue(object):
+    """
+    Events bucketed by the turn they are due on: pushing an event and popping the events of a turn cost a constant
+    time per event, whatever the number of pending events.
+    Events are not removed when they become stale (e.g. a shark fed again before starving), the caller checks each
+    event when its turn comes.
+    """
+
+    def __init__(self):
+        self._buckets = defaultdict(list)
+
+    def push(self, turn: int, item):
+        """
+        :param turn: turn the event is due on
+        :param item: the event, such as an animal oid
+        """
+        self._buckets[turn].append(item)
+
+    def pop(self, turn: int) -> List:
+        """
+        Remove and return the events due on a turn, in push order
+        """
+        return self._buckets.pop(turn, [])
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets.values())
@@ -0,0 +1,176 @@
+from typing import Dict, Tuple
+
+import logging
+import numpy as np
+
+from fish_bowl.process.simple_simulation_engine import SimpleSimulationEngine
+from fish_bowl.process.move_resolution import propose_accept
+from fish_bowl.process.utils import Animal
+
+_logger = logging.getLogger(__name__)
+
+
+class VectorizedSimulationEngine(SimpleSimulationEngine):
+    """
+    Simulation engine running each phase of a turn as batched numpy operations over all the animals concerned,
+    on top of an ArrayFishTank.
+    Animals act simultaneously within a phase, conflicts are resolved with propose_accept: when several of them target
+    the same cell a random priority decides which one gets it and the others retry with the cells left.
+    Random numbers are drawn in batches for all the animals of a phase.
+    Moving animals take one step per round up to their speed, instead of picking any cell within reach.
+    """
+
+    def __init__(self, simulation_parameters: Dict, use_pacman=False, seed=None, sim_id: int = None,
+                 persist=True):
+        """
+        :param simulation_parameters:
+        :param use_pacman: use a Pacman style topology
+        :param seed: seed of the random generator, the 'seed' simulation parameter if not set
+        :param sim_id: simulation id, allocated by the process simulation id allocator if not set
+        :param persist: save the simulation to the database when it ends
+        """
+        super().__init__(simulation_parameters, use_pacman=use_pacman, use_array=True, sim_id=sim_id, seed=seed,
+                         persist=persist)
+
+    def _new_oids(self, number) -> np.ndarray:
+        return self._oids.next_ids(number)
+
+    def _spawn(self):
+        """
+        Spawn the initial fishes and sharks in random cells, without building the list of all coordinates
+        """
+        cells = self._rng.choice(self._grid_size ** 2, size=self._init_nb_fish + self._init_nb_shark, replace=False)
+        fish_cells, shark_cells = cells[:self._init_nb_fish], cells[self._init_nb_fish:]
+        self._fish_tank.spawn_animals(fish_cells, Animal.Fish, self._sid, 0, self._new_oids(len(fish_cells)))
+        self._fish_tank.spawn_animals(shark_cells, Animal.Shark, self._sid, 1, self._new_oids(len(shark_cells)))
+
+    def play_turn(self):
+        """
+        Create a new turn,
+        sharks starve -> sharks eat -> sharks breed -> fish breed -> fish move -> sharks move
+        """
+        if self.sim_ended:
+            _logger.warning("Simulation id ({}) has ended".format(self._sid))
+            return
+
+        self._sim_turn += 1
+        _logger.debug('********************TURN: {:<3}********************'.format(self._sim_turn))
+        self._moved[:] = False
+        self._remove_dead_sharks(self._sim_turn)
+        fed_from, fed_to = self._feed_sharks()
+        self._breed_sharks(fed_from, fed_to)
+        self._breed_fish()
+        self._move_animals(Animal.Fish)
+        self._move_animals(Animal.Shark)
+
+        _logger.debug('********************END TURN: {:<3}*******************'.format(self._sim_turn))
+        self.sim_ended = self._check_simulation_ends()
+        if self.sim_ended and self._persist:
+            self.persist_to_db()
+
+    def _feed_sharks(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Every shark with adjacent fish eats one of them at random, a fish is only eaten once
+        :return: cells the fed sharks came from and cells they moved to
+        """
+        tank = self._fish_tank
+        sharks = tank.get_cells(Animal.Shark)
+        # sharks without adjacent fish are dropped at once
+        masks = tank.get_fish_neighbours(sharks)
+        sharks = sharks[masks != 0]
+        neighbours, valid = tank.neighbour_cells(sharks)
+        has_fish = np.unpackbits(masks[masks != 0, None], axis=1, bitorder='little').view(bool)
+        eating, fish_cells = propose_accept(neighbours, has_fish, self._rng, len(self._moved))
+        fed_from = sharks[eating]
+        tank.eat_fishes(self._sim_turn, fed_from, fish_cells)
+        self._moved[fish_cells] = True
+        self._fish_eaten_total += len(fish_cells)
+        return fed_from, fish_cells
+
+    def _breeding_mask(self, cells: np.ndarray, maturity, probability) -> np.ndarray:
+        """
+        Animals old enough to breed that pass their breeding roll this turn
+        """
+        mature = (self._sim_turn - self._fish_tank.get_spawn_turns(cells)) >= maturity
+        return mature & (self._rng.integers(0, 101, size=len(cells)) <= probability)
+
+    def _propose_moves(self, cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Each animal takes a random free neighbour, conflicts are resolved with propose_accept
+        :param cells: flat indices of the animals willing to move
+        :return: cells of the animals that can move and the cells they move to
+        """
+        tank = self._fish_tank
+        # animals without free neighbours stay put
+        masks = tank.get_free_neighbours(cells)
+        cells = cells[masks != 0]
+        neighbours, valid = tank.neighbour_cells(cells)
+        free = np.unpackbits(masks[masks != 0, None], axis=1, bitorder='little').view(bool)
+        moving, targets = propose_accept(neighbours, free, self._rng, len(self._moved))
+        return cells[moving], targets
+
+    def _breed_sharks(self, fed_from: np.ndarray, fed_to: np.ndarray):
+        """
+        Breeding sharks that have eaten spawn into the cell they ate from, the others move to a free neighbour
+        and spawn into the cell they left
+        :param fed_from: cells the fed sharks came from
+        :param fed_to: cells the fed sharks are in
+        """
+        tank = self._fish_tank
+        sharks = tank.get_cells(Animal.Shark)
+        breeding = sharks[self._breeding_mask(sharks, self._shark_breed_maturity, self._shark_breed_probability)]
+        # only the sharks that have eaten have moved so far, their previous cell is free
+        fed = self._moved[breeding]
+        is_breeding = np.zeros(len(self._moved), dtype=bool)
+        is_breeding[breeding] = True
+        fed_breeding = is_breeding[fed_to]
+        self._spawn_babies(fed_from[fed_breeding], fed_to[fed_breeding], Animal.Shark)
+        parents, targets = self._propose_moves(breeding[~fed])
+        tank.move_animals(parents, targets)
+        self._spawn_babies(parents, targets, Animal.Shark)
+
+    def _breed_fish(self):
+        """
+        Breeding fish move to a free neighbour and spawn into the cell they left
+        """
+        fishes = self._fish_tank.get_cells(Animal.Fish)
+        breeding = fishes[self._breeding_mask(fishes, self._fish_breed_maturity, self._fish_breed_probability)]
+        parents, targets = self._propose_moves(breeding)
+        self._fish_tank.move_animals(parents, targets)
+        self._spawn_babies(parents, targets, Animal.Fish)
+
+    def _spawn_babies(self, baby_cells: np.ndarray, parent_cells: np.ndarray, animal_type: Animal):
+        """
+        Spawn babies next to their parents, which have moved and will not move again this turn
+        """
+        self._fish_tank.spawn_animals(baby_cells, animal_type, self._sid, self._sim_turn,
+                                      self._new_oids(len(baby_cells)))
+        self._fish_tank.record_breeds(parent_cells, self._sim_turn)
+        self._moved[parent_cells] = True
+        if animal_type == Animal.Shark:
+            self._shark_breed_total += len(baby_cells)
+        else:
+            self._fish_breed_total += len(baby_cells)
+
+    def _move_speeds(self, cells: np.ndarray, animal_type: Animal) -> np.ndarray:
+        """
+        Number of steps each animal of cells can take when moving
+        """
+        return np.full(len(cells), self._fish_speed if animal_type == Animal.Fish else self._shark_speed)
+
+    def _move_animals(self, animal_type: Animal):
+        """
+        Animals of animal_type that have not moved yet this turn move up to their speed, one step to a free neighbour
+        per round: the animals that stepped in a round and have steps left take another one in the next round
+        """
+        tank = self._fish_tank
+        cells = tank.get_cells(animal_type)
+        movers = cells[~self._moved[cells]]
+        step = 0
+        while len(movers):
+            steppers, targets = self._propose_moves(movers)
+            tank.move_animals(steppers, targets)
+            self._moved[steppers] = False
+            self._moved[targets] = True
+            step += 1
+            movers = targets[self._move_speeds(targets, animal_type) > step]
@@ -0,0 +1,82 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from fish_bowl.dataio.persistence import Animals, SimulationClient
+from fish_bowl.process.topology import SquareGridCoordinate
+from fish_bowl.process.utils import Animal
+
+_logger = logging.getLogger(__name__)
+
+GRID_SIZE = 100
+sim_config = {
+    'grid_size': GRID_SIZE,
+    'init_nb_fish': 0,
+    'fish_breed_maturity': 3,
+    'fish_breed_probability': 80,
+    'fish_speed': 2,
+    'init_nb_shark': 0,
+    'shark_breed_maturity': 5,
+    'shark_breed_probability': 100,
+    'shark_speed': 4,
+    'shark_starving': 4}
+
+
+def fill_table(client: SimulationClient, nb_rows: int, nb_live: int, rng) -> int:
+    """
+    Create a simulation with nb_live animals on distinct cells and dead animals for the other rows, like a long
+    simulation leaves behind
+    :return: sim_id
+    """
+    sid = client.init_simulation(**sim_config)
+    live_cells = rng.choice(GRID_SIZE ** 2, size=nb_live, replace=False)
+    cells = np.concatenate((live_cells, rng.integers(GRID_SIZE ** 2, size=nb_rows - nb_live)))
+    rows = [dict(sim_id=sid, animal_type=Animal.Shark if i % 10 == 0 else Animal.Fish, spawn_turn=0, breed_count=0,
+                 last_breed=0, last_fed=0, alive=i < nb_live, coord_x=int(cell // GRID_SIZE),
+                 coord_y=int(cell % GRID_SIZE)) for i, cell in enumerate(cells)]
+    with client.session_scope() as s:
+        s.bulk_insert_mappings(Animals, rows)
+    return sid
+
+
+def latency(query, nb_calls: int) -> float:
+    """
+    Mean latency of query in ms
+    """
+    start = time.perf_counter()
+    for i in range(nb_calls):
+        query(i)
+    return (time.perf_counter() - start) / nb_calls * 1000
+
+
+def measure(client: SimulationClient, sid: int, rng, nb_calls: int):
+    coordinates = [SquareGridCoordinate(int(x), int(y)) for x, y in rng.integers(GRID_SIZE, size=(nb_calls, 2))]
+    occupied = latency(lambda i: client.coordinate_is_occupied(sim_id=sid, coordinate=coordinates[i]), nb_calls)
+    sharks = latency(lambda i: client.get_animals_by_type(sim_id=sid, animal_type=Animal.Shark), nb_calls)
+    return occupied, sharks
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+    cmd_parser = argparse.ArgumentParser(description='Latency of the ANIMALS hot queries against table size, with and '
+                                                     'without the live animal indexes')
+    cmd_parser.add_argument('--sizes', default='1000,10000,100000,1000000', help='Comma separated table sizes')
+    cmd_parser.add_argument('--nb_live', default=2000, type=int, help='Number of live animals')
+    cmd_parser.add_argument('--nb_calls', default=200, type=int, help='Number of calls measured per query')
+    args = cmd_parser.parse_args()
+    _logger.info('{:>9} {:>22} {:>22}'.format('rows', 'occupied ms (no index)', 'by type ms (no index)'))
+    for size in [int(size) for size in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as directory:
+            client = SimulationClient('sqlite:///{}'.format(os.path.join(directory, 'benchmark.db')))
+            sid = fill_table(client, size, min(args.nb_live, size), np.random.default_rng(0))
+            indexed = measure(client, sid, np.random.default_rng(1), args.nb_calls)
+            for index in Animals.__table__.indexes:
+                index.drop(bind=client._engine)
+            scanned = measure(client, sid, np.random.default_rng(1), args.nb_calls)
+            client._engine.dispose()
+        _logger.info('{:>9} {:>8.3f} ({:>8.3f})    {:>8.3f} ({:>8.3f})'.format(size, indexed[0], scanned[0], indexed[1],
+                                                                          scanned[1]))
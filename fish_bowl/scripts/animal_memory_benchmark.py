@@ -0,0 +1,53 @@
+import argparse
+import logging
+import tracemalloc
+
+from fish_bowl.data_struct.animals import Fish, Shark
+from fish_bowl.process.utils import Animal
+
+_logger = logging.getLogger(__name__)
+
+
+class DictShark(object):
+    """
+    Layout of the animals before __slots__: attributes in a __dict__, with sim_id, alive and last_fed on every animal
+    """
+
+    def __init__(self, oid, sim_id, spawn_turn):
+        self.oid = oid
+        self.sim_id = sim_id
+        self.spawn_turn = spawn_turn
+        self.animal_type = Animal.Shark
+        self.breed_count = 0
+        self.last_breed = 0
+        self.alive = True
+        self.last_fed = spawn_turn
+
+
+def measure(build, nb_animals):
+    """
+    Bytes per animal allocated by build(nb_animals), the result is kept alive while measuring
+    """
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    animals = build(nb_animals)
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del animals
+    return used / nb_animals
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+    cmd_parser = argparse.ArgumentParser()
+    cmd_parser.add_argument('--nb_animals', default=1000000, type=int, help='Number of animals to create')
+    args = cmd_parser.parse_args()
+    n = args.nb_animals
+    # oids above the small int cache like in a real simulation, one list slot per object is included
+    results = [
+        ('dict objects (before)', measure(lambda k: [DictShark(10000 + i, 1, 1) for i in range(k)], n)),
+        ('__slots__ Fish', measure(lambda k: [Fish(1, 1) for _ in range(k)], n)),
+        ('__slots__ Shark', measure(lambda k: [Shark(1, 1) for _ in range(k)], n)),
+    ]
+    for name, bytes_per_animal in results:
+        _logger.info('{:<24} {:8.1f} bytes per animal'.format(name, bytes_per_animal))
@@ -0,0 +1,25 @@
+import argparse
+import logging
+
+from sqlalchemy import text
+
+from fish_bowl.dataio.persistence import SimulationClient, get_database_string
+from fish_bowl.dataio.threaded_persistence import PersistenceClient
+
+_logger = logging.getLogger(__name__)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d:%(message)s")
+    cmd_parser = argparse.ArgumentParser(description='Add the tables and indexes declared since a simulation database '
+                                                     'was created')
+    cmd_parser.add_argument('--database', default=get_database_string(), help='Database url, simuldb.db by default')
+    args = cmd_parser.parse_args()
+    # the clients create what is missing when they connect
+    for client_class in (SimulationClient, PersistenceClient):
+        client = client_class(args.database)
+        with client.session_scope() as s:
+            if s.bind.dialect.name == 'sqlite':
+                indexes = s.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                         "AND tbl_name = 'ANIMALS'"))
+                _logger.info('ANIMALS indexes: {}'.format(', '.join(name for name, in indexes)))
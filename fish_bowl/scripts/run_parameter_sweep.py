@@ -0,0 +1,48 @@
+import logging
+import argparse
+import json
+import time
+
+from fish_bowl.common.config_reader import read_simulation_config
+from fish_bowl.process.sweep import ENGINES, run_sweep, sweep_configs
+
+_logger = logging.getLogger(__name__)
+
+
+def parse_grid(values) -> dict:
+    """
+    Parse name=v1,v2,... swept parameters
+    """
+    grid = {}
+    for value in values:
+        name, choices = value.split('=')
+        grid[name] = [json.loads(choice) for choice in choices.split(',')]
+    return grid
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+
+    cmd_parser = argparse.ArgumentParser()
+    cmd_parser.add_argument('--config_name', default='simulation_config_1',
+                            help='Simulation configuration file name, the base of the swept configurations')
+    cmd_parser.add_argument('--vary', nargs='*', default=[],
+                            help='Swept parameters, e.g. --vary shark_starving=2,4,6 fish_breed_probability=50,80')
+    cmd_parser.add_argument('--replicates', default=10, type=int, help='Number of seeds run for each configuration')
+    cmd_parser.add_argument('--workers', default=None, type=int, help='Number of worker processes, one per CPU if not set')
+    cmd_parser.add_argument('--engine', default='simple', choices=sorted(ENGINES), help='Simulation engine')
+    cmd_parser.add_argument('--seed', default=0, type=int, help='Base seed of the replicates')
+    args = cmd_parser.parse_args()
+
+    configs = sweep_configs(read_simulation_config(args.config_name), parse_grid(args.vary))
+    start_time = time.time()
+    summaries = run_sweep(configs, args.replicates, max_workers=args.workers, engine=args.engine,
+                          base_seed=args.seed)
+    _logger.info('{} runs in {:.1f} s'.format(len(configs) * args.replicates, time.time() - start_time))
+    for summary in summaries:
+        swept = {name: summary['config'][name] for name in parse_grid(args.vary)}
+        _logger.info('{} - extinctions: {}/{}, mean extinction turn: {}, final fishes: {:.1f}, final sharks: {:.1f}, '
+                     'fish eaten: {:.1f}, sharks starved: {:.1f}'
+                     .format(swept, summary['extinctions'], summary['runs'], summary['extinction_turn_mean'],
+                             summary['fishes_mean'][-1], summary['sharks_mean'][-1],
+                             summary['fish_eaten_total_mean'], summary['shark_starved_total_mean']))
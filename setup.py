@@ -9,5 +9,6 @@ setup(
     license='',
     author='Pierre Carotti',
     author_email='pierre.carotti@gmail.com',
-    description='Predator-Prey simulation', install_requires=['pytest', 'sqlalchemy', 'pandas']
+    description='Predator-Prey simulation', install_requires=['pytest', 'sqlalchemy', 'pandas', 'numpy'],
+    extras_require={'jit': ['numba']}
 )
@@ -0,0 +1,176 @@
+import pytest
+import logging
+
+import numpy as np
+
+from fish_bowl.data_struct.fish_tank import FishTank
+from fish_bowl.data_struct.array_fish_tank import ArrayFishTank, PacmanArrayFishTank
+from fish_bowl.data_struct.animals import Shark, Fish
+from fish_bowl.process.utils import Animal, ImpossibleAction
+from fish_bowl.process.topology import NonEmptyCoordinate
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d:%(message)s")
+_logger = logging.getLogger(__name__)
+
+
+class TestArrayFishTank:
+
+    def test_insert_and_move_fish(self):
+        fish_tank = ArrayFishTank(10)
+        fish1 = Fish(0, 1)
+        fish_tank.put_animal((0, 1), fish1)
+        fish2 = Fish(0, 1)
+        fish_tank.put_animal((1, 1), fish2)
+
+        fish_tank.move_animal((1, 1), fish2, (2, 2))
+
+        assert fish_tank.check_animal((1, 1)) is None
+        assert fish_tank.check_animal((2, 2)).oid == fish2.oid
+        assert fish_tank.get_grid()[(2, 2)].oid == fish2.oid
+        # moving from the wrong cell is refused
+        with pytest.raises(Exception):
+            fish_tank.move_animal((0, 1), fish2, (3, 3))
+
+    def test_nearby_space(self):
+        grid_size = 10
+        fish_tank = ArrayFishTank(grid_size)
+        assert len(fish_tank.find_available_nearby_space((0, 0))) == 3
+        assert len(fish_tank.find_available_nearby_space((1, 0))) == 5
+        assert len(fish_tank.find_available_nearby_space((grid_size - 1, 0))) == 3
+        assert sorted(n for n in fish_tank.padded_neighbours[0].tolist() if n >= 0) == [1, grid_size, grid_size + 1]
+        fish_tank.put_animal((1, 0), Fish(0, 1))
+        assert len(fish_tank.find_available_nearby_space((0, 0))) == 2
+
+    def test_eat_and_starve(self):
+        fish_tank = ArrayFishTank(10)
+        fish1 = Fish(0, 1)
+        fish_tank.put_animal((1, 0), fish1)
+        shark1 = Shark(0, 1)
+        fish_tank.put_animal((1, 1), shark1)
+        shark2 = Shark(0, 1)
+        fish_tank.put_animal((4, 1), shark2)
+
+        assert fish_tank.get_current_number_sharks() == 2
+        assert len(fish_tank.get_current_sharks()) == 2
+        assert fish_tank.find_fish_to_eat((4, 1)) is None
+        fish_coord, fish = fish_tank.find_fish_to_eat((1, 1))
+        assert fish_coord == (1, 0)
+        assert fish.oid == fish1.oid
+
+        fish_tank.eat_fish(2, (1, 1), fish_coord)
+        shark = fish_tank.check_animal((1, 0))
+        assert shark.oid == shark1.oid
+        assert shark.animal_type == Animal.Shark
+        assert shark.last_fed == 2
+        assert fish_tank.check_animal((1, 1)) is None
+
+        # shark2 last fed at turn 1, shark1 at turn 2
+        assert fish_tank.remove_starved_sharks(current_turn=6, shark_starving=4) == 1
+        assert fish_tank.get_current_number_sharks() == 1
+        assert fish_tank.get_current_number_fishes() == 0
+        assert fish_tank.check_animal((4, 1)) is None
+
+    def test_record_breed(self):
+        fish_tank = ArrayFishTank(10)
+        fish_tank.put_animal((3, 3), Shark(0, 1))
+        fish_tank.record_breed((3, 3), 5)
+        shark = fish_tank.check_animal((3, 3))
+        assert shark.breed_count == 1
+        assert shark.last_breed == 5
+
+    def test_get_dataframe(self):
+        fish_tank = ArrayFishTank(10)
+        fish = Fish(0, 1)
+        fish_tank.put_animal((0, 1), fish)
+        pandas_df = fish_tank.create_pandas_dataframe()
+        assert pandas_df.shape == (10, 10)
+        assert pandas_df[1][0] == str(fish.oid)
+        assert pandas_df[0][0] == "0000"
+
+    def test_pacman_fishtank(self):
+        fish_tank = PacmanArrayFishTank(10)
+        fish_tank.put_animal((0, 0), Fish(0, 1))
+        fish_tank.put_animal((0, 9), Shark(0, 1))
+
+        fish_tuple = fish_tank.find_fish_to_eat((0, 9))
+        assert fish_tuple is not None
+        coord, fish_to_eat = fish_tuple
+        assert coord == (0, 0)
+        # no edges in a pacman grid
+        assert len(fish_tank.find_available_nearby_space((9, 5))) == 8
+
+    def test_batch_one_animal_per_cell(self):
+        fish_tank = ArrayFishTank(10)
+        fish_tank.spawn_animals(np.array([0, 1, 2]), Animal.Fish, 1, 0, np.array([1, 2, 3]))
+        # cannot spawn on an occupied cell
+        with pytest.raises(NonEmptyCoordinate):
+            fish_tank.spawn_animals(np.array([2, 3]), Animal.Fish, 1, 0, np.array([4, 5]))
+        # cannot move two animals to the same cell
+        with pytest.raises(NonEmptyCoordinate):
+            fish_tank.move_animals(np.array([0, 1]), np.array([5, 5]))
+        # cannot move an animal that does not exist
+        with pytest.raises(ImpossibleAction):
+            fish_tank.move_animals(np.array([9]), np.array([5]))
+        fish_tank.move_animals(np.array([0, 1]), np.array([5, 6]))
+        assert fish_tank.get_cells().tolist() == [2, 5, 6]
+        # sharks only eat fish
+        fish_tank.spawn_animals(np.array([20, 30]), Animal.Shark, 1, 0, np.array([6, 7]))
+        with pytest.raises(ImpossibleAction):
+            fish_tank.eat_fishes(1, np.array([20]), np.array([30]))
+        fish_tank.eat_fishes(1, np.array([20]), np.array([2]))
+        assert fish_tank.get_cells(Animal.Shark).tolist() == [2, 30]
+        assert fish_tank.get_current_number_fishes() == 2
+        assert fish_tank.get_current_number_sharks() == 2
+
+    def test_dirty_region_after_starvation(self):
+        # full grid with one starving shark, its neighbours are boxed in until it starves
+        tanks = [FishTank(5), ArrayFishTank(5)]
+        for fish_tank in tanks:
+            for x in range(5):
+                for y in range(5):
+                    fish_tank.put_animal((x, y), Shark(0, 0) if (x, y) == (2, 2) else Fish(0, 0))
+            fish_tank.track_dirty_cells()
+            assert fish_tank.remove_starved_sharks(current_turn=5, shark_starving=2) == 1
+        expected = {(x, y) for x in range(1, 4) for y in range(1, 4)}
+        assert [fish_tank.take_dirty_region() for fish_tank in tanks] == [expected, expected]
+
+    def test_dirty_region_batch(self):
+        fish_tank = ArrayFishTank(10)
+        fish_tank.track_dirty_cells()
+        fish_tank.spawn_animals(np.array([0, 55]), Animal.Fish, 1, 0, np.array([1, 2]))
+        assert fish_tank.take_dirty_region() == {(0, 0), (0, 1), (1, 0), (1, 1)} | {
+            (x, y) for x in range(4, 7) for y in range(4, 7)}
+        fish_tank.spawn_animals(np.array([1]), Animal.Shark, 1, 0, np.array([3]))
+        fish_tank.take_dirty_region()
+        # the eaten fish cell stays occupied, only the cell the shark leaves is dirty
+        fish_tank.eat_fishes(1, np.array([1]), np.array([0]))
+        assert fish_tank.take_dirty_region() == {(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)}
+        fish_tank.move_animals(np.array([55]), np.array([99]))
+        assert fish_tank.take_dirty_region() == {(x, y) for x in range(4, 7) for y in range(4, 7)} | {
+            (8, 8), (8, 9), (9, 8), (9, 9)}
+        fish_tank.remove_animals(np.array([99]))
+        assert fish_tank.take_dirty_region() == {(8, 8), (8, 9), (9, 8), (9, 9)}
+
+    def test_neighbour_masks(self):
+        for tank_class in (ArrayFishTank, PacmanArrayFishTank):
+            fish_tank = tank_class(10)
+            rng = np.random.default_rng(3)
+            cells = rng.choice(100, size=60, replace=False)
+            fish_tank.spawn_animals(cells[:40], Animal.Fish, 1, 0, np.arange(40))
+            fish_tank.spawn_animals(cells[40:50], Animal.Shark, 1, 0, np.arange(40, 50))
+            fish_tank.move_animals(cells[:5], cells[50:55])
+            fish_tank.eat_fishes(1, cells[40:45], cells[5:10])
+            fish_tank.put_animal((0, 0) if fish_tank.check_animal((0, 0)) is None else (9, 9), Fish(0, 1))
+            fish_coord, fish = fish_tank.find_fish_to_eat(divmod(int(cells[45]), 10)) or (None, None)
+            if fish_coord is not None:
+                assert fish.animal_type == Animal.Fish
+                fish_tank.eat_fish(2, divmod(int(cells[45]), 10), fish_coord)
+            fish_tank.remove_starved_sharks(current_turn=5, shark_starving=2)
+            # masks agree with the type array
+            neighbours, valid = fish_tank.neighbour_cells(np.arange(100))
+            free = valid & (fish_tank.get_cell_types(neighbours) == 0)
+            masks = fish_tank.get_free_neighbours(np.arange(100))
+            assert (np.unpackbits(masks[:, None], axis=1, bitorder='little').view(bool) == free).all()
+            fish = valid & (fish_tank.get_cell_types(neighbours) == Animal.Fish.value)
+            masks = fish_tank.get_fish_neighbours(np.arange(100))
+            assert (np.unpackbits(masks[:, None], axis=1, bitorder='little').view(bool) == fish).all()
@@ -1,7 +1,10 @@
-from fish_bowl.dataio.persistence import SimulationClient
+import pandas as pd
+import pytest
+
+from fish_bowl.dataio.persistence import SimulationClient, WriteBehindSimulationClient
 from fish_bowl.process.base import SimulationGrid
-from fish_bowl.process.topology import SquareGridCoordinate
-from fish_bowl.process.utils import Animal
+from fish_bowl.process.topology import SquareGridCoordinate, NonEmptyCoordinate
+from fish_bowl.process.utils import Animal, EndOfSimulatioError, ImpossibleAction
 
 sim_config = {
     'grid_size': 10,
@@ -106,5 +109,54 @@ class TestBase:
         assert len(grid_df[grid_df['animal_type'] == Animal.Shark]) == 2, 'Should be 2 Sharks'
         assert len(grid_df[grid_df['animal_type'] == Animal.Fish]) == 8, 'Should be 8 fishes'
 
+    def test_write_behind(self, tmp_path):
+        database_url = 'sqlite:///{}'.format(tmp_path / 'write_behind.db')
+        grid = SimulationGrid(persistence=SimulationClient('sqlite:///:memory:'), simulation_parameters=sim_config,
+                              seed=5)
+        client = WriteBehindSimulationClient(database_url)
+        buffered_grid = SimulationGrid(persistence=client, simulation_parameters=sim_config, seed=5)
+        columns = ['oid', 'animal_type', 'spawn_turn', 'breed_count', 'last_breed', 'last_fed', 'coord_x', 'coord_y']
+        for _ in range(4):
+            try:
+                grid.play_turn()
+            except EndOfSimulatioError:
+                pass
+            try:
+                buffered_grid.play_turn()
+            except EndOfSimulatioError:
+                pass
+            # same draws, same turns, served from memory
+            expected = grid.get_simulation_grid_data()[columns].sort_values('oid').reset_index(drop=True)
+            animals = buffered_grid.get_simulation_grid_data()[columns].sort_values('oid').reset_index(drop=True)
+            pd.testing.assert_frame_equal(animals, expected, check_dtype=False)
+            # and flushed to the database at the end of each turn
+            stored = SimulationClient(database_url).get_animals_df(buffered_grid._sid)[columns]
+            pd.testing.assert_frame_equal(stored.sort_values('oid').reset_index(drop=True), expected, check_dtype=False)
+        # dead animals are still in the table
+        assert len(SimulationClient(database_url).get_animal_in_position(
+            buffered_grid._sid, SquareGridCoordinate(0, 0), live_only=False)) == \
+            len(client.get_animal_in_position(buffered_grid._sid, SquareGridCoordinate(0, 0), live_only=False))
 
-
+    def test_write_behind_client(self):
+        client = WriteBehindSimulationClient('sqlite:///:memory:')
+        sid = client.init_simulation(**sim_config_empty)
+        fish = client.init_animal(sim_id=sid, current_turn=0, animal_type=Animal.Fish,
+                                  coordinate=SquareGridCoordinate(x=1, y=1))
+        shark = client.init_animal(sim_id=sid, current_turn=0, animal_type=Animal.Shark,
+                                   coordinate=SquareGridCoordinate(x=2, y=2))
+        with pytest.raises(NonEmptyCoordinate):
+            client.move_animal(sim_id=sid, animal_id=shark, new_position=SquareGridCoordinate(x=1, y=1))
+        assert client.has_fish_in_square(sid, [SquareGridCoordinate(1, 1), SquareGridCoordinate(1, 2)]) == \
+            [SquareGridCoordinate(1, 1)]
+        assert client.eat_animal_in_square(sim_id=sid, coordinate=SquareGridCoordinate(x=1, y=1))
+        client.move_animal(sim_id=sid, animal_id=shark, new_position=SquareGridCoordinate(x=1, y=1))
+        client.update_animals(sim_id=sid, update_dict={shark: {'last_fed': 3}})
+        with pytest.raises(ImpossibleAction):
+            client.move_animal(sim_id=sid, animal_id=fish, new_position=SquareGridCoordinate(x=3, y=3))
+        # nothing written until the flush
+        assert len(SimulationClient.get_animals_df(client, sid)) == 0
+        client.flush()
+        stored = SimulationClient.get_animals_df(client, sid)
+        assert stored.oid.tolist() == [shark]
+        assert stored.iloc[0].last_fed == 3 and (stored.iloc[0].coord_x, stored.iloc[0].coord_y) == (1, 1)
+        assert not client.get_animal(sid, fish).alive
@@ -0,0 +1,50 @@
+import logging
+
+import numpy as np
+import pytest
+
+from fish_bowl.process.batched_random import BatchedRandom
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+_logger = logging.getLogger(__name__)
+
+
+class TestBatchedRandom:
+
+    def test_stream_does_not_depend_on_batches(self):
+        small = BatchedRandom(seed=3, batch_size=7)
+        large = BatchedRandom(seed=3)
+        large.prefetch(1000)
+        draws_small = [small.random() for _ in range(50)] + small.uniforms(20).tolist() + small.draws(30)
+        draws_large = [large.random() for _ in range(50)] + large.uniforms(20).tolist() + large.draws(30)
+        assert draws_small == draws_large
+        assert draws_small[:10] == np.random.default_rng(3).random(10).tolist()
+
+    def test_draws(self):
+        rng = BatchedRandom(seed=1)
+        rolls = [rng.randint(0, 100) for _ in range(5000)]
+        assert min(rolls) == 0
+        assert max(rolls) == 100
+        values = list(range(10))
+        assert all(rng.choice(values) in values for _ in range(100))
+        rng.shuffle(values)
+        assert sorted(values) == list(range(10))
+        assert sorted(rng.permutation(20).tolist()) == list(range(20))
+
+    def test_sample(self):
+        for population, count in ((10 ** 8, 1000), (100, 80), (5, 5), (5, 0)):
+            values = BatchedRandom(seed=1).sample(population, count)
+            assert len(set(values)) == len(values) == count
+            assert all(0 <= value < population for value in values)
+        assert BatchedRandom(seed=2).sample(10 ** 6, 50) == BatchedRandom(seed=2).sample(10 ** 6, 50)
+        with pytest.raises(ValueError):
+            BatchedRandom().sample(3, 4)
+
+    def test_spawn(self):
+        children = BatchedRandom(seed=4).spawn(3)
+        streams = [child.draws(10) for child in children]
+        # independent streams, reproducible from the parent seed
+        assert len({tuple(stream) for stream in streams}) == 3
+        assert [child.draws(10) for child in BatchedRandom(seed=4).spawn(3)] == streams
+        seeds = BatchedRandom(seed=4).spawn_seeds(3)
+        assert [BatchedRandom(seed).draws(10) for seed in seeds] == streams
@@ -0,0 +1,55 @@
+import numpy as np
+
+from fish_bowl.data_struct.bitboard import BitBoard
+from fish_bowl.process.topology import SQUARE_NEIGH
+
+
+def from_array(cells: np.ndarray, wrap=False) -> BitBoard:
+    board = BitBoard(cells.shape[0], wrap)
+    for x, y in zip(*np.nonzero(cells)):
+        board.set(int(x), int(y))
+    return board
+
+
+def to_array(board: BitBoard) -> np.ndarray:
+    cells = np.zeros((board.grid_size, board.grid_size), dtype=bool)
+    for x, y in board.coords():
+        cells[x, y] = True
+    return cells
+
+
+def shifted(cells: np.ndarray, dx, dy, wrap) -> np.ndarray:
+    if wrap:
+        return np.roll(cells, (-dx, -dy), axis=(0, 1))
+    padded = np.pad(cells, 1)
+    n = cells.shape[0]
+    return padded[1 + dx:1 + dx + n, 1 + dy:1 + dy + n]
+
+
+class TestBitBoard:
+
+    def test_set_clear_test(self):
+        board = BitBoard(70)
+        board.set(3, 65)
+        board.set(69, 0)
+        assert board.test(3, 65)
+        assert not board.test(3, 64)
+        assert board.count() == 2
+        board.clear(3, 65)
+        assert board.coords() == [(69, 0)]
+        # padding bits stay clear
+        assert (~BitBoard(70)).count() == 70 * 70
+
+    def test_shifts(self):
+        rng = np.random.default_rng(1)
+        for grid_size in (10, 64, 70):
+            cells = rng.random((grid_size, grid_size)) < 0.3
+            for wrap in (False, True):
+                board = from_array(cells, wrap)
+                for dx, dy in SQUARE_NEIGH.values():
+                    assert (to_array(board.shift(dx, dy)) == shifted(cells, dx, dy, wrap)).all()
+                expected = np.zeros_like(cells)
+                for dx, dy in SQUARE_NEIGH.values():
+                    expected |= shifted(cells, dx, dy, wrap)
+                assert (to_array(board.any_neighbour()) == expected).all()
+                assert (to_array(~board) == ~cells).all()
@@ -0,0 +1,64 @@
+import logging
+
+from fish_bowl.data_struct.bitboard_fish_tank import BitboardFishTank, PacmanBitboardFishTank
+from fish_bowl.data_struct.animals import Shark, Fish
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d:%(message)s")
+_logger = logging.getLogger(__name__)
+
+
+class TestBitboardFishTank:
+
+    def test_nearby_space(self):
+        grid_size = 10
+        fish_tank = BitboardFishTank(grid_size)
+        assert len(fish_tank.find_available_nearby_space((0, 0))) == 3
+        assert len(fish_tank.find_available_nearby_space((1, 0))) == 5
+        fish_tank.put_animal((1, 0), Fish(0, 1))
+        assert len(fish_tank.find_available_nearby_space((0, 0))) == 2
+        fish_tank.put_animal((0, 1), Fish(0, 1))
+        fish_tank.put_animal((1, 1), Fish(0, 1))
+        assert not fish_tank.has_available_nearby_space((0, 0))
+        assert fish_tank.pick_available_nearby_space((0, 0)) is None
+
+    def test_eat_and_hunting_sharks(self):
+        fish_tank = BitboardFishTank(10)
+        fish1 = Fish(0, 1)
+        fish_tank.put_animal((1, 0), fish1)
+        shark1 = Shark(0, 1)
+        fish_tank.put_animal((1, 1), shark1)
+        shark2 = Shark(0, 1)
+        fish_tank.put_animal((4, 1), shark2)
+
+        assert fish_tank.get_shark_board().coords() == [(1, 1), (4, 1)]
+        assert fish_tank.get_hunting_sharks().coords() == [(1, 1)]
+        assert fish_tank.find_fish_to_eat((4, 1)) is None
+        fish_coord, fish = fish_tank.find_fish_to_eat((1, 1))
+        assert fish is fish1
+
+        fish_tank.eat_fish(2, (1, 1), fish_coord)
+        assert fish_tank.check_animal((1, 0)) is shark1
+        assert fish_tank.get_shark_board().coords() == [(1, 0), (4, 1)]
+        assert fish_tank.get_hunting_sharks().count() == 0
+
+        fish_tank.move_animal((4, 1), shark2, (4, 2))
+        assert fish_tank.remove_starved_sharks(current_turn=6, shark_starving=4) == 1
+        assert fish_tank.get_shark_board().coords() == [(1, 0)]
+
+    def test_boxed_in(self):
+        fish_tank = BitboardFishTank(3)
+        for x in range(3):
+            for y in range(3):
+                if (x, y) != (2, 2):
+                    fish_tank.put_animal((x, y), Fish(0, 1))
+        # only the neighbours of (2, 2) can move
+        assert sorted(fish_tank.get_boxed_in().coords()) == [(0, 0), (0, 1), (0, 2), (1, 0), (2, 0)]
+
+    def test_pacman_fishtank(self):
+        fish_tank = PacmanBitboardFishTank(10)
+        fish_tank.put_animal((0, 0), Fish(0, 1))
+        fish_tank.put_animal((0, 9), Shark(0, 1))
+        coord, fish_to_eat = fish_tank.find_fish_to_eat((0, 9))
+        assert coord == (0, 0)
+        assert fish_tank.get_hunting_sharks().coords() == [(0, 9)]
+        assert len(fish_tank.find_available_nearby_space((9, 5))) == 8
@@ -0,0 +1,55 @@
+import logging
+
+from fish_bowl.process.bitboard_simulation_engine import BitboardSimulationEngine
+from fish_bowl.process.simple_simulation_engine import SimpleSimulationEngine
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+_logger = logging.getLogger(__name__)
+
+sim_config = {
+    'grid_size': 20,
+    'init_nb_fish': 150,
+    'fish_breed_maturity': 2,
+    'fish_breed_probability': 80,
+    'fish_speed': 2,
+    'init_nb_shark': 20,
+    'shark_breed_maturity': 5,
+    'shark_breed_probability': 30,
+    'shark_speed': 4,
+    'shark_starving': 4,
+    'max_turns': 15,
+    'seed': 7
+}
+
+
+def play(engine_factory, use_pacman):
+    """
+    Play a seeded simulation, return the animal types on the grid and the stats after each turn
+    """
+    engine = engine_factory(sim_config.copy(), use_pacman=use_pacman)
+    turns = []
+    while not engine.sim_ended:
+        engine.play_turn()
+        grid = {coord: animal.animal_type for coord, animal in engine._fish_tank.get_animals()}
+        turns.append((grid, engine._fish_eaten_total, engine._fish_breed_total, engine._shark_breed_total,
+                      engine._shark_starved_total))
+    return turns
+
+
+class TestBitboardSimulationEngine:
+
+    def test_same_turns_as_simple_engine(self):
+        for use_pacman in (False, True):
+            expected = play(SimpleSimulationEngine, use_pacman)
+            turns = play(BitboardSimulationEngine, use_pacman)
+            assert len(turns) == len(expected)
+            for turn, expected_turn in zip(turns, expected):
+                assert turn == expected_turn
+
+    def test_same_synchronous_turns_as_simple_engine(self):
+        for use_pacman in (False, True):
+            expected = play(lambda config, use_pacman: SimpleSimulationEngine(config, use_pacman=use_pacman,
+                                                                              synchronous=True), use_pacman)
+            turns = play(lambda config, use_pacman: BitboardSimulationEngine(config, use_pacman=use_pacman,
+                                                                             synchronous=True), use_pacman)
+            assert turns == expected
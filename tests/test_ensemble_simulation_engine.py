@@ -0,0 +1,90 @@
+import logging
+
+import numpy as np
+import pytest
+
+from fish_bowl.data_struct.ensemble_fish_tank import EnsembleFishTank
+from fish_bowl.process.ensemble_simulation_engine import EnsembleSimulationEngine, MEMBER_STATS
+from fish_bowl.process.utils import Animal
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+_logger = logging.getLogger(__name__)
+
+sim_config = {
+    'grid_size': 20,
+    'init_nb_fish': 150,
+    'fish_breed_maturity': 2,
+    'fish_breed_probability': 80,
+    'fish_speed': 1,
+    'init_nb_shark': 5,
+    'shark_breed_maturity': 5,
+    'shark_breed_probability': 30,
+    'shark_speed': 1,
+    'shark_starving': 4,
+    'max_turns': 20
+}
+
+
+def member_config(**parameters):
+    config = sim_config.copy()
+    config.update(parameters)
+    return config
+
+
+class TestEnsembleSimulationEngine:
+
+    def test_ensemble_tank(self):
+        tank = EnsembleFishTank(5, 3)
+        padded = tank.neighbour_cells(np.arange(75))[0]
+        valid = tank.neighbour_cells(np.arange(75))[1]
+        # neighbours never leave the grid of their member
+        assert (padded[valid] // 25 == np.repeat(np.arange(3), 25)[:, None].repeat(8, axis=1)[valid]).all()
+        # last row of member 0 is an edge, not a neighbour of the first row of member 1
+        tank.spawn_animals(np.array([24, 25]), Animal.Fish, None, 0, np.array([0, 1]))
+        assert bin(tank.get_free_neighbours(np.array([24]))[0]).count('1') == 3
+        assert tank.get_fish_neighbours(np.array([24, 25])).tolist() == [0, 0]
+        assert tank.count_by_member(Animal.Fish).tolist() == [1, 1, 0]
+        tank.set_active(np.array([False, True, True]))
+        assert tank.get_cells(Animal.Fish).tolist() == [25]
+
+    def test_ensemble_sim_engine(self):
+        members = [member_config(),
+                   member_config(init_nb_shark=0),
+                   member_config(max_turns=3, fish_breed_probability=100),
+                   member_config(shark_starving=1, init_nb_fish=0)]
+        engine = EnsembleSimulationEngine(members, seed=1)
+        tank = engine._fish_tank
+        assert tank.count_by_member(Animal.Fish).tolist() == [150, 150, 150, 0]
+        assert tank.count_by_member(Animal.Shark).tolist() == [5, 0, 5, 5]
+        frozen = None
+        while not engine.sim_ended:
+            engine.play_turn()
+            if engine.sim_turn == 3:
+                frozen = tank.get_arrays()['type'][40:60].copy()
+            oids = [animal.oid for coord, animal in tank.get_animals()]
+            assert len(set(oids)) == len(oids)
+        stats = engine.get_member_stats()
+        # member without sharks ends on the first turn, sharks fed at spawn on turn 1 starve on turn 3 without fish
+        assert [s['sim_turn'] for s in stats] == [20, 1, 3, 3]
+        assert stats[3]['shark_starved_total'] == 5 and stats[3]['nb_shark'] == 0
+        # ended members are not played anymore
+        assert (tank.get_arrays()['type'][40:60] == frozen).all()
+        assert stats[2]['fish_breed_total'] > 0
+        for name in MEMBER_STATS:
+            assert sum(s[name] for s in stats) == getattr(engine, '_' + name)
+        assert sum(s['nb_fish'] for s in stats) == tank.get_current_number_fishes()
+        assert len({s['sim_id'] for s in stats}) == 4
+
+    def test_pacman_ensemble(self):
+        engine = EnsembleSimulationEngine([member_config(max_turns=5), member_config(max_turns=5)], use_pacman=True,
+                                          seed=2)
+        while not engine.sim_ended:
+            engine.play_turn()
+        assert engine.sim_turn == 5
+        assert [s['sim_turn'] for s in engine.get_member_stats()] == [5, 5]
+
+    def test_members_share_grid_size(self):
+        with pytest.raises(ValueError):
+            EnsembleSimulationEngine([member_config(), member_config(grid_size=10)])
+        with pytest.raises(ValueError):
+            EnsembleSimulationEngine([])
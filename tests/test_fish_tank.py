@@ -1,8 +1,15 @@
 import pytest
 import logging
+import itertools
+import random
 
 from fish_bowl.data_struct.fish_tank import FishTank, PacmanFishTank
+from fish_bowl.data_struct.array_fish_tank import ArrayFishTank
+from fish_bowl.data_struct.bitboard_fish_tank import BitboardFishTank, PacmanBitboardFishTank
+from fish_bowl.data_struct.tiled_fish_tank import TiledFishTank
 from fish_bowl.data_struct.animals import Shark, Fish
+from fish_bowl.process.topology import PACMAN_TOPOLOGY, reach_table
+from fish_bowl.process.utils import Animal
 
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d:%(message)s")
 _logger = logging.getLogger(__name__)
@@ -105,14 +112,16 @@ class TestFishTank:
         fish_tank = FishTank(grid_size)
 
         coord1 = (0, 1)
-        animal1 = "1200"
+        animal1 = Fish(1, 1, oid=1200)
         fish_tank.put_animal(coord1, animal1)
 
         coord2 = (1, 1)
-        animal2 = "1400"
+        animal2 = Shark(1, 1, oid=1400)
         fish_tank.put_animal(coord2, animal2)
 
         pandas_df = fish_tank.create_pandas_dataframe()
+        assert pandas_df.shape == (grid_size, grid_size)
+        assert pandas_df[1][0] == str(animal1) and pandas_df[1][1] == str(animal2)
         _logger.info(pandas_df.shape)
         _logger.info("dataframe: \r\n{}".format(pandas_df))
 
@@ -143,3 +152,146 @@ class TestFishTank:
         assert x == 0
         assert y == 0
 
+    def test_neighbour_masks(self):
+        for tank_class in (FishTank, PacmanFishTank):
+            grid_size = 6
+            fish_tank = tank_class(grid_size)
+            coords = [(x, y) for x in range(grid_size) for y in range(grid_size)]
+            random.seed(3)
+            for coord in random.sample(coords, 20):
+                fish_tank.put_animal(coord, random.choice((Fish, Shark))(0, 1))
+            for coord, animal in list(fish_tank.get_grid().items())[:10]:
+                new_coord = fish_tank.pick_available_nearby_space(coord)
+                if new_coord is not None:
+                    fish_tank.move_animal(coord, animal, new_coord)
+            for coord, shark in fish_tank.get_current_sharks()[:3]:
+                fish_tuple = fish_tank.find_fish_to_eat(coord)
+                if fish_tuple is not None:
+                    fish_tank.eat_fish(2, coord, fish_tuple[0])
+            fish_tank.remove_starved_sharks(current_turn=10, shark_starving=2)
+            # masks agree with a scan of the grid
+            for coord in coords:
+                free = [c for c in fish_tank._neighbours.neighbour_coords(*coord)
+                        if fish_tank.check_animal(c) is None]
+                assert sorted(fish_tank.find_available_nearby_space(coord)) == sorted(free)
+                assert fish_tank.has_available_nearby_space(coord) == (len(free) > 0)
+                pick = fish_tank.pick_available_nearby_space(coord)
+                assert pick in free if free else pick is None
+                fish = [c for c in fish_tank._neighbours.neighbour_coords(*coord)
+                        if getattr(fish_tank.check_animal(c), 'animal_type', None) == Animal.Fish]
+                fish_tuple = fish_tank.find_fish_to_eat(coord)
+                assert fish_tuple[0] in fish if fish else fish_tuple is None
+
+    def test_species_indexes(self):
+        fish_tank = FishTank(10)
+        fish_tank.put_animal((1, 0), Fish(0, 1))
+        fish_tank.put_animal((5, 5), Fish(0, 1))
+        shark1 = Shark(0, 1)
+        fish_tank.put_animal((1, 1), shark1)
+        shark2 = Shark(0, 1)
+        fish_tank.put_animal((4, 1), shark2)
+        assert fish_tank.get_current_number_fishes() == 2
+        assert fish_tank.get_current_number_sharks() == 2
+
+        fish_tank.eat_fish(3, (1, 1), (1, 0))
+        fish_tank.move_animal((4, 1), shark2, (4, 2))
+        assert fish_tank.get_current_number_fishes() == 1
+        assert sorted(coord for coord, shark in fish_tank.get_current_sharks()) == [(1, 0), (4, 2)]
+        assert fish_tank.get_current_fishes()[0][0] == (5, 5)
+
+        # shark2 last fed at turn 1, shark1 at turn 3
+        assert fish_tank.remove_starved_sharks(current_turn=6, shark_starving=4) == 1
+        assert fish_tank.get_current_sharks() == [((1, 0), shark1)]
+        # indexes agree with the grid
+        for animal_type, animals in ((Animal.Fish, fish_tank.get_current_fishes()),
+                                     (Animal.Shark, fish_tank.get_current_sharks())):
+            assert sorted(animals) == sorted((c, a) for c, a in fish_tank.get_grid().items()
+                                             if a.animal_type == animal_type)
+
+    def test_phase(self):
+        for synchronous in (False, True):
+            fish_tank = FishTank(5, synchronous=synchronous)
+            fish1, fish2, shark = Fish(0, 1), Fish(0, 1), Shark(0, 1)
+            fish_tank.put_animal((1, 1), fish1)
+            fish_tank.put_animal((1, 3), fish2)
+            fish_tank.put_animal((4, 4), shark)
+            moves = {(1, 1): (1, 2), (1, 3): (1, 2), (4, 4): (3, 3)}
+            carried = {}
+            for position, coord, animal in fish_tank.begin_phase(sharks_first=True):
+                assert position == len(carried)
+                carried[coord] = fish_tank.carry_animal(coord, animal, moves[coord])
+                # animals are moved in place
+                assert fish_tank.check_animal(carried[coord]) is animal
+            assert list(carried) == [(4, 4), (1, 1), (1, 3)]
+            # first claim wins, the other fish stays
+            assert carried == {(4, 4): (3, 3), (1, 1): (1, 2), (1, 3): (1, 3)}
+            # synchronous phases do not update the masks before the end of the phase
+            assert ((1, 2) in fish_tank.find_available_nearby_space((0, 2))) == synchronous
+            assert fish_tank.spawn_animal((1, 1), Fish(0, 2))
+            assert not fish_tank.spawn_animal((1, 2), Fish(0, 2))
+            fish_tank.end_phase()
+            assert sorted(fish_tank.get_grid()) == [(1, 1), (1, 2), (1, 3), (3, 3)]
+            assert fish_tank.get_current_number_fishes() == 3
+            assert fish_tank.get_current_sharks() == [((3, 3), shark)]
+            for coord in fish_tank.get_grid():
+                free = [c for c in fish_tank._neighbours.neighbour_coords(*coord) if fish_tank.check_animal(c) is None]
+                assert sorted(fish_tank.find_available_nearby_space(coord)) == sorted(free)
+                fish = [c for c in fish_tank._neighbours.neighbour_coords(*coord)
+                        if getattr(fish_tank.check_animal(c), 'animal_type', None) == Animal.Fish]
+                fish_tuple = fish_tank.find_fish_to_eat(coord)
+                assert fish_tuple[0] in fish if fish else fish_tuple is None
+
+    def test_dirty_region(self):
+        fish_tank = FishTank(5)
+        fish_tank.put_animal((0, 0), Fish(0, 1))
+        # nothing recorded before tracking starts
+        fish_tank.track_dirty_cells()
+        assert fish_tank.take_dirty_region() == set()
+        fish_tank.put_animal((2, 2), Fish(0, 1))
+        region = fish_tank.take_dirty_region()
+        assert region == {(x, y) for x in range(1, 4) for y in range(1, 4)}
+        assert fish_tank.take_dirty_region() == set()
+        fish_tank.move_animal((0, 0), fish_tank.check_animal((0, 0)), (0, 1))
+        assert fish_tank.take_dirty_region() == {(0, 0), (0, 1), (1, 0), (1, 1), (0, 2), (1, 2)}
+
+    def test_pick_reachable_space(self):
+        for tank_class in (FishTank, ArrayFishTank, BitboardFishTank):
+            fish_tank = tank_class(5)
+            for coord in ((0, 0), (0, 1), (1, 1), (2, 2)):
+                fish_tank.put_animal(coord, Fish(0, 1))
+            reached = {fish_tank.pick_reachable_space((0, 0), 1) for _ in range(50)}
+            assert reached == {(1, 0)}
+            # paths only go through free cells, (1, 2) is two steps away but needs a third one around (1, 1)
+            reached = {fish_tank.pick_reachable_space((0, 0), 2) for _ in range(200)}
+            assert reached == {(1, 0), (2, 0), (2, 1)}
+            reached = {fish_tank.pick_reachable_space((0, 0), 3) for _ in range(500)}
+            assert reached == {(1, 0), (2, 0), (2, 1), (3, 0), (3, 1), (3, 2), (1, 2)}
+            fish_tank.put_animal((1, 0), Fish(0, 1))
+            assert fish_tank.pick_reachable_space((0, 0), 3) is None
+        for tank_class in (PacmanFishTank, PacmanBitboardFishTank):
+            fish_tank = tank_class(3)
+            fish_tank.put_animal((0, 0), Fish(0, 1))
+            # a reach wider than the grid finds each free cell once
+            reached = [fish_tank.pick_reachable_space((0, 0), 5, (i + 0.5) / 8) for i in range(8)]
+            assert sorted(reached) == sorted(c for c in itertools.product(range(3), range(3)) if c != (0, 0))
+
+    def test_reach_window(self):
+        for tank_class in (FishTank, ArrayFishTank, BitboardFishTank, TiledFishTank, PacmanFishTank,
+                           PacmanBitboardFishTank):
+            fish_tank = tank_class(20)
+            fish_tank.put_animal((10, 10), Fish(0, 1))
+            fish_tank.put_animal((0, 10), Fish(0, 1))
+            draws = [(i + 0.5) / 80 for i in range(80)]
+            open_picks = [fish_tank.pick_reachable_space((10, 10), 4, draw) for draw in draws]
+            edge_picks = [fish_tank.pick_reachable_space((0, 10), 4, draw) for draw in draws]
+            # the open window takes the cells in the order the search finds them
+            fish_tank._window_is_open = lambda x, y, table: False
+            assert [fish_tank.pick_reachable_space((10, 10), 4, draw) for draw in draws] == open_picks
+            assert [fish_tank.pick_reachable_space((0, 10), 4, draw) for draw in draws] == edge_picks
+            assert len(set(open_picks)) == 80
+            assert len(set(edge_picks)) == (80 if fish_tank.topology == PACMAN_TOPOLOGY else 44)
+            # a neighbour closes the window
+            fish_tank.put_animal((12, 10), Fish(0, 1))
+            del fish_tank._window_is_open
+            assert not fish_tank._window_is_open(10, 10, reach_table(20, fish_tank.topology, 4))
+            assert (12, 10) not in {fish_tank.pick_reachable_space((10, 10), 4, draw) for draw in draws}
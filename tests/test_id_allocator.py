@@ -0,0 +1,80 @@
+import logging
+import threading
+
+import pytest
+
+from fish_bowl.process.id_allocator import IdAllocator, SimulationIdAllocator
+from fish_bowl.process.simple_simulation_engine import SimpleSimulationEngine
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+_logger = logging.getLogger(__name__)
+
+sim_config = {
+    'grid_size': 50,
+    'init_nb_fish': 800,
+    'fish_breed_maturity': 1,
+    'fish_breed_probability': 100,
+    'fish_speed': 1,
+    'init_nb_shark': 5,
+    'shark_breed_maturity': 5,
+    'shark_breed_probability': 30,
+    'shark_speed': 1,
+    'shark_starving': 4,
+    'max_turns': 3
+}
+
+
+class TestIdAllocator:
+
+    def test_dense_ids(self):
+        allocator = IdAllocator()
+        assert allocator.next_id() == 0
+        assert allocator.next_ids(3).tolist() == [1, 2, 3]
+        assert allocator.next_id() == 4
+        assert allocator.count == 5
+
+    def test_stepped_ids(self):
+        allocators = [IdAllocator(start=10 + worker, step=3) for worker in range(3)]
+        ids = [allocator.next_id() for allocator in allocators] + \
+            [i for allocator in allocators for i in allocator.next_ids(2).tolist()]
+        assert sorted(ids) == list(range(10, 19))
+        assert allocators[0].count == 3
+
+    def test_threads_get_distinct_ids(self):
+        allocator = IdAllocator()
+        ids = []
+
+        def allocate():
+            ids.extend(allocator.next_id() for _ in range(1000))
+
+        threads = [threading.Thread(target=allocate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(ids) == list(range(4000))
+
+    def test_workers_get_distinct_simulation_ids(self):
+        workers = [SimulationIdAllocator(worker_id, 3) for worker_id in range(3)]
+        ids = [worker.next_id() for _ in range(4) for worker in workers]
+        assert sorted(ids) == list(range(1, 13))
+        with pytest.raises(ValueError):
+            SimulationIdAllocator(3, 3)
+
+    def test_engine_ids(self):
+        engine_1 = SimpleSimulationEngine(sim_config.copy())
+        engine_2 = SimpleSimulationEngine(sim_config.copy(), sim_id=100)
+        assert engine_1._sid != engine_2._sid
+        assert engine_2._sid == 100
+        moved = engine_1._moved
+        # more than a thousand fish births, every animal keeps its own dense id
+        for sim_turn in range(sim_config['max_turns']):
+            engine_1.play_turn()
+        oids = sorted(animal.oid for coord, animal in engine_1._fish_tank.get_animals())
+        assert engine_1._fish_breed_total > 1000
+        assert len(set(oids)) == len(oids)
+        assert oids[-1] < engine_1._oids.count
+        # moved animals are tracked per cell in one buffer, whatever the number of births
+        assert engine_1._moved is moved
+        assert len(moved) == sim_config['grid_size'] ** 2
+        assert moved.sum() == len(engine_1._moved_cells)
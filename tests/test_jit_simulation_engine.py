@@ -0,0 +1,83 @@
+import logging
+
+import numpy as np
+
+from fish_bowl.data_struct.array_fish_tank import ArrayFishTank
+from fish_bowl.process import jit_kernels
+from fish_bowl.process.jit_kernels import NUMBA_AVAILABLE
+from fish_bowl.process.jit_simulation_engine import JitSimulationEngine, jit_engine_class
+from fish_bowl.process.simple_simulation_engine import SimpleSimulationEngine
+from fish_bowl.process.topology import OPPOSITE_DIRECTION
+from fish_bowl.process.utils import Animal
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+_logger = logging.getLogger(__name__)
+
+sim_config = {
+    'grid_size': 15,
+    'init_nb_fish': 80,
+    'fish_breed_maturity': 2,
+    'fish_breed_probability': 80,
+    'fish_speed': 2,
+    'init_nb_shark': 8,
+    'shark_breed_maturity': 4,
+    'shark_breed_probability': 50,
+    'shark_speed': 3,
+    'shark_starving': 4,
+    'max_turns': 12
+}
+
+
+def rebuilt_masks(tank: ArrayFishTank) -> np.ndarray:
+    """
+    Neighbour masks of a tank holding the same animals, built with the batch methods
+    """
+    reference = type(tank)(tank.grid_size)
+    cells = tank.get_cells()
+    types = tank.get_cell_types(cells)
+    for animal_type in Animal:
+        animal_cells = cells[types == animal_type.value]
+        reference.spawn_animals(animal_cells, animal_type, None, 0, animal_cells)
+    return reference.get_arrays()['neighbour_masks'][:-1]
+
+
+class TestJitSimulationEngine:
+
+    def test_feed_sharks(self):
+        tank = ArrayFishTank(5)
+        # shark in (2, 2) with fish to its north and east, north comes first in SQUARE_NEIGH order
+        tank.spawn_animals(np.array([12]), Animal.Shark, None, 1, np.array([0]))
+        tank.spawn_animals(np.array([11, 17]), Animal.Fish, None, 0, np.array([1, 2]))
+        arrays = tank.get_arrays()
+        grid = tuple(arrays[name].ravel() for name in ('type', 'oid', 'spawn_turn', 'last_fed', 'last_breed',
+                                                       'breed_count'))
+        fed_from = np.full(25, -1)
+        moved = np.zeros(25, dtype=bool)
+        eaten = jit_kernels.feed_sharks(grid, arrays['neighbour_masks'], tank._neighbours.padded,
+                                        np.array(OPPOSITE_DIRECTION), np.array([12]), 3, fed_from, moved)
+        assert eaten == 1
+        assert tank.check_animal((2, 1)).oid == 0 and tank.check_animal((2, 1)).last_fed == 3
+        assert tank.check_animal((2, 2)) is None
+        assert fed_from[11] == 12 and moved[11]
+        assert (arrays['neighbour_masks'][:-1] == rebuilt_masks(tank)).all()
+
+    def test_jit_sim_engine(self):
+        for use_pacman in (False, True):
+            engine = JitSimulationEngine(sim_config.copy(), use_pacman=use_pacman, seed=3, persist=False)
+            tank = engine._fish_tank
+            while not engine.sim_ended:
+                engine.play_turn()
+                oids = [animal.oid for coord, animal in tank.get_animals()]
+                assert len(set(oids)) == len(oids)
+                assert max(oids) < engine._oids.count
+                # kernels keep the neighbour masks of the tank up to date
+                assert (tank.get_arrays()['neighbour_masks'][:-1] == rebuilt_masks(tank)).all()
+            assert engine._fish_breed_total > 0 and engine._fish_eaten_total > 0
+            # the bulk draws only depend on the seed
+            replay = JitSimulationEngine(sim_config.copy(), use_pacman=use_pacman, seed=3, persist=False)
+            while not replay.sim_ended:
+                replay.play_turn()
+            assert (replay._fish_tank.get_arrays()['oid'] == tank.get_arrays()['oid']).all()
+
+    def test_fallback(self):
+        assert jit_engine_class() is (JitSimulationEngine if NUMBA_AVAILABLE else SimpleSimulationEngine)
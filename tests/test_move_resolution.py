@@ -0,0 +1,40 @@
+import numpy as np
+
+from fish_bowl.process.move_resolution import pick_random_true, resolve_conflicts, propose_accept
+
+
+class TestMoveResolution:
+
+    def test_pick_random_true(self):
+        mask = np.array([[False, True, False, True],
+                         [True, False, False, False]])
+        assert pick_random_true(mask, np.array([0.0, 0.99])).tolist() == [1, 0]
+        assert pick_random_true(mask, np.array([0.99, 0.5])).tolist() == [3, 0]
+
+    def test_resolve_conflicts(self):
+        # three animals want cell 5, one gets it, the animal alone on cell 7 gets it as well
+        winners = resolve_conflicts(np.array([5, 5, 7, 5]), np.array([3, 1, 0, 2]), 10)
+        assert len(winners) == 2
+        assert 2 in winners
+
+    def test_propose_accept(self):
+        rng = np.random.default_rng(0)
+        # four animals share the same two candidate cells, one animal has no candidate
+        candidates = np.array([[3, 4], [3, 4], [3, 4], [3, 4], [3, 4]])
+        allowed = np.ones(candidates.shape, dtype=bool)
+        allowed[4] = False
+        for _ in range(20):
+            animals, cells = propose_accept(candidates, allowed, rng, 10)
+            # losers retried: both cells are taken, each by a single animal
+            assert sorted(cells.tolist()) == [3, 4]
+            assert len(set(animals.tolist())) == 2
+            assert 4 not in animals
+
+    def test_propose_accept_single_round(self):
+        rng = np.random.default_rng(0)
+        candidates = np.array([[3, 4], [3, 4]])
+        allowed = np.array([[True, False], [True, True]])
+        animals, cells = propose_accept(candidates, allowed, rng, 10, max_rounds=1)
+        # a single round never gives a cell twice, losers stay put
+        assert len(set(cells.tolist())) == len(cells)
+        assert 1 <= len(animals) <= 2
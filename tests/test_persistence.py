@@ -1,7 +1,10 @@
 import pandas as pd
 import pytest
+from sqlalchemy import event, text
 
-from fish_bowl.dataio.persistence import SimulationClient, Simulation
+from fish_bowl.dataio.persistence import SimulationClient, WriteBehindSimulationClient, Simulation, Animals, \
+    MAX_IN_OIDS
+from fish_bowl.dataio.threaded_persistence import PersistenceClient
 from fish_bowl.process.utils import ImpossibleAction, Animal
 from fish_bowl.process.topology import SquareGridCoordinate, NonEmptyCoordinate, TopologyError, square_grid_neighbours
 
@@ -167,3 +170,135 @@ class TestPersistence:
         client.init_animal(sim_id=sid, current_turn=0, animal_type=Animal.Shark, coordinate=SquareGridCoordinate(5, 5))
         eaten = client.eat_animal_in_square(sim_id=sid, coordinate=SquareGridCoordinate(5, 5))
         assert not eaten, 'Should not be able to eat a Shark'
+
+    def test_turn(self, tmp_path):
+        database_url = 'sqlite:///{}'.format(tmp_path / 'turn.db')
+        client = SimulationClient(database_url)
+        sid = client.init_simulation(**sim_config)
+        commits = []
+        event.listen(client._engine, 'commit', lambda connection: commits.append(connection))
+        with client.turn(sid):
+            for v in animal_list:
+                client.init_animal(sim_id=sid, current_turn=0, animal_type=v[0], coordinate=v[1])
+            client.move_animal(sim_id=sid, animal_id=4, new_position=SquareGridCoordinate(5, 3))
+            # failing calls only roll their own savepoint back
+            with pytest.raises(NonEmptyCoordinate):
+                client.init_animal(sim_id=sid, current_turn=0, animal_type=Animal.Fish,
+                                   coordinate=SquareGridCoordinate(5, 3))
+            client.kill_animal(sim_id=sid, animal_ids=[3])
+            with pytest.raises(ImpossibleAction):
+                client.move_animal(sim_id=sid, animal_id=3, new_position=SquareGridCoordinate(3, 3))
+            # reads see the changes of the turn
+            assert len(client.get_animals_df(sim_id=sid)) == len(animal_list) - 1
+            # other connections do not see them before the commit
+            assert len(SimulationClient(database_url).get_animals_df(sim_id=sid)) == 0
+        assert len(commits) == 1
+        animals = SimulationClient(database_url).get_animals_df(sim_id=sid)
+        assert len(animals) == len(animal_list) - 1
+        assert client.coordinate_is_occupied(sim_id=sid, coordinate=SquareGridCoordinate(5, 3))
+        # a turn raising is rolled back as a whole
+        with pytest.raises(ValueError):
+            with client.turn(sid):
+                client.kill_animal(sim_id=sid, animal_ids=[1, 2])
+                raise ValueError('turn failed')
+        assert len(client.get_animals_df(sim_id=sid)) == len(animal_list) - 1
+
+    def test_set_based_updates(self):
+        client = SimulationClient('sqlite:///:memory:')
+        sid = client.init_simulation(**sim_config)
+        for t, c in animal_list:
+            client.init_animal(sim_id=sid, current_turn=0, animal_type=t, coordinate=c)
+        # oids 6 and 7 are sharks, fed at turn 0
+        client.update_animals(sim_id=sid, update_dict={6: {'last_fed': 3}})
+        assert client.kill_starving_sharks(sim_id=sid, current_turn=5, shark_starving=4) == [7]
+        assert client.kill_starving_sharks(sim_id=sid, current_turn=5, shark_starving=4) == []
+        assert client.kill_animal(sim_id=sid, animal_ids=[1, 2, 7]) == [1, 2]
+        updated = client.update_animals(sim_id=sid, update_dict={2: {'last_fed': 5}, 3: {'last_fed': 5},
+                                                                 4: {'breed_count': 2, 'last_breed': 5},
+                                                                 5: {'alive': False}})
+        assert updated == [3, 4]
+        animals = client.get_animals_df(sim_id=sid).set_index('oid')
+        assert animals.last_fed.to_dict() == {3: 5, 4: 0, 5: 0, 6: 3, 8: 0}
+        assert animals.loc[4, ['breed_count', 'last_breed']].tolist() == [2, 5]
+        # animals read earlier in a turn see the updates
+        with client.turn(sid):
+            animal = client.get_animal(sim_id=sid, animal_id=3)
+            client.update_animals(sim_id=sid, update_dict={3: {'breed_count': 4}})
+            client.kill_animal(sim_id=sid, animal_ids=[3])
+            assert client.get_animal(sim_id=sid, animal_id=3) is animal
+            assert animal.breed_count == 4 and not animal.alive
+
+    @pytest.mark.parametrize('client_class', [SimulationClient, WriteBehindSimulationClient])
+    def test_kill_and_update_results(self, client_class):
+        client = client_class('sqlite:///:memory:')
+        sid = client.init_simulation(**sim_config)
+        for t, c in animal_list:
+            client.init_animal(sim_id=sid, current_turn=0, animal_type=t, coordinate=c)
+        # oids listed twice are killed once, dead ones are left out
+        assert client.kill_animal(sim_id=sid, animal_ids=[1, 2, 1, 2]) == [1, 2]
+        assert client.kill_animal(sim_id=sid, animal_ids=[2, 3]) == [3]
+        # only the live animals with an attribute to update are returned
+        updated = client.update_animals(sim_id=sid, update_dict={1: {'last_fed': 5}, 4: {'last_fed': 5},
+                                                                 5: {'alive': False}})
+        assert updated == [4]
+        assert client.get_animal(sim_id=sid, animal_id=4).last_fed == 5
+        assert client.get_animal(sim_id=sid, animal_id=5).alive
+
+    def test_set_based_updates_large(self):
+        client = SimulationClient('sqlite:///:memory:')
+        sid = client.init_simulation(**dict(sim_config, grid_size=40))
+        with client.turn(sid):
+            for x in range(40):
+                for y in range(40):
+                    client.init_animal(sim_id=sid, current_turn=0, animal_type=Animal.Fish,
+                                       coordinate=SquareGridCoordinate(x, y))
+        assert 1600 > 2 * MAX_IN_OIDS
+        oids = client.get_animals_df(sim_id=sid).oid.tolist()
+        assert client.update_animals(sim_id=sid, update_dict={oid: {'last_fed': 2} for oid in oids}) == oids
+        assert client.kill_animal(sim_id=sid, animal_ids=oids[::2]) == oids[::2]
+        animals = client.get_animals_df(sim_id=sid)
+        assert animals.oid.tolist() == oids[1::2] and (animals.last_fed == 2).all()
+
+    def test_animal_indexes(self, tmp_path):
+        database_url = 'sqlite:///{}'.format(tmp_path / 'indexes.db')
+        client = SimulationClient(database_url)
+        # a database created before the indexes were declared
+        for index in Animals.__table__.indexes:
+            index.drop(bind=client._engine)
+        sid = client.init_simulation(**sim_config)
+        client.init_animal(sim_id=sid, current_turn=0, animal_type=Animal.Fish, coordinate=SquareGridCoordinate(1, 3))
+        client._engine.dispose()
+        # connecting adds them, the ANIMALS model of the threaded client declares the same ones
+        for client_class in (SimulationClient, PersistenceClient):
+            client = client_class(database_url)
+            with client.session_scope() as s:
+                indexes = s.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+                                         "AND tbl_name = 'ANIMALS'"))
+                indexes = dict(indexes.fetchall())
+            assert sorted(indexes) == ['ix_animals_live_position', 'ix_animals_live_type']
+            assert all(sql.endswith('WHERE alive = 1') for sql in indexes.values())
+        client = SimulationClient(database_url)
+        assert client.coordinate_is_occupied(sim_id=sid, coordinate=SquareGridCoordinate(1, 3))
+        with client.session_scope() as s:
+            plan = s.execute(text('EXPLAIN QUERY PLAN SELECT oid FROM ANIMALS WHERE sim_id = 1 AND coord_x = 1 AND '
+                                  'coord_y = 3 AND alive = 1')).fetchall()
+        assert 'ix_animals_live_position' in plan[0][-1]
+
+    @pytest.mark.parametrize('client_class', [SimulationClient, WriteBehindSimulationClient])
+    def test_neighbourhood(self, client_class):
+        client = client_class('sqlite:///:memory:')
+        sid = client.init_simulation(**sim_config)
+        for t, c in animal_list:
+            client.init_animal(sim_id=sid, current_turn=0, animal_type=t, coordinate=c)
+        client.kill_animal(sim_id=sid, animal_ids=[4])
+        # neighbours of (5, 5) and of the corner (0, 0), (4, 3) holds a dead fish
+        neighbourhood = client.get_neighbourhood(sim_id=sid, centres=[SquareGridCoordinate(5, 5),
+                                                                      SquareGridCoordinate(0, 0)])
+        assert neighbourhood == {(5, 4): Animal.Fish, (6, 5): Animal.Shark, (6, 6): Animal.Shark}
+        assert client.get_occupants(sim_id=sid, coordinates=[SquareGridCoordinate(1, 3), SquareGridCoordinate(1, 4),
+                                                             SquareGridCoordinate(6, 1)]) == \
+            {(1, 3): Animal.Fish, (6, 1): Animal.Fish}
+        assert client.get_occupants(sim_id=sid, coordinates=[]) == {}
+        assert client.has_fish_in_square(sim_id=sid, coordinates=[SquareGridCoordinate(6, 5),
+                                                                  SquareGridCoordinate(5, 4)]) == \
+            [SquareGridCoordinate(5, 4)]
@@ -50,6 +50,10 @@ class TestSimulationEngine:
 
         assert simple_sim_engine.max_turns == 8
         assert simple_sim_engine.sim_turn > 0
+        stats = simple_sim_engine.get_stats()
+        assert stats['sim_turn'] == simple_sim_engine.sim_turn
+        assert stats['shark_starved_total'] == simple_sim_engine._shark_starved_total
+        assert stats['nb_fish'] == simple_sim_engine.fish_tank.get_current_number_fishes()
 
     def test_pacman_fish_bowl_sim_engine(self):
         simple_sim_engine = SimpleSimulationEngine(sim_config.copy(), use_pacman=True)
@@ -73,3 +77,78 @@ class TestSimulationEngine:
 
         assert simple_sim_engine.max_turns == 8
         assert simple_sim_engine.sim_turn > 0
+
+    def test_array_fish_bowl_sim_engine(self):
+        for use_pacman in (False, True):
+            simple_sim_engine = SimpleSimulationEngine(sim_config.copy(), use_pacman=use_pacman, use_array=True)
+            simple_sim_engine.display_simple_grid()
+
+            for sim_turn in range(sim_config["max_turns"]):
+                simple_sim_engine.play_turn()
+                if simple_sim_engine.sim_ended:
+                    break
+
+            simple_sim_engine.print_stats()
+
+            assert simple_sim_engine.sim_turn > 0
+
+    def test_synchronous_sim_engine(self):
+        for tank_options in ({}, {'use_array': True}, {'use_bitboard': True}, {'use_pacman': True}):
+            simple_sim_engine = SimpleSimulationEngine(sim_config.copy(), synchronous=True, **tank_options)
+            tank = simple_sim_engine._fish_tank
+            for sim_turn in range(sim_config["max_turns"]):
+                simple_sim_engine.play_turn()
+                animals = tank.get_animals()
+                oids = [animal.oid for coord, animal in animals]
+                assert len(set(oids)) == len(oids)
+                assert tank.get_current_number_fishes() + tank.get_current_number_sharks() == len(animals)
+                # neighbourhood masks agree with the grid
+                occupied = {coord for coord, animal in animals}
+                for coord, animal in animals:
+                    free = [c for c in tank._neighbours.neighbour_coords(*coord) if c not in occupied]
+                    assert sorted(tank.find_available_nearby_space(coord)) == sorted(free)
+                if simple_sim_engine.sim_ended:
+                    break
+            assert simple_sim_engine.sim_turn > 0
+
+    def test_seeded_sim_engine(self):
+        for tank_options in ({}, {'use_array': True}, {'use_bitboard': True}):
+            engine_1 = SimpleSimulationEngine(dict(sim_config, seed=5), **tank_options)
+            engine_2 = SimpleSimulationEngine(sim_config.copy(), seed=5, **tank_options)
+            for sim_turn in range(sim_config["max_turns"]):
+                engine_1.play_turn()
+                engine_2.play_turn()
+                assert repr(engine_1._fish_tank) == repr(engine_2._fish_tank)
+
+    def test_active_set_sim_engine(self):
+        for options in ({}, {'synchronous': True}, {'use_bitboard': True}, {'use_array': True, 'synchronous': True}):
+            simple_sim_engine = SimpleSimulationEngine(sim_config.copy(), active_set=True, **options)
+            tank = simple_sim_engine._fish_tank
+            for sim_turn in range(sim_config["max_turns"]):
+                simple_sim_engine.play_turn()
+                animals = tank.get_animals()
+                oids = [animal.oid for coord, animal in animals]
+                assert len(set(oids)) == len(oids)
+                # every animal with a free neighbour is scheduled for the next phase
+                simple_sim_engine._open_cells |= tank.take_dirty_region()
+                assert simple_sim_engine._open_cells >= \
+                    {coord for coord, animal in animals if tank.has_available_nearby_space(coord)}
+                if simple_sim_engine.sim_ended:
+                    break
+        # a full grid has nothing to schedule
+        engine = SimpleSimulationEngine(dict(sim_config, init_nb_fish=100, init_nb_shark=0), active_set=True)
+        assert engine._active_animals() == []
+
+    def test_starvation_queue(self):
+        for tank_options in ({}, {'use_bitboard': True}, {'active_set': True}):
+            engine_1 = SimpleSimulationEngine(sim_config.copy(), seed=3, **tank_options)
+            engine_2 = SimpleSimulationEngine(sim_config.copy(), seed=3, **tank_options)
+            # every shark checked each turn
+            engine_2._starvation.pop = lambda turn: None
+            for sim_turn in range(sim_config["max_turns"]):
+                engine_1.play_turn()
+                engine_2.play_turn()
+                assert repr(engine_1._fish_tank) == repr(engine_2._fish_tank)
+                shark_coords = {shark.oid: coord for coord, shark in engine_1._fish_tank.get_current_sharks()}
+                assert engine_1._fish_tank._shark_coords == shark_coords
+            assert engine_1._shark_starved_total == engine_2._shark_starved_total > 0
@@ -0,0 +1,103 @@
+import gc
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+
+import pytest
+
+from fish_bowl.process.strip_simulation_engine import StripSimulationEngine, StripWorker, strip_bounds, \
+    strip_colours, min_strip_rows
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+_logger = logging.getLogger(__name__)
+
+sim_config = {
+    'grid_size': 24,
+    'init_nb_fish': 200,
+    'fish_breed_maturity': 2,
+    'fish_breed_probability': 60,
+    'fish_speed': 1,
+    'init_nb_shark': 30,
+    'shark_breed_maturity': 3,
+    'shark_breed_probability': 50,
+    'shark_speed': 1,
+    'shark_starving': 3,
+    'max_turns': 50
+}
+
+
+class TestStripSimulationEngine:
+
+    def test_strips(self):
+        assert strip_bounds(10, 3) == [(0, 3), (3, 6), (6, 10)]
+        assert strip_colours(4, wrap=True) == [0, 1, 0, 1]
+        assert strip_colours(3, wrap=False) == [0, 1, 0]
+        # first and last strips touch through the wrap
+        assert strip_colours(3, wrap=True) == [0, 1, 2]
+        with pytest.raises(ValueError):
+            StripSimulationEngine(sim_config.copy(), nb_workers=7)
+        # strips that never share a colour all run one after the other
+        for use_pacman, nb_workers in ((False, 2), (True, 3)):
+            with pytest.raises(ValueError):
+                StripSimulationEngine(sim_config.copy(), nb_workers=nb_workers, use_pacman=use_pacman)
+        # faster animals need higher strips
+        assert min_strip_rows(4) == 10
+        with pytest.raises(ValueError):
+            StripSimulationEngine(dict(sim_config, shark_speed=4), nb_workers=3)
+
+    def test_strip_sim_engine(self):
+        for use_pacman, nb_workers, speed in ((False, 4, 1), (True, 5, 1), (False, 3, 3)):
+            grids = []
+            for _ in range(2):
+                with StripSimulationEngine(dict(sim_config, shark_speed=speed), nb_workers=nb_workers, use_pacman=use_pacman, seed=3,
+                                           timeout=60) as engine:
+                    tank = engine._fish_tank
+                    for sim_turn in range(6):
+                        engine.play_turn()
+                        animals = tank.get_animals()
+                        oids = [animal.oid for coord, animal in animals]
+                        assert len(set(oids)) == len(oids)
+                        assert tank.get_current_number_fishes() + tank.get_current_number_sharks() == len(animals)
+                        # neighbourhood masks agree with the grid across strip edges
+                        occupied = {coord for coord, animal in animals}
+                        for coord, animal in animals:
+                            free = [c for c in tank._neighbours.neighbour_coords(*coord) if c not in occupied]
+                            assert sorted(tank.find_available_nearby_space(coord)) == sorted(free)
+                    assert engine._fish_breed_total > 0 and engine._fish_eaten_total > 0
+                    grids.append(repr(tank))
+                # the tank stays readable once the workers are stopped
+                assert repr(engine._fish_tank) == grids[-1]
+            # same seed and number of workers, same simulation
+            assert grids[0] == grids[1]
+
+    @pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='workers must inherit the patched strip')
+    def test_strips_of_a_colour_overlap(self, monkeypatch):
+        # the two strips of the first colour wait for each other before playing, the turn fails if they do not overlap
+        meeting = multiprocessing.get_context().Barrier(2)
+        play_turn = StripWorker.play_turn
+
+        def meet_and_play(worker, sim_turn):
+            if worker._x0 in (0, 12):
+                meeting.wait(30)
+            play_turn(worker, sim_turn)
+
+        monkeypatch.setattr(StripWorker, 'play_turn', meet_and_play)
+        with StripSimulationEngine(sim_config.copy(), nb_workers=4, seed=3, timeout=60) as engine:
+            for sim_turn in range(2):
+                engine.play_turn()
+        assert engine.sim_turn == 2
+
+    def test_shared_memory_released(self):
+        engine = StripSimulationEngine(sim_config.copy(), seed=3, timeout=60)
+        engine.play_turn()
+        names = [block.name for block in engine._blocks.values()]
+        workers = engine._workers
+        # never closed
+        del engine
+        gc.collect()
+        for name in names:
+            with pytest.raises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+        for process in workers:
+            process.join(60)
+            assert not process.is_alive()
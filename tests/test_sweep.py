@@ -0,0 +1,103 @@
+import logging
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from fish_bowl.process.sweep import RunningStats, SweepAggregate, run_replicate, run_sweep, sweep_configs
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+_logger = logging.getLogger(__name__)
+
+sim_config = {
+    'grid_size': 10,
+    'init_nb_fish': 50,
+    'fish_breed_maturity': 3,
+    'fish_breed_probability': 80,
+    'fish_speed': 1,
+    'init_nb_shark': 5,
+    'shark_breed_maturity': 5,
+    'shark_breed_probability': 100,
+    'shark_speed': 1,
+    'shark_starving': 4,
+    'max_turns': 15
+}
+
+
+class TestSweep:
+
+    def test_sweep_configs(self):
+        configs = sweep_configs(sim_config, {'shark_starving': [2, 4], 'fish_breed_probability': [50, 80, 100]})
+        assert len(configs) == 6
+        assert configs[1]['shark_starving'] == 2 and configs[1]['fish_breed_probability'] == 80
+        assert all(config['grid_size'] == 10 for config in configs)
+
+    def test_running_stats(self):
+        values = np.random.default_rng(0).random((20, 5))
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+        assert np.allclose(stats.mean, values.mean(axis=0))
+        assert np.allclose(stats.variance, values.var(axis=0, ddof=1))
+
+    def test_run_replicate(self):
+        for engine in ('simple', 'vectorized'):
+            result = run_replicate(dict(sim_config, shark_starving=1), [0, 0, 0], engine)
+            assert len(result['fishes']) == result['sim_turn'] + 1
+            assert result['fish_eaten_total'] >= 0 and result['shark_starved_total'] >= 0
+            assert result['fishes'][0] == 50 and result['sharks'][0] == 5
+            if result['extinction_turn'] is not None:
+                assert result['sharks'][-1] == 0
+            # same seed, same run
+            assert run_replicate(dict(sim_config, shark_starving=1), [0, 0, 0], engine)['fishes'].tolist() == \
+                result['fishes'].tolist()
+
+    def test_jit_engine_imported_on_use(self):
+        imported = subprocess.run([sys.executable, '-c', 'import sys; import fish_bowl.process.sweep; '
+                                   'print("fish_bowl.process.jit_kernels" in sys.modules)'],
+                                  capture_output=True, text=True, check=True)
+        assert imported.stdout.strip() == 'False'
+        assert run_replicate(sim_config, [0, 0, 0], 'jit')['fishes'][0] == 50
+
+    def test_aggregate_pads_ended_runs(self):
+        aggregate = SweepAggregate(dict(sim_config, max_turns=3))
+        aggregate.add({'fishes': np.array([10, 12]), 'sharks': np.array([2, 0]), 'extinction_turn': 1,
+                       'sim_turn': 1, 'shark_breed_total': 0, 'fish_breed_total': 2, 'fish_eaten_total': 0,
+                       'shark_starved_total': 2})
+        aggregate.add({'fishes': np.array([10, 11, 12, 13]), 'sharks': np.array([2, 2, 2, 2]),
+                       'extinction_turn': None, 'sim_turn': 3, 'shark_breed_total': 0, 'fish_breed_total': 3,
+                       'fish_eaten_total': 0, 'shark_starved_total': 0})
+        summary = aggregate.summary()
+        assert summary['fishes_mean'].tolist() == [10, 11.5, 12, 12.5]
+        assert summary['sharks_mean'].tolist() == [2, 1, 1, 1]
+        assert summary['extinctions'] == 1 and summary['extinction_turn_mean'] == 1
+        assert summary['fish_breed_total_mean'] == 2.5 and summary['fish_breed_total_var'] == 0.5
+
+    def test_empty_aggregate(self):
+        summary = SweepAggregate(sim_config).summary()
+        assert summary['runs'] == 0
+        assert summary['fishes_mean'] is None and summary['fishes_var'] is None
+        assert summary['fish_breed_total_mean'] is None and summary['extinction_turn_mean'] is None
+        with pytest.raises(ValueError):
+            run_sweep([sim_config], 0)
+
+    def test_run_sweep(self):
+        configs = sweep_configs(sim_config, {'shark_starving': [2, 4]})
+        runs = []
+        sim_ids = []
+
+        def on_result(c, r, result):
+            runs.append((c, r))
+            sim_ids.append(result['sim_id'])
+
+        summaries = run_sweep(configs, 3, max_workers=2, on_result=on_result)
+        assert sorted(runs) == [(c, r) for c in range(2) for r in range(3)]
+        # each worker hands out its own simulation ids
+        assert len(set(sim_ids)) == len(sim_ids)
+        assert [summary['runs'] for summary in summaries] == [3, 3]
+        # replicate seeds do not depend on the number of workers
+        serial = run_sweep(configs, 3, max_workers=1)
+        for summary, expected in zip(summaries, serial):
+            assert np.allclose(summary['fishes_mean'], expected['fishes_mean'])
+            assert np.isclose(summary['fish_eaten_total_mean'], expected['fish_eaten_total_mean'])
@@ -0,0 +1,68 @@
+import logging
+
+from fish_bowl.data_struct.tiled_fish_tank import TiledFishTank, PacmanTiledFishTank
+from fish_bowl.data_struct.animals import Shark, Fish
+from fish_bowl.process.simple_simulation_engine import SimpleSimulationEngine
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d:%(message)s")
+_logger = logging.getLogger(__name__)
+
+sim_config = {
+    'grid_size': 20,
+    'init_nb_fish': 150,
+    'fish_breed_maturity': 2,
+    'fish_breed_probability': 60,
+    'fish_speed': 2,
+    'init_nb_shark': 20,
+    'shark_breed_maturity': 3,
+    'shark_breed_probability': 50,
+    'shark_speed': 3,
+    'shark_starving': 3,
+    'max_turns': 10
+}
+
+
+class TestTiledFishTank:
+
+    def test_tiles_follow_animals(self):
+        fish_tank = TiledFishTank(10 ** 4, tile_size=8)
+        fish = Fish(0, 1)
+        fish_tank.put_animal((5000, 7), fish)
+        fish_tank.put_animal((5001, 8), Shark(0, 1))
+        assert fish_tank.get_tile_populations() == {(625, 0): 1, (625, 1): 1}
+        fish_tank.move_animal((5000, 7), fish, (5003, 8))
+        assert fish_tank.get_tile_populations() == {(625, 1): 2}
+        assert fish_tank.find_fish_to_eat((5002, 9))[0] == (5003, 8)
+        assert len(fish_tank.find_available_nearby_space((5002, 8))) == 6
+
+    def test_packed_tile(self):
+        fish_tank = TiledFishTank(12, tile_size=4)
+        for x in range(4):
+            for y in range(4):
+                fish_tank.put_animal((x, y), Fish(0, 1))
+        assert fish_tank.get_tile_populations() == {(0, 0): 16}
+        assert not fish_tank.has_available_nearby_space((1, 2))
+        assert fish_tank.find_available_nearby_space((3, 3), shuffle=False) == [(4, 2), (4, 3), (2, 4), (3, 4), (4, 4)]
+        # phases leave out the cells inside the packed tile, the others keep their position
+        positions = {coord: position for position, coord, animal in fish_tank.begin_phase()}
+        fish_tank.end_phase()
+        assert len(positions) == 12 and (1, 2) not in positions
+        assert positions[(3, 3)] == 15
+        fish_tank.remove_starved_sharks(10, 1)
+        assert fish_tank.get_current_number_fishes() == 16
+
+    def test_pacman_tiles(self):
+        fish_tank = PacmanTiledFishTank(16, tile_size=8)
+        fish_tank.put_animal((15, 15), Fish(0, 1))
+        assert fish_tank.find_fish_to_eat((0, 0))[0] == (15, 15)
+        assert (0, 0) in fish_tank.find_available_nearby_space((15, 15))
+
+    def test_same_draws_as_fish_tank(self):
+        for options in ({}, {'use_pacman': True}, {'synchronous': True, 'active_set': True}):
+            engine_1 = SimpleSimulationEngine(sim_config.copy(), seed=4, **options)
+            engine_2 = SimpleSimulationEngine(sim_config.copy(), seed=4, use_tiled=True, **options)
+            for sim_turn in range(sim_config['max_turns']):
+                engine_1.play_turn()
+                engine_2.play_turn()
+                assert sorted(map(str, engine_1._fish_tank.get_animals())) == \
+                    sorted(map(str, engine_2._fish_tank.get_animals()))
@@ -1,6 +1,7 @@
 import pytest
 
-from fish_bowl.process.topology import SquareGridCoordinate, TopologyError, square_grid_valid, square_grid_neighbours
+from fish_bowl.process.topology import SquareGridCoordinate, TopologyError, square_grid_valid, square_grid_neighbours, \
+    NeighbourTable, neighbour_table, reach_table, SQUARE_NEIGH, SQUARE_TOPOLOGY, PACMAN_TOPOLOGY
 
 
 class TestTopology:
@@ -38,3 +39,45 @@ class TestTopology:
         # line
         neigh_list = square_grid_neighbours(10, SquareGridCoordinate(0, 5))
         assert len(neigh_list) == 5
+        # off the grid, only the neighbours on the grid
+        neigh_list = square_grid_neighbours(10, SquareGridCoordinate(-1, 5), shuffle=False)
+        assert neigh_list == [SquareGridCoordinate(0, 4), SquareGridCoordinate(0, 5), SquareGridCoordinate(0, 6)]
+        assert square_grid_neighbours(10, SquareGridCoordinate(12, 12)) == []
+
+    def test_neighbour_table(self):
+        table = neighbour_table(10, SQUARE_TOPOLOGY)
+        counts = table.indptr[1:] - table.indptr[:-1]
+        # corners, edges and inner cells
+        assert counts[0] == 3
+        assert counts[1 * 10 + 0] == 5
+        assert counts[5 * 10 + 5] == 8
+        assert table.neighbour_coords(0, 0) == [(1, 0), (0, 1), (1, 1)]
+        assert table.edge_masks[0] == 0b11010000
+        assert table.padded.shape == (100, 8)
+        assert sorted(table.padded[0].tolist()) == [-1, -1, -1, -1, -1, 1, 10, 11]
+        # pacman grid has no edges
+        pacman = neighbour_table(10, PACMAN_TOPOLOGY)
+        assert (pacman.indptr[1:] - pacman.indptr[:-1] == 8).all()
+        assert (0, 9) in pacman.neighbour_coords(0, 0)
+        assert (pacman.edge_masks == 0xff).all()
+        # tables are shared
+        assert neighbour_table(10, SQUARE_TOPOLOGY) is table
+        with pytest.raises(TopologyError):
+            NeighbourTable(10, 'hexagonal')
+
+    def test_reach_table(self):
+        table = reach_table(10, SQUARE_TOPOLOGY, 2)
+        assert table is reach_table(10, SQUARE_TOPOLOGY, 2)
+        assert len(table) == 25
+        # centre, its neighbours in SQUARE_NEIGH order, then the second ring
+        assert table.offsets[:9] == [(0, 0)] + list(SQUARE_NEIGH.values())
+        assert sorted(table.offsets) == sorted((x, y) for x in range(-2, 3) for y in range(-2, 3))
+        # steps from the centre go to the first ring, the second ring has no step out of the window
+        assert table.steps[0] == tuple(range(1, 9))
+        assert all(-1 in table.steps[i] for i in range(9, 25))
+        # the centre and the first ring, whose masks miss the bit of the centre
+        assert [(x, y) for x, y, mask in table.inner] == table.offsets[:9]
+        assert table.inner[0][2] == 0xff
+        assert table.inner[1][2] == 0xff & ~(1 << 7)
+        assert table.fits
+        assert not reach_table(4, PACMAN_TOPOLOGY, 2).fits
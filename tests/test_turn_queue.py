@@ -0,0 +1,22 @@
+import logging
+
+from fish_bowl.process.turn_queue import TurnQueue
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+_logger = logging.getLogger(__name__)
+
+
+class TestTurnQueue:
+
+    def test_push_pop(self):
+        queue = TurnQueue()
+        queue.push(3, 'a')
+        queue.push(5, 'b')
+        queue.push(3, 'c')
+        assert len(queue) == 3
+        assert queue.pop(2) == []
+        assert queue.pop(3) == ['a', 'c']
+        # a turn is only popped once
+        assert queue.pop(3) == []
+        assert len(queue) == 1
+        assert queue.pop(5) == ['b']
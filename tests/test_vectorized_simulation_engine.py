@@ -0,0 +1,128 @@
+import logging
+
+import numpy as np
+
+from fish_bowl.process.vectorized_simulation_engine import VectorizedSimulationEngine
+from fish_bowl.process.utils import Animal
+
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(filename)s:[%(lineno)d]: %(message)s")
+_logger = logging.getLogger(__name__)
+
+sim_config = {
+    'grid_size': 20,
+    'init_nb_fish': 150,
+    'fish_breed_maturity': 2,
+    'fish_breed_probability': 80,
+    'fish_speed': 2,
+    'init_nb_shark': 5,
+    'shark_breed_maturity': 5,
+    'shark_breed_probability': 30,
+    'shark_speed': 4,
+    'shark_starving': 4,
+    'max_turns': 20
+}
+
+sim_config_empty = {
+    'grid_size': 10,
+    'init_nb_fish': 0,
+    'fish_breed_maturity': 3,
+    'fish_breed_probability': 100,
+    'fish_speed': 2,
+    'init_nb_shark': 0,
+    'shark_breed_maturity': 3,
+    'shark_breed_probability': 100,
+    'shark_speed': 4,
+    'shark_starving': 4,
+    'max_turns': 10
+}
+
+
+def cell(x, y, grid_size=10):
+    return x * grid_size + y
+
+
+class TestVectorizedSimulationEngine:
+
+    def test_vectorized_sim_engine(self):
+        for use_pacman in (False, True):
+            engine = VectorizedSimulationEngine(sim_config.copy(), use_pacman=use_pacman, seed=1)
+            tank = engine._fish_tank
+            assert len(tank.get_cells(Animal.Fish)) == sim_config['init_nb_fish']
+            assert len(tank.get_cells(Animal.Shark)) == sim_config['init_nb_shark']
+            for sim_turn in range(sim_config['max_turns']):
+                engine.play_turn()
+                # every animal keeps its own oid
+                oids = [animal.oid for coord, animal in tank.get_animals()]
+                assert len(set(oids)) == len(oids)
+                if engine.sim_ended:
+                    break
+            engine.print_stats()
+            assert engine.sim_turn > 0
+
+    def test_same_seed_same_simulation(self):
+        engine_1 = VectorizedSimulationEngine(sim_config.copy(), seed=42)
+        engine_2 = VectorizedSimulationEngine(sim_config.copy(), seed=42)
+        for sim_turn in range(5):
+            engine_1.play_turn()
+            engine_2.play_turn()
+        assert repr(engine_1._fish_tank) == repr(engine_2._fish_tank)
+
+    def test_starving(self):
+        config = dict(sim_config_empty, shark_breed_maturity=100)
+        engine = VectorizedSimulationEngine(config, seed=1)
+        tank = engine._fish_tank
+        # shark fed at turn 1 starves at the beginning of turn 1 + shark_starving + 1
+        tank.spawn_animals(np.array([cell(5, 5)]), Animal.Shark, 1, 1, engine._new_oids(1))
+        for sim_turn in range(sim_config_empty['shark_starving'] + 1):
+            engine.play_turn()
+            assert len(tank.get_cells(Animal.Shark)) == 1
+        engine.play_turn()
+        assert len(tank.get_cells(Animal.Shark)) == 0
+        assert engine._shark_starved_total == 1
+        assert engine.sim_ended
+
+    def test_speed(self):
+        config = dict(sim_config_empty, shark_breed_maturity=100, shark_starving=100)
+        engine = VectorizedSimulationEngine(config, seed=1)
+        tank = engine._fish_tank
+        coord = (5, 5)
+        tank.spawn_animals(np.array([cell(*coord)]), Animal.Shark, 1, 1, engine._new_oids(1))
+        for sim_turn in range(3):
+            engine.play_turn()
+            # a lone shark moves up to its speed, only its last cell is flagged as moved
+            new_coord = tank.get_current_sharks()[0][0]
+            assert max(abs(new_coord[0] - coord[0]), abs(new_coord[1] - coord[1])) <= config['shark_speed']
+            assert engine._moved.sum() == 1 and engine._moved[cell(*new_coord)]
+            coord = new_coord
+
+    def test_eating_and_breeding(self):
+        engine = VectorizedSimulationEngine(sim_config_empty.copy(), seed=1)
+        tank = engine._fish_tank
+        # a single fish next to a shark old enough to breed
+        shark_oid = engine._new_oids(1)
+        tank.spawn_animals(np.array([cell(2, 2)]), Animal.Shark, 1, -2, shark_oid)
+        tank.spawn_animals(np.array([cell(2, 1)]), Animal.Fish, 1, 1, engine._new_oids(1))
+        engine.play_turn()
+        assert engine._fish_eaten_total == 1
+        assert engine._shark_breed_total == 1
+        # the shark moved into the fish cell and does not move after eating
+        parent = tank.check_animal((2, 1))
+        assert parent.oid == shark_oid[0]
+        assert parent.last_fed == 1
+        assert parent.breed_count == 1
+        # its baby spawned in the cell it left, then moved up to its speed like any animal that has not moved yet
+        sharks = tank.get_current_sharks()
+        assert len(sharks) == 2
+        baby_coord, baby = [(coord, shark) for coord, shark in sharks if shark.oid != shark_oid[0]][0]
+        assert baby.spawn_turn == 1
+        assert max(abs(baby_coord[0] - 2), abs(baby_coord[1] - 2)) <= sim_config_empty['shark_speed']
+
+    def test_boxed_in_animals_stay(self):
+        engine = VectorizedSimulationEngine(sim_config_empty.copy(), seed=1)
+        tank = engine._fish_tank
+        # a grid full of fish, nobody can breed or move
+        cells = np.arange(100)
+        tank.spawn_animals(cells, Animal.Fish, 1, 1, engine._new_oids(100))
+        engine.play_turn()
+        assert len(tank.get_cells(Animal.Fish)) == 100
+        assert engine._fish_breed_total == 0